@@ -0,0 +1,98 @@
+/**
+ * HTTP caching of analysis responses.
+ *
+ * An analysis result (a precomputed snapshot or a live result shared by
+ * coalesced requests) is serialized once into a `CachedBody`: the JSON
+ * bytes, a validator and its gzip and brotli encodings, each compressed on
+ * first use and then reused for every response of that result.
+ *
+ * The ETag is weak and hashes the analysis without its volatile fields
+ * (`timestamp`, `budget`, `snapshot`, and `source`, whose hedge delay
+ * follows upstream latency): a new analysis of unchanged market data keeps
+ * the validator, so clients holding it get a 304. The data itself still
+ * differs when another upstream answered.
+ */
+import { createHash } from 'crypto';
+import { promisify } from 'util';
+import zlib from 'zlib';
+
+const gzip = promisify(zlib.gzip);
+const brotliCompress = promisify(zlib.brotliCompress);
+
+// Bodies below this size are sent as they are: compression would not pay
+const MIN_COMPRESS_BYTES = 1024;
+
+const ENCODERS = {
+  br: body => brotliCompress(body, {
+    params: {
+      // Compressed once per result: a high quality is affordable
+      [zlib.constants.BROTLI_PARAM_QUALITY]: 9,
+      [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT,
+      [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length
+    }
+  }),
+  gzip: body => gzip(body, { level: 9 })
+};
+
+export class CachedBody {
+  constructor(data, replacer = undefined) {
+    const { timestamp, budget, snapshot, source, ...content } = data;
+    this.body = Buffer.from(JSON.stringify(data, replacer));
+    const digest = createHash('sha1').update(JSON.stringify(content, replacer)).digest('base64url');
+    this.etag = `W/"${digest}"`;
+    this.encoded = {};
+  }
+
+  /** The body in `encoding` (`br` or `gzip`), compressed on the first call */
+  encode(encoding) {
+    if (!this.encoded[encoding]) {
+      this.encoded[encoding] = ENCODERS[encoding](this.body);
+    }
+    return this.encoded[encoding];
+  }
+}
+
+// One CachedBody per result object, dropped with it
+const bodies = new WeakMap();
+
+/**
+ * The CachedBody of the result `key`, built from `build()` (default: `key`
+ * itself) on the first call for that object.
+ */
+export function cachedBody(key, replacer = undefined, build = () => key) {
+  let entry = bodies.get(key);
+  if (!entry) {
+    entry = new CachedBody(build(), replacer);
+    bodies.set(key, entry);
+  }
+  return entry;
+}
+
+/** `Cache-Control` value for a response fresh for `maxAgeS` and usable stale for `staleS` more */
+export function cacheControl(maxAgeS, staleS) {
+  return `public, max-age=${Math.max(0, Math.floor(maxAgeS))}, stale-while-revalidate=${Math.max(0, Math.floor(staleS))}`;
+}
+
+/**
+ * Send `entry` as JSON with its validator and `Cache-Control`. Conditional
+ * requests whose `If-None-Match` matches get a 304 without a body; others
+ * get the smallest encoding the client accepts.
+ */
+export async function sendCached(req, res, entry, { maxAgeS, staleS }) {
+  res.set({
+    ETag: entry.etag,
+    'Cache-Control': cacheControl(maxAgeS, staleS),
+    Vary: 'Accept-Encoding'
+  });
+  if (req.fresh) {
+    return res.status(304).end();
+  }
+
+  res.set('Content-Type', 'application/json; charset=utf-8');
+  const encoding = entry.body.length >= MIN_COMPRESS_BYTES ? req.acceptsEncodings(['br', 'gzip']) : false;
+  if (encoding) {
+    res.set('Content-Encoding', encoding);
+    return res.status(200).end(await entry.encode(encoding));
+  }
+  return res.status(200).end(entry.body);
+}
@@ -1,9 +1,26 @@
 import express from 'express';
+import { spawn } from 'child_process';
 import cors from 'cors';
 import { PythonShell } from 'python-shell';
 import { fileURLToPath } from 'url';
 import { dirname, join } from 'path';
 import path from 'path';
+import { AnalyzerPool } from './worker-pool.js';
+import { cachedBody, sendCached } from './http-cache.js';
+import { jsonReplacer } from './protocol.js';
+import { PrecomputeScheduler, parseWatchlist } from './precompute.js';
+import { StreamHub } from './stream-hub.js';
+import {
+  poolMetrics,
+  recordAnalysis,
+  registerCoalescingMetrics,
+  registerPoolMetrics,
+  registerPrecomputeMetrics,
+  registerStreamMetrics,
+  registerRateLimitMetrics,
+  registry
+} from './metrics.js';
+import { SingleFlight } from './single-flight.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -12,6 +29,91 @@ const pythonPath = join(__dirname, 'python');
 console.log('Server starting...');
 console.log('Python path:', pythonPath);
 
+// Pool of warm Python workers, so a request costs one IPC round trip
+// instead of a fresh interpreter
+const analyzerPool = new AnalyzerPool({
+  pythonPath: 'python3',
+  scriptPath: pythonPath,
+  size: parseInt(process.env.ANALYZER_POOL_SIZE || '2', 10),
+  concurrency: parseInt(process.env.ANALYZER_WORKER_CONCURRENCY || '4', 10),
+  maxQueue: parseInt(process.env.ANALYZER_MAX_QUEUE || '100', 10),
+  jobTimeoutMs: parseInt(process.env.ANALYZER_JOB_TIMEOUT_MS || '60000', 10),
+  metrics: poolMetrics
+}).start();
+registerPoolMetrics(analyzerPool);
+registerRateLimitMetrics(analyzerPool);
+
+// Contract -> CoinGecko id index (python/token_index.py): built in the
+// background when missing or older than a week; workers pick it up within a minute
+if (process.env.ANALYZER_TOKEN_INDEX_AUTOBUILD !== '0') {
+  const indexBuild = spawn('python3', ['token_index.py', 'ensure'], {
+    cwd: pythonPath,
+    stdio: ['ignore', 'inherit', 'inherit']
+  });
+  indexBuild.on('error', err => console.error('Could not start the token index build:', err.message));
+  indexBuild.on('exit', code => {
+    if (code) {
+      console.error(`Token index build failed (exit code ${code}), unknown contracts are resolved upstream`);
+    }
+  });
+}
+
+// Concurrent requests for the same token share one analysis
+const analyses = new SingleFlight();
+registerCoalescingMetrics(analyses, analyzerPool);
+
+// Same rules as CryptoAnalyzer._normalize_token_address
+function normalizeTokenAddress(address, chain) {
+  if (chain === 'ethereum') return address.toLowerCase();
+  if (chain === 'sui') return address.includes('sui') ? address : `0x2::sui::${address}`;
+  if (chain === 'solana') return address.toUpperCase();
+  return address;
+}
+
+// Watchlist and hot tokens are re-analyzed in the background and served from snapshots
+const precompute = new PrecomputeScheduler({
+  pool: analyzerPool,
+  keyOf: (address, chain) => `${chain}:${normalizeTokenAddress(address, chain)}`,
+  watchlist: parseWatchlist(process.env.ANALYZER_WATCHLIST),
+  refreshIntervalMs: parseInt(process.env.ANALYZER_PRECOMPUTE_INTERVAL_S || '300', 10) * 1000,
+  maxPerMinute: parseFloat(process.env.ANALYZER_PRECOMPUTE_MAX_PER_MIN || '10'),
+  hotThreshold: parseInt(process.env.ANALYZER_HOT_THRESHOLD || '3', 10),
+  maxHot: parseInt(process.env.ANALYZER_HOT_MAX || '50', 10),
+  onResult: data => recordAnalysis(data)
+}).start();
+registerPrecomputeMetrics(precompute);
+
+// Live updates: one tick per token and interval, fanned out to its subscribers
+const streams = new StreamHub({
+  pool: analyzerPool,
+  keyOf: (address, chain) => `${chain}:${normalizeTokenAddress(address, chain)}`,
+  intervalMs: parseInt(process.env.ANALYZER_STREAM_INTERVAL_MS || '15000', 10),
+  maxChannels: parseInt(process.env.ANALYZER_STREAM_MAX_TOKENS || '100', 10),
+  replacer: jsonReplacer,
+  onAnalysis: data => recordAnalysis(data)
+});
+registerStreamMetrics(streams);
+
+// End-to-end budget of an /analyze request, upstream calls included;
+// ?deadline_ms= overrides it, up to the job timeout
+const DEADLINE_MS = parseInt(process.env.ANALYZER_DEADLINE_MS || '20000', 10);
+const MAX_DEADLINE_MS = analyzerPool.jobTimeoutMs;
+
+// HTTP freshness of live analyses: upstream market data is cached for 30 s
+// and served stale for 5 min (see python/cache.py)
+const HTTP_MAX_AGE_S = parseInt(process.env.ANALYZER_HTTP_MAX_AGE_S || '30', 10);
+const HTTP_STALE_S = parseInt(process.env.ANALYZER_HTTP_STALE_S || '300', 10);
+
+// ?profile=1 runs the analysis under the workers' CPU and allocation
+// profilers (python/profiling.py); off unless enabled
+const PROFILE_REQUESTS = ['1', 'true'].includes(process.env.ANALYZER_PROFILE_REQUESTS);
+
+// Bars of indicator series a long-history analysis may return
+const LONG_HISTORY_MAX_WINDOW = 10000;
+
+const BATCH_MAX_TOKENS = parseInt(process.env.ANALYZER_BATCH_MAX_TOKENS || '1000', 10);
+const BATCH_CONCURRENCY = parseInt(process.env.ANALYZER_BATCH_CONCURRENCY || '16', 10);
+
 const app = express();
 app.use(cors({
   origin: [
@@ -21,13 +123,38 @@ app.use(cors({
   methods: ['GET', 'POST'],
   credentials: true
 }));
-app.use(express.json());
+app.use(express.json({ limit: '1mb' }));
+// Series arrive as Float64Array and may hold NaN: serialize them as the API always did
+app.set('json replacer', jsonReplacer);
 
 // Route de vérification de santé
 app.get('/health', (req, res) => {
   res.status(200).send('OK');
 });
 
+// Etat du pool de workers Python
+app.get('/health/workers', (req, res) => {
+  const status = analyzerPool.status();
+  const ready = status.workers.some(w => w.ready);
+  res.status(ready ? 200 : 503).json(status);
+});
+
+// Etat du précalcul : jetons suivis et âge des snapshots
+app.get('/health/precompute', (req, res) => {
+  res.status(200).json(precompute.status());
+});
+
+// Etat des flux en direct : jetons suivis et abonnés
+app.get('/health/stream', (req, res) => {
+  res.status(200).json(streams.status());
+});
+
+// Métriques Prometheus : durées par étape et par hôte amont, cache, file d'attente
+app.get('/metrics', (req, res) => {
+  res.set('Content-Type', 'text/plain; version=0.0.4; charset=utf-8');
+  res.status(200).send(registry.render());
+});
+
 // Test endpoint for Python integration
 app.get('/test-python', (req, res) => {
   const options = {
@@ -58,79 +185,124 @@ app.get('/test-python', (req, res) => {
 // API routes
 app.get('/analyze/:address', async (req, res) => {
   try {
+    const requestedAt = Date.now();
     const address = req.params.address;
     const chain = req.query.chain || 'ethereum';
+    // ?series=1 adds every indicator's full series (for charts);
+    // ?window=N keeps only the last N bars of it
+    const job = { address, chain };
+    let deadlineMs = DEADLINE_MS;
+    if (req.query.deadline_ms !== undefined) {
+      deadlineMs = parseInt(req.query.deadline_ms, 10);
+      if (!(deadlineMs > 0)) {
+        return res.status(400).json({ error: '"deadline_ms" must be a positive integer' });
+      }
+    }
+    if (deadlineMs > 0) {
+      // Counted from the request's arrival, so queue wait uses the budget too
+      job.deadline_ms = Math.min(deadlineMs, MAX_DEADLINE_MS);
+      job.requested_at = requestedAt;
+    }
+    if (req.query.series === '1' || req.query.series === 'true') {
+      job.series = true;
+      if (req.query.window !== undefined) {
+        const window = parseInt(req.query.window, 10);
+        if (!(window > 0)) {
+          return res.status(400).json({ error: '"window" must be a positive integer' });
+        }
+        job.window = window;
+      }
+    }
+    if (req.query.profile === '1' || req.query.profile === 'true') {
+      if (!PROFILE_REQUESTS) {
+        return res.status(403).json({ error: 'Profiling requests are disabled (ANALYZER_PROFILE_REQUESTS)' });
+      }
+      job.profile = true;
+    }
     
     console.log(`Analyzing token: ${address} on chain: ${chain}`);
+
+    // Tracked tokens are answered from their precomputed snapshot
+    precompute.recordRequest(address, chain);
+    const snapshot = job.series || job.profile ? null : precompute.snapshot(address, chain);
+    if (snapshot) {
+      // The body stays the same for the snapshot's lifetime: its age only goes in the Age header
+      const entry = cachedBody(snapshot.data, jsonReplacer, () => ({
+        ...snapshot.data,
+        snapshot: { computed_at: new Date(snapshot.computedAt).toISOString() }
+      }));
+      res.set('Age', String(Math.floor(snapshot.ageMs / 1000)));
+      return await sendCached(req, res, entry, {
+        maxAgeS: precompute.refreshIntervalMs / 1000,
+        staleS: (precompute.maxAgeMs - precompute.refreshIntervalMs) / 1000
+      });
+    }
     
-    // Options configuration for PythonShell
-    const options = {
-      mode: 'text',
-      pythonPath: 'python3',
-      scriptPath: path.join(__dirname, 'python'),
-      args: [address, chain]
-    };
+    // Only requests with the same budget share an analysis: a longer one
+    // must not get the result of a flight cut short by a smaller one
+    const key = JSON.stringify([
+      chain, normalizeTokenAddress(address, chain), job.series || false, job.window || null, job.profile || false,
+      job.deadline_ms || null
+    ]);
+    let resultData;
+    try {
+      resultData = await analyses.run(key, async () => {
+        const result = await analyzerPool.run(job);
+        // Recorded once per analysis, however many requests share it
+        if (result.success) {
+          recordAnalysis(result.data, { keepTimings: true, keepProfile: job.profile });
+        }
+        return result;
+      });
+    } catch (err) {
+      console.error('Failed to run Python analyzer:', err);
+      const status = err.code === 'QUEUE_FULL' ? 503 : 500;
+      return res.status(status).json({ 
+        error: 'Internal server error during analysis',
+        details: err.message
+      });
+    }
     
-    console.log(`Launching Python with options:`, JSON.stringify(options));
+    if (!resultData.success) {
+      console.error('Analysis error:', resultData.error);
+      return res.status(400).json({ 
+        error: 'Analysis failed', 
+        details: resultData.error 
+      });
+    }
     
-    // Call the Python analyzer
-    PythonShell.run('analyzer.py', options)
-      .then(results => {
-        if (!results || results.length === 0) {
-          console.error('No results from Python analyzer');
-          return res.status(500).json({ error: 'Analysis failed: No results returned' });
-        }
-        
-        console.log('Python output:', results);
-        
-        // Find the JSON output line from the results
-        let resultData = null;
-        for (const line of results) {
-          try {
-            // Fix NaN, Infinity, and -Infinity values which are not valid JSON
-            const fixedLine = line
-              .replace(/: NaN/g, ': "NaN"')
-              .replace(/: Infinity/g, ': "Infinity"')
-              .replace(/: -Infinity/g, ': "-Infinity"');
-              
-            // Try to parse each line as JSON
-            const parsed = JSON.parse(fixedLine);
-            if (parsed) {
-              resultData = parsed;
-              break;
-            }
-          } catch (e) {
-            // Skip non-JSON lines silently (these are debug messages)
-            continue;
-          }
-        }
-        
-        if (!resultData) {
-          console.error('Could not find valid JSON in Python output');
-          return res.status(500).json({ 
-            error: 'Analysis failed: No valid data returned',
-            rawOutput: results.join('\n')
-          });
-        }
-        
-        if (!resultData.success) {
-          console.error('Analysis error:', resultData.error);
-          return res.status(400).json({ 
-            error: 'Analysis failed', 
-            details: resultData.error 
-          });
-        }
-        
-        console.log(`Analysis successful for token: ${address}`);
-        res.status(200).json(resultData.data);
-      })
-      .catch(err => {
-        console.error('Failed to run Python analyzer:', err);
-        res.status(500).json({ 
-          error: 'Internal server error during analysis',
-          details: err.message
-        });
+    if (resultData.data.status === 'timeout') {
+      // Nothing worth caching or snapshotting: the budget ran out before the market data
+      res.set('Cache-Control', 'no-store');
+      return res.status(504).json({
+        error: 'Analysis deadline exceeded',
+        details: resultData.data.error,
+        budget: resultData.data.budget
       });
+    }
+
+    // Stage timings feed /metrics; ?timings=1 also returns them
+    const keepTimings = req.query.timings === '1' || req.query.timings === 'true';
+    const { timings, profile, ...data } = resultData.data;
+
+    if (!job.series) {
+      precompute.offer(address, chain, data);
+    }
+
+    console.log(`Analysis successful for token: ${address}`);
+    if (keepTimings || job.profile) {
+      res.set('Cache-Control', 'no-store');
+      return res.status(200).json({
+        ...data,
+        ...(keepTimings ? { timings } : {}),
+        ...(job.profile ? { profile } : {})
+      });
+    }
+    // Serialized and compressed once, whatever the number of requests sharing the analysis
+    return await sendCached(req, res, cachedBody(resultData, jsonReplacer, () => data), {
+      maxAgeS: HTTP_MAX_AGE_S,
+      staleS: HTTP_STALE_S
+    });
   } catch (error) {
     console.error('Error in /analyze/:address endpoint:', error);
     res.status(500).json({ 
@@ -140,6 +312,102 @@ app.get('/analyze/:address', async (req, res) => {
   }
 });
 
+// Analysis of a stored long, high-resolution history in bounded memory
+// (python/long_history.py); ?window=N adds the indicator series of the last N bars
+app.get('/analyze/:address/long', async (req, res) => {
+  const address = req.params.address;
+  const chain = req.query.chain || 'ethereum';
+  const job = { op: 'long_history', address, chain };
+  if (req.query.window !== undefined) {
+    const window = parseInt(req.query.window, 10);
+    if (!(window > 0) || window > LONG_HISTORY_MAX_WINDOW) {
+      return res.status(400).json({ error: `"window" must be an integer between 1 and ${LONG_HISTORY_MAX_WINDOW}` });
+    }
+    job.window = window;
+  }
+
+  let result;
+  try {
+    result = await analyzerPool.run(job);
+  } catch (err) {
+    console.error('Failed to run the long-history analysis:', err);
+    return res.status(err.code === 'QUEUE_FULL' ? 503 : 500).json({
+      error: 'Internal server error during analysis',
+      details: err.message
+    });
+  }
+  if (!result.success) {
+    return res.status(400).json({ error: 'Analysis failed', details: result.error });
+  }
+  if (result.data.status === 'no_data') {
+    return res.status(404).json({ error: 'No long history is stored for this token' });
+  }
+  res.json(result.data);
+});
+
+// Live updates of a token as Server-Sent Events (see stream-hub.js)
+app.get('/stream/:address', (req, res) => {
+  const address = req.params.address;
+  const chain = req.query.chain || 'ethereum';
+  if (!streams.subscribe(req, res, address, chain)) {
+    res.status(503).json({ error: 'Too many tokens streamed, try again later' });
+  }
+});
+
+// Batch analysis: results are streamed as NDJSON, one line per token
+// as soon as it is analyzed, followed by a summary line
+app.post('/analyze/batch', async (req, res) => {
+  const tokens = req.body && req.body.tokens;
+  if (!Array.isArray(tokens) || tokens.length === 0) {
+    return res.status(400).json({ error: 'Body must contain a non-empty "tokens" array' });
+  }
+  if (tokens.length > BATCH_MAX_TOKENS) {
+    return res.status(400).json({ error: `At most ${BATCH_MAX_TOKENS} tokens per batch` });
+  }
+
+  const normalized = [];
+  for (const token of tokens) {
+    const address = typeof token === 'string' ? token : token && token.address;
+    if (!address || typeof address !== 'string') {
+      return res.status(400).json({ error: 'Each token needs an "address"' });
+    }
+    normalized.push({ address, chain: (token && token.chain) || 'ethereum' });
+  }
+  const concurrency = Math.max(1, Math.min(
+    parseInt(req.query.concurrency || req.body.concurrency || BATCH_CONCURRENCY, 10) || BATCH_CONCURRENCY,
+    BATCH_CONCURRENCY
+  ));
+
+  console.log(`Batch analysis of ${normalized.length} tokens (concurrency ${concurrency})`);
+
+  res.status(200);
+  res.setHeader('Content-Type', 'application/x-ndjson');
+  res.setHeader('Cache-Control', 'no-cache');
+  res.flushHeaders();
+
+  try {
+    const summary = await analyzerPool.run(
+      { op: 'batch', tokens: normalized, concurrency },
+      {
+        onItem: item => {
+          res.write(JSON.stringify({
+            index: item.index,
+            address: item.address,
+            chain: item.chain,
+            success: item.success,
+            ...(item.success ? { data: recordAnalysis(item.data) } : { error: item.error })
+          }, jsonReplacer) + '\n');
+        }
+      }
+    );
+    res.write(JSON.stringify({ done: true, ...summary.data }) + '\n');
+  } catch (err) {
+    console.error('Batch analysis failed:', err);
+    res.write(JSON.stringify({ done: false, error: err.message }) + '\n');
+  }
+  res.end();
+});
+
 // Servir les fichiers statiques du build React
 app.use(express.static(path.join(__dirname, '../dist')));
 
@@ -158,4 +426,13 @@ const server = app.listen(PORT, () => {
 server.on('error', (error) => {
   console.error('Server error:', error);
   process.exit(1);
-});
\ No newline at end of file
+});
+
+for (const signal of ['SIGINT', 'SIGTERM']) {
+  process.on(signal, () => {
+    precompute.stop();
+    streams.stop();
+    analyzerPool.stop();
+    server.close(() => process.exit(0));
+  });
+}
\ No newline at end of file
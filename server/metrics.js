@@ -0,0 +1,387 @@
+/**
+ * Minimal Prometheus metrics registry (text exposition format 0.0.4) and
+ * the analyzer metrics served on `/metrics`.
+ *
+ * Stage and upstream timings are measured inside the Python workers and
+ * attached to every analysis result; `recordAnalysis` folds them in here.
+ */
+
+const DEFAULT_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+function escapeLabel(value) {
+  return String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+}
+
+function formatLabels(labels) {
+  const pairs = Object.entries(labels).map(([k, v]) => `${k}="${escapeLabel(v)}"`);
+  return pairs.length ? `{${pairs.join(',')}}` : '';
+}
+
+function formatValue(value) {
+  if (Number.isNaN(value)) return 'NaN';
+  if (value === Infinity) return '+Inf';
+  if (value === -Infinity) return '-Inf';
+  return String(value);
+}
+
+class Metric {
+  constructor(name, help, type, labelNames = [], collect = null) {
+    this.name = name;
+    this.help = help;
+    this.type = type;
+    this.labelNames = labelNames;
+    // `collect` returns [{ labels, value }] at scrape time, for values owned elsewhere
+    this.collect = collect;
+    this.series = new Map();
+  }
+
+  _key(labels) {
+    return JSON.stringify(this.labelNames.map(name => labels[name] ?? ''));
+  }
+
+  _labels(labels) {
+    const out = {};
+    for (const name of this.labelNames) {
+      out[name] = labels[name] ?? '';
+    }
+    return out;
+  }
+
+  samples() {
+    if (this.collect) {
+      return this.collect().map(({ labels = {}, value }) => ({ labels: this._labels(labels), value }));
+    }
+    return [...this.series.values()];
+  }
+
+  render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} ${this.type}`];
+    for (const { labels, value } of this.samples()) {
+      lines.push(`${this.name}${formatLabels(labels)} ${formatValue(value)}`);
+    }
+    return lines.join('\n');
+  }
+}
+
+export class Counter extends Metric {
+  constructor(name, help, labelNames, collect) {
+    super(name, help, 'counter', labelNames, collect);
+  }
+
+  inc(labels = {}, value = 1) {
+    const key = this._key(labels);
+    const sample = this.series.get(key) || { labels: this._labels(labels), value: 0 };
+    sample.value += value;
+    this.series.set(key, sample);
+  }
+}
+
+export class Gauge extends Metric {
+  constructor(name, help, labelNames, collect) {
+    super(name, help, 'gauge', labelNames, collect);
+  }
+
+  set(labels, value) {
+    this.series.set(this._key(labels), { labels: this._labels(labels), value });
+  }
+}
+
+export class Histogram extends Metric {
+  constructor(name, help, labelNames, buckets = DEFAULT_BUCKETS) {
+    super(name, help, 'histogram', labelNames);
+    this.buckets = buckets;
+  }
+
+  observe(labels, value) {
+    const key = this._key(labels);
+    let sample = this.series.get(key);
+    if (!sample) {
+      sample = { labels: this._labels(labels), counts: this.buckets.map(() => 0), sum: 0, count: 0 };
+      this.series.set(key, sample);
+    }
+    for (let i = 0; i < this.buckets.length; i++) {
+      if (value <= this.buckets[i]) {
+        sample.counts[i]++;
+      }
+    }
+    sample.sum += value;
+    sample.count++;
+  }
+
+  render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+    for (const { labels, counts, sum, count } of this.series.values()) {
+      this.buckets.forEach((le, i) => {
+        lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: formatValue(le) })} ${counts[i]}`);
+      });
+      lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: '+Inf' })} ${count}`);
+      lines.push(`${this.name}_sum${formatLabels(labels)} ${formatValue(sum)}`);
+      lines.push(`${this.name}_count${formatLabels(labels)} ${count}`);
+    }
+    return lines.join('\n');
+  }
+}
+
+export class Registry {
+  constructor() {
+    this.metrics = [];
+  }
+
+  register(metric) {
+    this.metrics.push(metric);
+    return metric;
+  }
+
+  counter(name, help, labelNames = [], collect = null) {
+    return this.register(new Counter(name, help, labelNames, collect));
+  }
+
+  gauge(name, help, labelNames = [], collect = null) {
+    return this.register(new Gauge(name, help, labelNames, collect));
+  }
+
+  histogram(name, help, labelNames = [], buckets = DEFAULT_BUCKETS) {
+    return this.register(new Histogram(name, help, labelNames, buckets));
+  }
+
+  render() {
+    return this.metrics.map(metric => metric.render()).join('\n') + '\n';
+  }
+}
+
+export const registry = new Registry();
+
+const stageDuration = registry.histogram(
+  'analyzer_stage_duration_seconds',
+  'Duration of each stage of an analysis, measured in the worker',
+  ['stage']
+);
+const upstreamDuration = registry.histogram(
+  'analyzer_upstream_request_duration_seconds',
+  'Upstream API calls made by the workers, by host and HTTP status',
+  ['host', 'status']
+);
+const upstreamQueueWait = registry.histogram(
+  'analyzer_upstream_queue_wait_seconds',
+  'Time upstream calls waited for the rate limiter of their host, by priority',
+  ['host', 'priority']
+);
+const upstreamRetries = registry.counter(
+  'analyzer_upstream_retries_total',
+  'Upstream calls retried after a 429 or gateway error',
+  ['host']
+);
+const cacheLookups = registry.counter(
+  'analyzer_cache_lookups_total',
+  'Upstream response cache lookups by kind of data',
+  ['kind', 'result']
+);
+registry.gauge('analyzer_cache_hit_ratio', 'Share of cache lookups served without an upstream call', ['kind'], () => {
+  const totals = {};
+  for (const { labels, value } of cacheLookups.samples()) {
+    const entry = totals[labels.kind] || (totals[labels.kind] = { hit: 0, all: 0 });
+    entry.all += value;
+    if (labels.result === 'hit') {
+      entry.hit += value;
+    }
+  }
+  return Object.entries(totals).map(([kind, { hit, all }]) => ({ labels: { kind }, value: all ? hit / all : 0 }));
+});
+const marketSources = registry.counter(
+  'analyzer_market_source_total',
+  'Analyses by upstream that answered the market data, and whether a hedge was started',
+  ['source', 'hedged']
+);
+const deadlinesExceeded = registry.counter(
+  'analyzer_deadline_exceeded_total',
+  'Analyses that used up their deadline budget',
+  []
+);
+const profiles = registry.counter(
+  'analyzer_profiles_total',
+  'Analyses profiled by the workers, by trigger (requested, always, sampled)',
+  ['trigger']
+);
+const analysisStatus = registry.counter(
+  'analyzer_analysis_status_total',
+  'Analyses by result status (success, no_data, limited_data, analysis_error, ...)',
+  ['status']
+);
+
+/** Histograms filled by the worker pool */
+export const poolMetrics = {
+  queueWait: registry.histogram('analyzer_queue_wait_seconds', 'Time jobs wait for a free worker', ['op']),
+  jobDuration: registry.histogram(
+    'analyzer_job_duration_seconds',
+    'Worker round trip of a job, from dispatch to result',
+    ['op', 'result']
+  ),
+  workerStartup: registry.histogram(
+    'analyzer_worker_startup_seconds',
+    'Time from spawning a worker process to its ready message',
+    []
+  )
+};
+
+/** Expose the pool's queue and worker state, read at scrape time */
+export function registerPoolMetrics(pool) {
+  registry.gauge('analyzer_queue_depth', 'Jobs waiting for a free worker', [], () => [
+    { value: pool.status().queued }
+  ]);
+  registry.gauge('analyzer_jobs_in_flight', 'Jobs being processed by workers', [], () => [
+    { value: pool.status().workers.reduce((sum, w) => sum + w.inFlight, 0) }
+  ]);
+  registry.gauge('analyzer_workers_ready', 'Workers ready to take jobs', [], () => [
+    { value: pool.status().workers.filter(w => w.ready).length }
+  ]);
+  registry.counter('analyzer_jobs_total', 'Jobs finished by the workers', ['result'], () => {
+    const { completed, failed } = pool.status();
+    return [{ labels: { result: 'completed' }, value: completed }, { labels: { result: 'failed' }, value: failed }];
+  });
+  registry.counter('analyzer_jobs_rejected_total', 'Jobs rejected because the queue was full', [], () => [
+    { value: pool.status().rejected }
+  ]);
+  registry.counter('analyzer_worker_restarts_total', 'Worker processes restarted', [], () => [
+    { value: pool.status().restarts }
+  ]);
+}
+
+/**
+ * Rate limiter state per upstream host, summed over the workers as last
+ * reported by their health checks.
+ */
+export function registerRateLimitMetrics(pool) {
+  const hosts = () => {
+    const totals = {};
+    for (const worker of pool.status().workers) {
+      for (const [host, stats] of Object.entries(worker.rateLimits || {})) {
+        const entry = totals[host] || (totals[host] = { waiting: 0, queued: 0, paused: 0 });
+        entry.waiting += stats.waiting;
+        entry.queued += stats.queued;
+        entry.paused += stats.paused;
+      }
+    }
+    return Object.entries(totals);
+  };
+
+  registry.gauge('analyzer_upstream_rate_limit_waiting', 'Upstream calls waiting for the rate limiter', ['host'],
+    () => hosts().map(([host, { waiting }]) => ({ labels: { host }, value: waiting })));
+  registry.counter('analyzer_upstream_rate_limit_queued_total', 'Upstream calls that had to wait for a token', ['host'],
+    () => hosts().map(([host, { queued }]) => ({ labels: { host }, value: queued })));
+  registry.counter('analyzer_upstream_rate_limit_pauses_total', 'Host pauses after a 429 answer', ['host'],
+    () => hosts().map(([host, { paused }]) => ({ labels: { host }, value: paused })));
+}
+
+/** Live streams: channels, subscribers, ticks by kind and events sent */
+export function registerStreamMetrics(hub) {
+  registry.gauge('analyzer_stream_channels', 'Tokens with live subscribers', [], () => [
+    { value: hub.channels.size }
+  ]);
+  registry.gauge('analyzer_stream_subscribers', 'Open live update connections', [], () => [
+    { value: hub.subscriberCount() }
+  ]);
+  registry.counter('analyzer_stream_ticks_total', 'Live ticks by outcome', ['kind'], () => [
+    { labels: { kind: 'analysis' }, value: hub.stats.analyses },
+    { labels: { kind: 'update' }, value: hub.stats.updates },
+    { labels: { kind: 'unchanged' }, value: hub.stats.unchanged },
+    { labels: { kind: 'failure' }, value: hub.stats.failures }
+  ]);
+  registry.counter('analyzer_stream_events_total', 'Events written to live subscribers', [], () => [
+    { value: hub.stats.events }
+  ]);
+}
+
+/** Precomputed snapshots: tracked tokens, refreshes and responses served from them */
+export function registerPrecomputeMetrics(scheduler) {
+  registry.gauge('analyzer_precompute_tokens', 'Tokens precomputed in the background', ['kind'], () => [
+    { labels: { kind: 'watchlist' }, value: scheduler.watchlist.size },
+    { labels: { kind: 'hot' }, value: scheduler.hot.size }
+  ]);
+  registry.counter('analyzer_precompute_refreshes_total', 'Background analyses by result', ['result'], () => [
+    { labels: { result: 'success' }, value: scheduler.stats.refreshes },
+    { labels: { result: 'failure' }, value: scheduler.stats.failures }
+  ]);
+  registry.counter('analyzer_snapshot_served_total', '/analyze responses served from a snapshot', [], () => [
+    { value: scheduler.stats.served }
+  ]);
+}
+
+/**
+ * Single-flight counters: `route` for /analyze requests coalesced here,
+ * `analysis` and `upstream` as last reported by the workers' health checks
+ * (analyses and upstream calls coalesced inside each worker process).
+ */
+export function registerCoalescingMetrics(routeFlight, pool) {
+  const layers = () => {
+    const totals = {
+      route: { ...routeFlight.stats },
+      analysis: { calls: 0, coalesced: 0 },
+      upstream: { calls: 0, coalesced: 0 }
+    };
+    for (const worker of pool.status().workers) {
+      for (const layer of ['analysis', 'upstream']) {
+        const stats = worker.coalescing && worker.coalescing[layer];
+        if (stats) {
+          totals[layer].calls += stats.calls;
+          totals[layer].coalesced += stats.coalesced;
+        }
+      }
+    }
+    return Object.entries(totals);
+  };
+
+  registry.counter('analyzer_singleflight_calls_total', 'Calls going through single-flight deduplication', ['layer'],
+    () => layers().map(([layer, { calls }]) => ({ labels: { layer }, value: calls })));
+  registry.counter('analyzer_singleflight_coalesced_total', 'Calls served by joining an identical call in flight', ['layer'],
+    () => layers().map(([layer, { coalesced }]) => ({ labels: { layer }, value: coalesced })));
+  registry.gauge('analyzer_singleflight_hit_ratio', 'Share of calls coalesced with an identical call in flight', ['layer'],
+    () => layers().map(([layer, { calls, coalesced }]) => ({ labels: { layer }, value: calls ? coalesced / calls : 0 })));
+}
+
+/**
+ * Record the status and timings of one analysis result. The timings are
+ * removed from `data` unless `keepTimings` is set, its profile summary
+ * (local file paths) unless `keepProfile` is set.
+ */
+export function recordAnalysis(data, { keepTimings = false, keepProfile = false } = {}) {
+  if (!data || typeof data !== 'object') {
+    return data;
+  }
+  analysisStatus.inc({ status: data.status || 'unknown' });
+  if (data.source) {
+    marketSources.inc({ source: data.source.market_data, hedged: String(Boolean(data.source.hedged)) });
+  }
+  if (data.budget?.exceeded) {
+    deadlinesExceeded.inc();
+  }
+  if (data.profile) {
+    if (data.profile.files) {
+      profiles.inc({ trigger: data.profile.trigger });
+    }
+    if (!keepProfile) {
+      delete data.profile;
+    }
+  }
+
+  const timings = data.timings;
+  if (timings) {
+    for (const [stage, seconds] of Object.entries(timings.stages || {})) {
+      stageDuration.observe({ stage }, seconds);
+    }
+    for (const call of timings.upstream || []) {
+      upstreamDuration.observe({ host: call.host, status: call.status }, call.seconds);
+      upstreamQueueWait.observe({ host: call.host, priority: call.priority }, call.wait || 0);
+      if (call.attempts > 1) {
+        upstreamRetries.inc({ host: call.host }, call.attempts - 1);
+      }
+    }
+    for (const [kind, counts] of Object.entries(timings.cache || {})) {
+      cacheLookups.inc({ kind, result: 'hit' }, counts.hit || 0);
+      cacheLookups.inc({ kind, result: 'miss' }, counts.miss || 0);
+    }
+    if (!keepTimings) {
+      delete data.timings;
+    }
+  }
+  return data;
+}
@@ -0,0 +1,198 @@
+/**
+ * Background precomputation of analyses.
+ *
+ * Tokens of the configured watchlist, plus "hot" tokens requested at least
+ * `hotThreshold` times within `hotWindowMs`, are re-analyzed every
+ * `refreshIntervalMs`. Their latest result is kept as a snapshot that
+ * `/analyze` serves directly while it is younger than `maxAgeMs`.
+ *
+ * Refreshes are spread evenly over the interval, one at a time, and never
+ * faster than `maxPerMinute`. They run as `background` jobs, so inside the
+ * workers their upstream calls yield to interactive analyses whenever a
+ * host's rate limit is reached.
+ */
+
+/** Parse `chain:address` (or a bare ethereum address) entries separated by commas or spaces */
+export function parseWatchlist(spec) {
+  const tokens = [];
+  for (const entry of (spec || '').split(/[\s,]+/)) {
+    if (!entry) continue;
+    const match = /^([a-z-]+):(.+)$/.exec(entry);
+    tokens.push(match ? { chain: match[1], address: match[2] } : { chain: 'ethereum', address: entry });
+  }
+  return tokens;
+}
+
+export class PrecomputeScheduler {
+  constructor({
+    pool,
+    keyOf,
+    watchlist = [],
+    refreshIntervalMs = 5 * 60 * 1000,
+    maxAgeMs = 2 * refreshIntervalMs,
+    maxPerMinute = 10,
+    hotThreshold = 3,
+    hotWindowMs = 10 * 60 * 1000,
+    maxHot = 50,
+    onResult = null
+  }) {
+    this.pool = pool;
+    // Maps (address, chain) to the key identifying a token, e.g. with a normalized address
+    this.keyOf = keyOf;
+    this.refreshIntervalMs = refreshIntervalMs;
+    this.maxAgeMs = maxAgeMs;
+    this.maxPerMinute = maxPerMinute;
+    this.hotThreshold = hotThreshold;
+    this.hotWindowMs = hotWindowMs;
+    this.maxHot = maxHot;
+    this.onResult = onResult;
+
+    this.watchlist = new Map();
+    for (const token of watchlist) {
+      this.watchlist.set(this.keyOf(token.address, token.chain), token);
+    }
+    this.hot = new Map();
+    this.requests = new Map();   // key -> { token, times: [ms, ...] }
+    this.snapshots = new Map();  // key -> { data, computedAt }
+    this.nextDue = new Map();    // key -> ms
+    this.timer = null;
+    this.stats = { refreshes: 0, failures: 0, served: 0 };
+  }
+
+  start() {
+    this._schedule(0);
+    return this;
+  }
+
+  stop() {
+    clearTimeout(this.timer);
+    this.timer = null;
+  }
+
+  /** Count a request, promoting the token to hot once it is requested often enough */
+  recordRequest(address, chain) {
+    const key = this.keyOf(address, chain);
+    const now = Date.now();
+    let entry = this.requests.get(key);
+    if (!entry) {
+      entry = { token: { address, chain }, times: [] };
+      this.requests.set(key, entry);
+    }
+    entry.times.push(now);
+    if (entry.times.length > this.hotThreshold) {
+      entry.times.shift();
+    }
+    if (!this.hot.has(key) && !this.watchlist.has(key) && this._recentCount(entry, now) >= this.hotThreshold
+        && this.hot.size < this.maxHot) {
+      this.hot.set(key, entry.token);
+      console.log(`Token ${chain}:${address} is hot, precomputing it`);
+    }
+  }
+
+  /** Fresh snapshot of a token as `{ data, computedAt, ageMs }`, or null */
+  snapshot(address, chain) {
+    const snap = this.snapshots.get(this.keyOf(address, chain));
+    if (!snap) return null;
+    const ageMs = Date.now() - snap.computedAt;
+    if (ageMs > this.maxAgeMs) return null;
+    this.stats.served++;
+    return { ...snap, ageMs };
+  }
+
+  /** Store a result computed elsewhere (a live /analyze) for a tracked token */
+  offer(address, chain, data) {
+    const key = this.keyOf(address, chain);
+    if (this.watchlist.has(key) || this.hot.has(key)) {
+      this.snapshots.set(key, { data, computedAt: Date.now() });
+      this.nextDue.set(key, Date.now() + this.refreshIntervalMs);
+    }
+  }
+
+  status() {
+    const now = Date.now();
+    return {
+      watchlist: this.watchlist.size,
+      hot: this.hot.size,
+      snapshots: [...this.snapshots].map(([key, snap]) => ({ key, ageSeconds: (now - snap.computedAt) / 1000 })),
+      spacingMs: this._spacing(),
+      ...this.stats
+    };
+  }
+
+  _recentCount(entry, now) {
+    return entry.times.filter(t => now - t <= this.hotWindowMs).length;
+  }
+
+  _tracked() {
+    return [...this.watchlist, ...this.hot];
+  }
+
+  // Time between two refreshes: the interval split evenly among the tokens
+  _spacing() {
+    const count = Math.max(1, this.watchlist.size + this.hot.size);
+    return Math.max(this.refreshIntervalMs / count, 60000 / this.maxPerMinute);
+  }
+
+  _schedule(delayMs) {
+    clearTimeout(this.timer);
+    this.timer = setTimeout(() => this._tick(), delayMs);
+    this.timer.unref();
+  }
+
+  _demoteCold(now) {
+    for (const [key, entry] of this.requests) {
+      if (this._recentCount(entry, now) === 0) {
+        this.requests.delete(key);
+      }
+    }
+    for (const key of this.hot.keys()) {
+      const entry = this.requests.get(key);
+      if (!entry || this._recentCount(entry, now) < this.hotThreshold) {
+        this.hot.delete(key);
+        this.nextDue.delete(key);
+        console.log(`Token ${key} is no longer hot`);
+      }
+    }
+  }
+
+  async _tick() {
+    const now = Date.now();
+    this._demoteCold(now);
+
+    // The most overdue token; tokens never refreshed come first
+    let next = null;
+    for (const [key, token] of this._tracked()) {
+      const due = this.nextDue.get(key) ?? 0;
+      if (due <= now && (!next || due < next.due)) {
+        next = { key, token, due };
+      }
+    }
+    // One refresh at a time: the next tick is only scheduled once it is done
+    if (next) {
+      await this._refresh(next.key, next.token);
+    }
+    this._schedule(this._spacing());
+  }
+
+  async _refresh(key, token) {
+    this.nextDue.set(key, Date.now() + this.refreshIntervalMs);
+    try {
+      const result = await this.pool.run({ address: token.address, chain: token.chain, priority: 'background' });
+      if (!result.success) {
+        throw new Error(result.error);
+      }
+      const data = this.onResult ? this.onResult(result.data) : result.data;
+      this.snapshots.set(key, { data, computedAt: Date.now() });
+      this.stats.refreshes++;
+    } catch (err) {
+      this.stats.failures++;
+      console.error(`Precompute of ${key} failed:`, err.message);
+    }
+    // Snapshots of tokens no longer tracked expire with maxAgeMs; drop them past that
+    for (const [snapKey, snap] of this.snapshots) {
+      if (Date.now() - snap.computedAt > this.maxAgeMs && !this.watchlist.has(snapKey) && !this.hot.has(snapKey)) {
+        this.snapshots.delete(snapKey);
+      }
+    }
+  }
+}
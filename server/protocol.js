@@ -0,0 +1,118 @@
+/**
+ * Reader of the framed messages written by the Python workers
+ * (see python/protocol.py for the format).
+ *
+ * A frame is a 5-byte header (payload length as a big-endian uint32 and a
+ * flags byte) followed by the payload. With FLAG_BINARY, large arrays come
+ * as raw float64 data and are decoded as Float64Array views; with
+ * FLAG_TAGGED, `{"$num": "NaN"}` tags are revived as numbers.
+ */
+
+export const FLAG_BINARY = 1;
+export const FLAG_TAGGED = 2;
+
+const HEADER_SIZE = 5;
+
+function reviveNumbers(key, value) {
+  if (value !== null && typeof value === 'object' && typeof value.$num === 'string') {
+    return Number(value.$num);
+  }
+  return value;
+}
+
+function float64View(data, offset, count) {
+  const start = data.byteOffset + offset;
+  if (start % 8 === 0) {
+    return new Float64Array(data.buffer, start, count);
+  }
+  // Float64Array views must be aligned: copy the rare misaligned array
+  const copy = new Float64Array(count);
+  Buffer.from(copy.buffer).set(data.subarray(offset, offset + count * 8));
+  return copy;
+}
+
+function attachArrays(value, data) {
+  if (Array.isArray(value)) {
+    for (let i = 0; i < value.length; i++) {
+      value[i] = attachArrays(value[i], data);
+    }
+    return value;
+  }
+  if (value !== null && typeof value === 'object') {
+    if (Array.isArray(value.$f64)) {
+      return float64View(data, value.$f64[0], value.$f64[1]);
+    }
+    for (const key of Object.keys(value)) {
+      value[key] = attachArrays(value[key], data);
+    }
+  }
+  return value;
+}
+
+/** Decode the payload of one frame */
+export function decodePayload(payload, flags) {
+  const reviver = flags & FLAG_TAGGED ? reviveNumbers : undefined;
+  if (!(flags & FLAG_BINARY)) {
+    return JSON.parse(payload.toString('utf8'), reviver);
+  }
+  const headLength = payload.readUInt32BE(0);
+  const head = JSON.parse(payload.toString('utf8', 4, 4 + headLength), reviver);
+  const dataStart = 4 + headLength + ((8 - ((4 + headLength) % 8)) % 8);
+  return attachArrays(head, payload.subarray(dataStart));
+}
+
+/**
+ * Splits a byte stream into frames and calls `onMessage` with each decoded
+ * message. Chunks are only concatenated once a whole frame has arrived.
+ */
+export class FrameDecoder {
+  constructor(onMessage) {
+    this.onMessage = onMessage;
+    this.chunks = [];
+    this.buffered = 0;
+  }
+
+  push(chunk) {
+    this.chunks.push(chunk);
+    this.buffered += chunk.length;
+
+    while (this.buffered >= HEADER_SIZE) {
+      if (this.chunks[0].length < HEADER_SIZE) {
+        this.chunks = [Buffer.concat(this.chunks)];
+      }
+      const head = this.chunks[0];
+      const frameSize = HEADER_SIZE + head.readUInt32BE(0);
+      if (this.buffered < frameSize) {
+        return;
+      }
+      const flags = head[4];
+      const data = head.length >= frameSize ? head : Buffer.concat(this.chunks, this.buffered);
+      const payload = data.subarray(HEADER_SIZE, frameSize);
+      const rest = data.subarray(frameSize);
+      this.chunks = rest.length ? [rest] : [];
+      this.buffered = rest.length;
+      this.onMessage(decodePayload(payload, flags));
+    }
+  }
+}
+
+function jsonNumber(n) {
+  if (Number.isFinite(n)) return n;
+  if (Number.isNaN(n)) return 'NaN';
+  return n > 0 ? 'Infinity' : '-Infinity';
+}
+
+/**
+ * JSON.stringify replacer for analysis results: typed arrays become plain
+ * arrays and non-finite numbers become "NaN"/"Infinity"/"-Infinity" strings,
+ * as the HTTP API has always returned them.
+ */
+export function jsonReplacer(key, value) {
+  if (typeof value === 'number') {
+    return jsonNumber(value);
+  }
+  if (ArrayBuffer.isView(value) && !(value instanceof DataView)) {
+    return Array.from(value, jsonNumber);
+  }
+  return value;
+}
@@ -1,10 +1,21 @@
 import sys
 import json
+import math
+import os
 import asyncio
+import concurrent.futures
+import threading
+import time
 import traceback
-import numpy as np
 from datetime import datetime
 
+BATCH_CONCURRENCY = int(os.environ.get("ANALYZER_BATCH_CONCURRENCY", "16"))
+# How long a pong waits for the event loop to snapshot the counters
+PING_STATS_TIMEOUT = float(os.environ.get("ANALYZER_PING_STATS_TIMEOUT_MS", "200")) / 1000
+
+# Identical analyses running at the same time in this process share one run
+_analyses = None
+
 def log_debug(message):
     """Log debug messages to stderr"""
     print(f"DEBUG: {message}", file=sys.stderr)
@@ -13,65 +24,408 @@ def log_error(message):
     """Log error messages to stderr"""
     print(f"ERROR: {message}", file=sys.stderr)
 
+def sanitize_floats(obj):
+    """Replace NaN and Infinity values, which are not valid JSON, by strings"""
+    if isinstance(obj, float):
+        if math.isnan(obj):
+            return "NaN"
+        if math.isinf(obj):
+            return "Infinity" if obj > 0 else "-Infinity"
+        return obj
+    if isinstance(obj, dict):
+        return {k: sanitize_floats(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [sanitize_floats(v) for v in obj]
+    if hasattr(obj, "tolist"):
+        # NumPy arrays and scalars, e.g. full indicator series
+        return sanitize_floats(obj.tolist())
+    return obj
+
+def success_payload(results):
+    return {
+        "success": True,
+        "data": results,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def error_payload(error, prefix=""):
+    return {
+        "success": False,
+        "error": f"{prefix}{str(error)}",
+        "traceback": traceback.format_exc(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+async def analyze_token(token_address, chain="ethereum", full_series=False, window=None,
+                        include_timings=False, profile=False):
+    """
+    Run a full analysis for one token and return the raw results.
+
+    Concurrent calls for the same ``(chain, normalized address)``, options
+    and deadline budget wait for the analysis already in flight and share
+    its result: a call never gets the result of a flight cut short by a
+    smaller budget. With ``profile``, the analysis is profiled (see
+    profiling.py).
+    """
+    global _analyses
+    from crypto_analyzer import CryptoAnalyzer, normalize_token_address
+    from deadline import current_deadline
+    from singleflight import SingleFlight
+    if _analyses is None:
+        _analyses = SingleFlight()
+
+    budget = current_deadline.get()
+    budget_ms = None if budget is None else round((budget.expires - budget.started) * 1000)
+    key = (chain, normalize_token_address(token_address, chain), full_series, window, include_timings, profile,
+           budget_ms)
+
+    async def run():
+        analyzer = CryptoAnalyzer(token_address, chain)
+        return await analyzer.run_analysis(full_series=full_series, window=window,
+                                           include_timings=include_timings, profile=profile)
+
+    return await _analyses.do(key, run)
+
+def coalescing_stats():
+    """Single-flight counters of this process, per layer"""
+    from cache import peek_cache
+    cache = peek_cache()
+    empty = {"calls": 0, "coalesced": 0}
+    return {
+        "analysis": dict(_analyses.stats) if _analyses else empty,
+        "upstream": dict(cache.flights.stats) if cache else empty,
+    }
+
+def rate_limit_stats():
+    """Per-host rate limiter counters of this process"""
+    from rate_limiter import get_limiter
+    return get_limiter().stats()
+
+async def shutdown():
+    """Let background cache refreshes finish, then close pooled connections"""
+    from cache import get_cache
+    from http_client import close_client
+    await get_cache().drain()
+    await close_client()
+
+def parse_batch_tokens(text):
+    """
+    Parse a batch token list.
+
+    Accepts a JSON array of ``{"address", "chain"}`` objects, JSON lines, or
+    plain lines of ``address[,chain]``.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        items = json.loads(text)
+    else:
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                items.append(json.loads(line))
+            else:
+                parts = [p for p in line.replace(",", " ").split() if p]
+                items.append({"address": parts[0], "chain": parts[1] if len(parts) > 1 else None})
+
+    tokens = []
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            item = {"address": item[0], "chain": item[1] if len(item) > 1 else None}
+        tokens.append({"address": item["address"], "chain": item.get("chain") or "ethereum"})
+    return tokens
+
+async def analyze_batch(tokens, concurrency=BATCH_CONCURRENCY, on_result=None, include_timings=False,
+                        background=True):
+    """
+    Analyze many tokens concurrently, at most ``concurrency`` at a time.
+
+    ``on_result`` is called with each token's result as soon as it finishes,
+    so callers can stream results instead of waiting for the whole batch.
+    With ``background``, upstream calls of the batch yield to interactive
+    analyses when a host is rate limited.
+    Returns the number of successful analyses.
+    """
+    from rate_limiter import BACKGROUND, INTERACTIVE, current_priority
+    semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+    succeeded = 0
+
+    async def run_one(index, token):
+        nonlocal succeeded
+        # Each run_one is its own task, so this does not leak to the caller
+        current_priority.set(BACKGROUND if background else INTERACTIVE)
+        async with semaphore:
+            try:
+                results = await analyze_token(token["address"], token["chain"],
+                                              include_timings=include_timings)
+                item = {"index": index, "address": token["address"], "chain": token["chain"],
+                        **success_payload(results)}
+                succeeded += 1
+            except Exception as e:
+                item = {"index": index, "address": token["address"], "chain": token["chain"],
+                        **error_payload(e)}
+        if on_result:
+            on_result(item)
+
+    await asyncio.gather(*(run_one(i, t) for i, t in enumerate(tokens)))
+    return succeeded
+
+async def batch_main(args):
+    """Run ``analyzer.py --batch [FILE|-] [--concurrency N]``, writing NDJSON results"""
+    source = "-"
+    concurrency = BATCH_CONCURRENCY
+    i = 0
+    while i < len(args):
+        if args[i] == "--concurrency" and i + 1 < len(args):
+            concurrency = int(args[i + 1])
+            i += 2
+            continue
+        source = args[i]
+        i += 1
+
+    out = sys.stdout
+    # Les logs de l'analyse ne doivent pas se mélanger au flux NDJSON
+    sys.stdout = sys.stderr
+    try:
+        if source == "-":
+            text = sys.stdin.read()
+        else:
+            with open(source) as f:
+                text = f.read()
+        tokens = parse_batch_tokens(text)
+        log_debug(f"Batch of {len(tokens)} tokens, concurrency {concurrency}")
+
+        def emit(item):
+            out.write(json.dumps(sanitize_floats(item)) + "\n")
+            out.flush()
+
+        succeeded = await analyze_batch(tokens, concurrency, emit)
+        log_debug(f"Batch completed: {succeeded}/{len(tokens)} succeeded")
+    finally:
+        sys.stdout = out
+        await shutdown()
+
 async def main():
     try:
         log_debug("Starting analyzer.py")
-        
+
         if len(sys.argv) < 2:
             raise ValueError("Token address required")
 
         token_address = sys.argv[1]
         chain = sys.argv[2] if len(sys.argv) > 2 else "ethereum"
-        
+
         log_debug(f"Processing token: {token_address} on chain: {chain}")
-        
-        from crypto_analyzer import CryptoAnalyzer
-        analyzer = CryptoAnalyzer(token_address, chain)
-        
+
         log_debug("Running analysis...")
-        results = await analyzer.run_analysis()
+        results = await analyze_token(token_address, chain)
         log_debug("Analysis completed successfully")
-        
-        # Formater la sortie JSON avec une précision maximale
-        formatted_results = {
-            "success": True,
-            "data": results,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Handle NaN and Infinity values for JSON serialization
-        def json_serializer(obj):
-            if isinstance(obj, float):
-                if np.isnan(obj):
-                    return "NaN"
-                elif np.isinf(obj) and obj > 0:
-                    return "Infinity"
-                elif np.isinf(obj) and obj < 0:
-                    return "-Infinity"
-            return obj
-        
+
         # Imprimer le JSON sur stdout sans logs supplémentaires
-        print(json.dumps(formatted_results, default=json_serializer))
-        
+        print(json.dumps(sanitize_floats(success_payload(results))))
+
     except Exception as e:
-        error_data = {
-            "success": False,
-            "error": str(e),
-            "traceback": traceback.format_exc(),
-            "timestamp": datetime.now().isoformat()
-        }
-        print(json.dumps(error_data))
+        print(json.dumps(error_payload(e)))
         sys.exit(1)
+    finally:
+        await shutdown()
+
+class Worker:
+    """
+    Long-lived analysis worker.
+
+    Each stdin line is a JSON job ``{"id": ..., "op": "analyze", "address": ..., "chain": ...}``,
+    a batch ``{"id": ..., "op": "batch", "tokens": [...], "concurrency": N}``,
+    a live update ``{"id": ..., "op": "tick", "address": ..., "state": ...}`` (see live.py),
+    a long-history analysis ``{"id": ..., "op": "long_history", "address": ..., "window": N}``
+    (see long_history.py)
+    or a health check ``{"id": ..., "op": "ping"}``. Every job gets exactly one
+    final message carrying the same ``id``; batch jobs additionally stream
+    one ``item`` message per token as it completes. Analysis results always
+    carry their stage ``timings``, which the Node server aggregates into metrics.
+
+    Jobs with ``"priority": "background"`` (precomputed snapshots) let
+    interactive analyses go first on rate-limited upstream hosts. Jobs with
+    ``"deadline_ms"`` (and the ``"requested_at"`` epoch time it counts from)
+    bound every upstream call of the analysis (see deadline.py). Jobs with
+    ``"profile": true`` are profiled (see profiling.py).
+
+    Messages are written as frames (see protocol.py) on their own file
+    descriptor (``ANALYZER_PROTOCOL_FD``, default 3), apart from stdout and
+    stderr which only carry logs. Jobs with ``"binary": true`` get their
+    full series as raw float64 arrays.
+
+    Stdin is read on a separate thread which answers pings itself, so health
+    checks keep working while an analysis holds the event loop.
+    """
+
+    def __init__(self):
+        self.out = self._open_channel()
+        self.out_lock = threading.Lock()
+        self.jobs_done = 0
+        self.in_flight = 0
+
+    @staticmethod
+    def _open_channel():
+        fd = int(os.environ.get("ANALYZER_PROTOCOL_FD", "3"))
+        try:
+            return os.fdopen(fd, "wb")
+        except OSError:
+            # Started by hand, without the extra pipe: frames go to stdout
+            log_debug(f"File descriptor {fd} is not open, writing frames to stdout")
+            return sys.stdout.buffer
+
+    def send(self, message, binary=False):
+        from protocol import encode_frame
+        frame = encode_frame(message, binary)
+        with self.out_lock:
+            self.out.write(frame)
+            self.out.flush()
+
+    async def handle(self, job):
+        job_id = job.get("id")
+        self.in_flight += 1
+        try:
+            op = job.get("op", "analyze")
+            if op == "batch":
+                await self.handle_batch(job)
+                return
+            if op == "tick":
+                await self.handle_tick(job)
+                return
+            if op == "long_history":
+                await self.handle_long_history(job)
+                return
+            if op != "analyze":
+                raise ValueError(f"Unknown op: {op}")
+            if not job.get("address"):
+                raise ValueError("Token address required")
+
+            from deadline import current_deadline, make_deadline
+            from rate_limiter import BACKGROUND, INTERACTIVE, current_priority
+            # Each job runs in its own task: the priority and deadline only apply to this one
+            current_priority.set(BACKGROUND if job.get("priority") == "background" else INTERACTIVE)
+            if job.get("deadline_ms"):
+                # The budget runs from the HTTP request, queue wait included
+                queued = (time.time() * 1000 - job["requested_at"]) / 1000 if job.get("requested_at") else 0.0
+                current_deadline.set(make_deadline(job["deadline_ms"] / 1000, queued))
+
+            results = await analyze_token(
+                job["address"], job.get("chain") or "ethereum",
+                full_series=bool(job.get("series")), window=job.get("window"),
+                include_timings=True, profile=bool(job.get("profile"))
+            )
+            self.send({"id": job_id, "type": "result", **success_payload(results)}, bool(job.get("binary")))
+        except Exception as e:
+            log_error(f"Job {job_id} failed: {str(e)}")
+            self.send({"id": job_id, "type": "result", **error_payload(e)})
+        finally:
+            self.in_flight -= 1
+            self.jobs_done += 1
+
+    async def handle_tick(self, job):
+        from live import live_tick
+        if not job.get("address"):
+            raise ValueError("Token address required")
+        results = await live_tick(job["address"], job.get("chain") or "ethereum", job.get("state"))
+        self.send({"id": job.get("id"), "type": "result", **success_payload(results)})
+
+    async def handle_long_history(self, job):
+        from long_history import analyze_token as analyze_long_history
+        if not job.get("address"):
+            raise ValueError("Token address required")
+        results = await analyze_long_history(job["address"], job.get("chain") or "ethereum", job.get("window"))
+        self.send({"id": job.get("id"), "type": "result", **success_payload(results)})
+
+    async def handle_batch(self, job):
+        job_id = job.get("id")
+        tokens = parse_batch_tokens(json.dumps(job.get("tokens") or []))
+
+        def emit(item):
+            self.send({"id": job_id, "type": "item", **item}, bool(job.get("binary")))
+
+        succeeded = await analyze_batch(tokens, job.get("concurrency") or BATCH_CONCURRENCY, emit,
+                                        include_timings=True)
+        self.send({"id": job_id, "type": "result", "success": True,
+                   "data": {"total": len(tokens), "succeeded": succeeded,
+                            "failed": len(tokens) - succeeded},
+                   "timestamp": datetime.now().isoformat()})
+
+    def ping_stats(self, loop):
+        """
+        Counters for a pong, snapshotted on the event loop that updates
+        them. A busy loop still gets its pong, without the counters.
+        """
+        async def snapshot():
+            return {"coalescing": coalescing_stats(), "rate_limits": rate_limit_stats()}
+
+        future = asyncio.run_coroutine_threadsafe(snapshot(), loop)
+        try:
+            return future.result(PING_STATS_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return {}
+        except Exception as e:
+            log_error(f"Could not snapshot the worker stats: {str(e)}")
+            return {}
+
+    def read_jobs(self, loop, jobs):
+        """Reader thread: answer pings, hand every other job to the event loop"""
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                log_error(f"Invalid job line: {str(e)}")
+                continue
+
+            if job.get("op") == "ping":
+                self.send({"id": job.get("id"), "type": "pong",
+                           "jobs_done": self.jobs_done, "in_flight": self.in_flight,
+                           **self.ping_stats(loop)})
+            else:
+                loop.call_soon_threadsafe(jobs.put_nowait, job)
+        loop.call_soon_threadsafe(jobs.put_nowait, None)
+
+    async def run(self):
+        # Stray prints go to stderr, even when frames fall back to stdout
+        sys.stdout = sys.stderr
+        loop = asyncio.get_running_loop()
+        jobs = asyncio.Queue()
+
+        # Warm up the heavy imports once, before announcing readiness
+        import aiohttp  # noqa: F401
+        import crypto_analyzer  # noqa: F401
+        self.send({"type": "ready"})
+
+        threading.Thread(target=self.read_jobs, args=(loop, jobs), daemon=True).start()
+
+        tasks = set()
+        while True:
+            job = await jobs.get()
+            if job is None:
+                break
+            task = asyncio.ensure_future(self.handle(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+            asyncio.run(Worker().run())
+        elif len(sys.argv) > 1 and sys.argv[1] == "--batch":
+            asyncio.run(batch_main(sys.argv[2:]))
+        else:
+            asyncio.run(main())
     except Exception as e:
-        error_data = {
-            "success": False,
-            "error": f"Fatal error in main loop: {str(e)}",
-            "traceback": traceback.format_exc(),
-            "timestamp": datetime.now().isoformat()
-        }
-        print(json.dumps(error_data))
-        sys.exit(1)
\ No newline at end of file
+        print(json.dumps(error_payload(e, "Fatal error in main loop: ")))
+        sys.exit(1)
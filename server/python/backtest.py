@@ -0,0 +1,240 @@
+"""
+Vectorized backtest of the ``get_trading_signals`` rules.
+
+The RSI/MACD/Bollinger/EMA rules are evaluated at every bar of every token
+(the recommendation ``get_trading_signals`` would have given with the
+history up to that bar), turned into positions, and traded with fees and
+slippage. Everything is array arithmetic over ``(n_tokens, n_bars)``
+matrices; the only Python loop is over blocks of tokens to bound memory.
+
+    python3 backtest.py prices.json [--fee 0.001] [--slippage 0.0005] [--short]
+
+where ``prices.json`` is a list of closing prices or a list of such lists
+(one per token, all with the same number of bars).
+"""
+import json
+import sys
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from cross_section import RECOMMENDATIONS, trading_signal_counts
+from indicator_engine import EMA_SPANS, bollinger_series, ema_series, macd_series, rsi_series
+
+DEFAULT_FEE = 0.001        # per unit of position traded (10 bps)
+DEFAULT_SLIPPAGE = 0.0005  # per unit of position traded (5 bps)
+CHUNK_ROWS = 64
+
+LONG_ENTRY = ("STRONG_BUY",)
+LONG_EXIT = ("SELL", "STRONG_SELL")
+SHORT_ENTRY = ("STRONG_SELL",)
+SHORT_EXIT = ("BUY", "STRONG_BUY")
+
+
+def _codes(names: Iterable[str]) -> np.ndarray:
+    unknown = set(names) - set(RECOMMENDATIONS)
+    if unknown:
+        raise ValueError(f"Unknown recommendations: {', '.join(sorted(unknown))}")
+    return np.array([RECOMMENDATIONS.index(n) for n in names], dtype=np.int8)
+
+
+def signal_recommendations(close: np.ndarray) -> np.ndarray:
+    """
+    Recommendation index (into ``RECOMMENDATIONS``) at every bar of every row,
+    as ``get_trading_signals`` would return it on the history up to that bar.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    rsi = rsi_series(close)
+    macd = macd_series(close)
+    bands = bollinger_series(close)
+    emas = ema_series(close, EMA_SPANS[:2])
+    counts = trading_signal_counts(
+        rsi, macd["macd"], macd["signal"], bands["upper"], bands["lower"],
+        emas[f"EMA{EMA_SPANS[0]}"], emas[f"EMA{EMA_SPANS[1]}"], close
+    )
+    return counts["recommendation"]
+
+
+def _forward_fill_index(events: np.ndarray) -> np.ndarray:
+    """Index of the latest event at or before each bar (-1 before the first)"""
+    idx = np.where(events, np.arange(events.shape[-1]), -1)
+    return np.maximum.accumulate(idx, axis=-1)
+
+
+def target_positions(
+    recommendation: np.ndarray,
+    allow_short: bool = False,
+    long_entry: Iterable[str] = LONG_ENTRY,
+    long_exit: Iterable[str] = LONG_EXIT,
+    short_entry: Iterable[str] = SHORT_ENTRY,
+    short_exit: Iterable[str] = SHORT_EXIT
+) -> np.ndarray:
+    """
+    Position wanted at the close of each bar (+1 long, -1 short, 0 flat).
+
+    An entry recommendation opens (or flips to) a position that is held
+    until an exit recommendation for that side, or the next entry.
+    """
+    rec = np.asarray(recommendation)
+    direction = np.zeros(rec.shape, dtype=np.int8)
+    direction[np.isin(rec, _codes(long_entry))] = 1
+    if allow_short:
+        direction[np.isin(rec, _codes(short_entry))] = -1
+
+    # Side of the latest entry, carried forward
+    last_entry = _forward_fill_index(direction != 0)
+    side = np.take_along_axis(direction, np.maximum(last_entry, 0), axis=-1)
+    side[last_entry < 0] = 0
+
+    # Flat from the first matching exit after that entry until the next one
+    exits = ((side == 1) & np.isin(rec, _codes(long_exit))) | ((side == -1) & np.isin(rec, _codes(short_exit)))
+    seen = np.cumsum(exits, axis=-1, dtype=np.int32)
+    at_entry = np.take_along_axis(seen - exits, np.maximum(last_entry, 0), axis=-1)
+    return np.where(seen > at_entry, 0, side).astype(np.int8)
+
+
+def _block(close: np.ndarray, cost: float, allow_short: bool, rules: Dict) -> Dict[str, np.ndarray]:
+    m, n = close.shape
+    target = target_positions(signal_recommendations(close), allow_short, **rules)
+
+    # Signals use the bar's close, so the position is held over the next bar
+    held = np.zeros((m, n), dtype=np.int8)
+    held[:, 1:] = target[:, :-1]
+    returns = np.zeros((m, n))
+    returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+
+    traded = np.abs(np.diff(held, axis=1, prepend=0)).astype(np.float64)
+    gross = held * returns
+    net = gross - cost * traded
+    log_net = np.log1p(net)
+    equity = np.exp(np.cumsum(log_net, axis=1))
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+
+    # Trades: maximal runs of the same non-zero position (flips start a new one)
+    prev = np.concatenate([np.zeros((m, 1), dtype=np.int8), held[:, :-1]], axis=1)
+    starts = (held != 0) & (held != prev)
+    ends = (held != 0) & (np.concatenate([held[:, 1:], np.zeros((m, 1), dtype=np.int8)], axis=1) != held)
+    closed = ends.copy()
+    closed[:, -1] = False  # still open at the last bar
+    trade_id = np.cumsum(starts.ravel()) - 1
+    in_trade = (held != 0).ravel()
+    n_total = int(starts.sum())
+    # Entry cost and mark-to-market returns, plus the exit cost of closed trades
+    trade_log = np.bincount(
+        trade_id[in_trade],
+        np.log1p(gross.ravel()[in_trade] - cost * starts.ravel()[in_trade]),
+        minlength=n_total
+    ).astype(np.float64)
+    trade_log[trade_id[closed.ravel()]] += np.log1p(-cost)
+    trade_return = np.expm1(trade_log)
+    trade_row = np.repeat(np.arange(m), starts.sum(axis=1))
+    trade_closed = np.zeros(n_total, dtype=bool)
+    trade_closed[trade_id[closed.ravel()]] = True
+
+    wins = np.bincount(trade_row[trade_closed & (trade_return > 0)], minlength=m)
+    n_closed = np.bincount(trade_row[trade_closed], minlength=m)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_rate = wins / n_closed
+
+    return {
+        "total_return": equity[:, -1] - 1,
+        "max_drawdown": drawdown.min(axis=1),
+        "trades": starts.sum(axis=1),
+        "closed_trades": n_closed,
+        "hit_rate": hit_rate,
+        "turnover": traded.sum(axis=1),
+        "exposure": (held != 0).mean(axis=1),
+        "costs": (cost * traded).sum(axis=1),
+        "buy_and_hold_return": close[:, -1] / close[:, 0] - 1,
+        "positions": held,
+        "returns": net,
+        "equity": equity,
+    }
+
+
+def run_backtest(
+    close: np.ndarray,
+    fee: float = DEFAULT_FEE,
+    slippage: float = DEFAULT_SLIPPAGE,
+    allow_short: bool = False,
+    long_entry: Iterable[str] = LONG_ENTRY,
+    long_exit: Iterable[str] = LONG_EXIT,
+    short_entry: Iterable[str] = SHORT_ENTRY,
+    short_exit: Iterable[str] = SHORT_EXIT,
+    chunk_rows: Optional[int] = CHUNK_ROWS
+) -> Dict[str, np.ndarray]:
+    """
+    Backtest the trading signal rules on one or many price histories.
+
+    A position is taken at the close of the bar that produced the signal
+    and held over the following bars; every change of position pays
+    ``fee + slippage`` per unit traded (a flip from long to short trades
+    two units).
+
+    Args:
+        close: Closing prices, ``(n_bars,)`` or ``(n_tokens, n_bars)``.
+            Rows must be complete (no NaN); trim them to a common start.
+        fee: Exchange fee, as a fraction of the traded notional
+        slippage: Execution slippage, as a fraction of the traded notional
+        allow_short: Also open short positions on ``short_entry``
+        long_entry, long_exit, short_entry, short_exit: Recommendations
+            (names from ``RECOMMENDATIONS``) that open / close each side
+        chunk_rows: Tokens processed per block, to bound memory
+    Returns:
+        Dict of per-token ``(n_tokens,)`` statistics (``total_return``,
+        ``max_drawdown``, ``trades``, ``closed_trades``, ``hit_rate`` over
+        closed trades, ``turnover`` in position units, ``exposure``,
+        ``costs``, ``buy_and_hold_return``) and per-bar
+        ``(n_tokens, n_bars)`` ``positions``, net ``returns`` and ``equity``.
+        A 1-D input gives scalars and 1-D series instead.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    single = close.ndim == 1
+    close = np.atleast_2d(close)
+    if close.ndim != 2 or close.shape[1] < 2:
+        raise ValueError("Expected at least two bars per token")
+    if not np.isfinite(close).all() or (close <= 0).any():
+        raise ValueError("Prices must be positive and finite")
+
+    cost = fee + slippage
+    rules = {
+        "long_entry": long_entry, "long_exit": long_exit,
+        "short_entry": short_entry, "short_exit": short_exit,
+    }
+    step = chunk_rows or len(close)
+    blocks = [_block(close[i:i + step], cost, allow_short, rules) for i in range(0, len(close), step)]
+    results = {k: np.concatenate([b[k] for b in blocks]) for k in blocks[0]}
+    if single:
+        return {k: v[0] for k, v in results.items()}
+    return results
+
+
+def summarize(results: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Cross-token averages of the per-token statistics"""
+    stats = {}
+    for key in ("total_return", "max_drawdown", "hit_rate", "turnover", "exposure", "buy_and_hold_return"):
+        values = np.atleast_1d(results[key]).astype(np.float64)
+        stats[key] = float(np.nanmean(values)) if (~np.isnan(values)).any() else float("nan")
+    stats["trades"] = int(np.sum(results["trades"]))
+    stats["tokens"] = int(np.size(results["total_return"]))
+    return stats
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 2
+    fee, slippage = DEFAULT_FEE, DEFAULT_SLIPPAGE
+    if "--fee" in argv:
+        fee = float(argv[argv.index("--fee") + 1])
+    if "--slippage" in argv:
+        slippage = float(argv[argv.index("--slippage") + 1])
+    with open(argv[0]) as f:
+        close = np.array(json.load(f), dtype=np.float64)
+    results = run_backtest(close, fee=fee, slippage=slippage, allow_short="--short" in argv)
+    print(json.dumps(summarize(results), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
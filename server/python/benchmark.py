@@ -0,0 +1,559 @@
+"""
+Benchmarks for the indicators and the full analysis.
+
+    python3 benchmark.py [micro|e2e|startup|universe|long|all] [--quick] [--save-baseline] [--strict]
+    python3 benchmark.py record
+
+``micro`` times every ``calculate_*`` series function (and the fused
+``compute_indicators``) on synthetic series of 30, 200, 10k and 1M bars,
+and ``cross_section.compute_indicator_matrix`` / ``score_matrix`` on 5000
+ragged tokens of up to 200 bars.
+``e2e`` times ``CryptoAnalyzer.run_analysis`` against recorded CoinGecko /
+DefiLlama responses served from a local HTTP server, so no network is
+needed: cold (empty response cache), warm (cache filled) and concurrent
+throughput. ``record`` refreshes those responses from the real APIs.
+``startup`` times ``import crypto_analyzer`` in fresh interpreters and
+fails (exit 1) when it exceeds ``--budget-ms`` or loads one of the
+modules the analysis path must not import (pandas, aiohttp, ...).
+``universe`` scores a synthetic universe with ``universe.score_universe``
+on 1, 2, 4, ... processes up to the number of cores and prints the speedup
+over one process (not part of ``all``: it keeps every core busy).
+``long`` analyzes memory-mapped float32 minute histories of 1M to 16M bars
+with ``long_history.analyze_candles`` (not part of ``all``: it writes
+several hundred MB to a temporary directory); the peak memory should not
+grow with the length of the history.
+
+Every case reports latency percentiles, throughput and peak traced memory,
+and is compared with ``benchmarks/baseline.json`` when it exists.
+``--save-baseline`` stores the current numbers as the new baseline;
+``--strict`` exits with 1 when a case regressed by more than ``--threshold``
+(default 1.25x the baseline median or peak memory).
+"""
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(HERE, "benchmarks")
+FIXTURES_PATH = os.path.join(BENCH_DIR, "fixtures.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+MICRO_SIZES = (30, 200, 10_000, 1_000_000)
+MATRIX_SHAPE = (5000, 200)
+MIN_TIME = 0.5
+MIN_RUNS = 3
+MAX_RUNS = 1000
+REGRESSION_THRESHOLD = 1.25
+
+# Tokens replayed end to end: the first three are resolved from the built-in
+# token index, the last one through the CoinGecko contract lookup
+E2E_TOKENS = (
+    ("0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2", "ethereum"),  # WETH
+    ("0x1f9840a85d5af5bf1d1762f925bdaddc4201f984", "ethereum"),  # UNI
+    ("0xdac17f958d2ee523a2206206994597c13d831ec7", "ethereum"),  # USDT
+    ("0x6982508145454ce325ddbe47a25d4ec3d2311933", "ethereum"),  # PEPE
+)
+E2E_RUNS = 40
+E2E_CONCURRENT_JOBS = 200
+E2E_CONCURRENCY = 16
+
+SOURCES = {"coingecko": "COINGECKO_API", "defillama": "DEFILLAMA_API"}
+
+UNIVERSE_TOKENS = 2000
+UNIVERSE_BARS = 2000
+
+LONG_SIZES = (1_000_000, 4_000_000, 16_000_000)
+
+STARTUP_RUNS = 10
+# Median import time of crypto_analyzer allowed, in a fresh interpreter
+STARTUP_BUDGET_MS = 400.0
+# Loaded lazily or not at all: pandas alone costs several hundred ms, and
+# aiohttp is only needed once an upstream call misses the caches
+STARTUP_FORBIDDEN = ("pandas", "tradingview_ta", "aiohttp", "requests")
+
+_STARTUP_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import crypto_analyzer
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q)) if samples else float("nan")
+
+
+def _summarize(samples: List[float], items: float, peak: int) -> Dict:
+    """Latency stats in ms; throughput in items (bars, analyses) per second"""
+    mean = float(np.mean(samples))
+    return {
+        "runs": len(samples),
+        "mean_ms": mean * 1e3,
+        "p50_ms": _percentile(samples, 50) * 1e3,
+        "p95_ms": _percentile(samples, 95) * 1e3,
+        "p99_ms": _percentile(samples, 99) * 1e3,
+        "throughput": items / mean if mean > 0 else float("inf"),
+        "peak_kib": peak / 1024,
+    }
+
+
+def _peak_memory(fn: Callable[[], object]) -> int:
+    """Peak memory traced during one call (NumPy buffers included)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def time_call(fn: Callable[[], object], items: float, min_time: float = MIN_TIME) -> Dict:
+    """Time ``fn`` until ``min_time`` has elapsed (at least MIN_RUNS calls)"""
+    fn()  # warm-up: imports, caches, page faults
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < MAX_RUNS and (len(samples) < MIN_RUNS or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return _summarize(samples, items, _peak_memory(fn))
+
+
+def synthetic_ohlc(n: int, seed: int = 42):
+    """Geometric random walk with high/low around the close"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    spread = np.abs(rng.normal(0, 0.01, n))
+    return close, close * (1 + spread), close * (1 - spread)
+
+
+def micro_benchmarks(sizes=MICRO_SIZES) -> Dict[str, Dict]:
+    from indicator_engine import compute_indicators
+    from indicators import (
+        calculate_adx,
+        calculate_bollinger_bands,
+        calculate_ema_signals,
+        calculate_macd,
+        calculate_rsi,
+    )
+
+    results = {}
+    for n in sizes:
+        close, high, low = synthetic_ohlc(n)
+        cases = {
+            "calculate_rsi": lambda: calculate_rsi(close),
+            "calculate_macd": lambda: calculate_macd(close),
+            "calculate_bollinger_bands": lambda: calculate_bollinger_bands(close),
+            "calculate_ema_signals": lambda: calculate_ema_signals(close),
+            "calculate_adx": lambda: calculate_adx(high, low, close),
+            "compute_indicators": lambda: compute_indicators(close, high, low),
+            "compute_indicators[full_series]": lambda: compute_indicators(close, high, low, full_series=True),
+        }
+        for name, fn in cases.items():
+            key = f"micro/{name}/{n}"
+            results[key] = time_call(fn, n)
+            _print_case(key, results[key], "bars/s")
+    results.update(matrix_benchmarks())
+    return results
+
+
+def matrix_benchmarks(shape=MATRIX_SHAPE) -> Dict[str, Dict]:
+    """The token x bar matrix of cross_section, rows of random lengths"""
+    from cross_section import compute_indicator_matrix, score_matrix
+
+    tokens, bars = shape
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=1))
+    spread = np.abs(rng.normal(0, 0.01, shape))
+    high, low = close * (1 + spread), close * (1 - spread)
+    lengths = rng.integers(20, bars + 1, tokens)
+    cases = {
+        "compute_indicator_matrix": lambda: compute_indicator_matrix(close, high, low, lengths),
+        "score_matrix": lambda: score_matrix(close, high, low, lengths),
+    }
+    results = {}
+    for name, fn in cases.items():
+        key = f"micro/{name}/{tokens}x{bars}"
+        results[key] = time_call(fn, tokens)
+        _print_case(key, results[key], "tokens/s")
+    return results
+
+
+# --- End-to-end ----------------------------------------------------------
+
+def fixture_key(url: str, params: Optional[Dict[str, str]] = None) -> str:
+    """Fixture lookup key: source alias + path + sorted query string"""
+    import crypto_analyzer
+
+    for alias, attr in SOURCES.items():
+        base = getattr(crypto_analyzer, attr)
+        if url.startswith(base):
+            url = f"/{alias}{url[len(base):]}"
+            break
+    query = urlencode(sorted((params or {}).items()))
+    return f"{url}?{query}" if query else url
+
+
+async def _serve_fixtures(fixtures: Dict[str, Dict]):
+    """Serve recorded responses on 127.0.0.1; returns (runner, base_url)"""
+    from aiohttp import web
+
+    async def handler(request):
+        key = request.path
+        if request.query_string:
+            key += "?" + urlencode(sorted(request.query.items()))
+        entry = fixtures.get(key)
+        if entry is None:
+            return web.json_response({"error": "not recorded"}, status=404)
+        return web.json_response(entry.get("body"), status=entry.get("status", 200))
+
+    app = web.Application()
+    app.router.add_route("GET", "/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def _e2e(runs: int, jobs: int, concurrency: int) -> Dict[str, Dict]:
+    import crypto_analyzer
+    from cache import ResponseCache
+    from crypto_analyzer import CryptoAnalyzer
+    from http_client import HttpClient
+    from series_store import SeriesStore
+    from token_index import TokenIndex
+
+    with open(FIXTURES_PATH) as f:
+        fixtures = json.load(f)["responses"]
+    runner, base = await _serve_fixtures(fixtures)
+    saved = {attr: getattr(crypto_analyzer, attr) for attr in SOURCES.values()}
+    for alias, attr in SOURCES.items():
+        setattr(crypto_analyzer, attr, f"{base}/{alias}")
+    http = HttpClient()
+    index = TokenIndex(path="")  # built-in tokens only, whatever is installed locally
+    # Fixtures hold full downloads: incremental fetches would depend on the clock
+    store = SeriesStore(path=None)
+
+    async def analyze(address, chain, cache):
+        result = await CryptoAnalyzer(address, chain, http=http, cache=cache, token_index=index,
+                                      series_store=store).run_analysis()
+        if result.get("status") != "success":
+            raise RuntimeError(f"Analysis of {address} failed: {result.get('error') or result.get('status')}")
+
+    async def measure(make_cache) -> List[float]:
+        samples = []
+        for i in range(runs):
+            address, chain = E2E_TOKENS[i % len(E2E_TOKENS)]
+            cache = make_cache()
+            t0 = time.perf_counter()
+            await analyze(address, chain, cache)
+            samples.append(time.perf_counter() - t0)
+        return samples
+
+    async def peak(make_cache) -> int:
+        tracemalloc.start()
+        try:
+            for address, chain in E2E_TOKENS:
+                await analyze(address, chain, make_cache())
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    results = {}
+    report = sys.stdout
+
+    async def run_cases():
+        warm_cache = ResponseCache(path=None)
+        cold = lambda: ResponseCache(path=None)  # noqa: E731
+        warm = lambda: warm_cache  # noqa: E731
+        for address, chain in E2E_TOKENS:
+            await analyze(address, chain, warm_cache)
+
+        for name, make_cache in (("cold", cold), ("warm", warm)):
+            samples = await measure(make_cache)
+            key = f"e2e/run_analysis/{name}"
+            results[key] = _summarize(samples, 1, await peak(make_cache))
+            _print_case(key, results[key], "analyses/s", report)
+
+        # Throughput with many analyses in flight against the local upstream
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def job(i):
+            async with semaphore:
+                address, chain = E2E_TOKENS[i % len(E2E_TOKENS)]
+                t0 = time.perf_counter()
+                await analyze(address, chain, ResponseCache(path=None))
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(job(i) for i in range(jobs)))
+        elapsed = time.perf_counter() - started
+        key = f"e2e/run_analysis/concurrent{concurrency}"
+        results[key] = _summarize(latencies, 1, 0)
+        results[key]["throughput"] = jobs / elapsed
+        results[key]["peak_kib"] = float("nan")
+        _print_case(key, results[key], "analyses/s", report)
+
+    try:
+        # The analyzer logs every step; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await run_cases()
+    finally:
+        for attr, value in saved.items():
+            setattr(crypto_analyzer, attr, value)
+        await http.close()
+        await runner.cleanup()
+    return results
+
+
+def e2e_benchmarks(runs: int = E2E_RUNS, jobs: int = E2E_CONCURRENT_JOBS,
+                   concurrency: int = E2E_CONCURRENCY) -> Dict[str, Dict]:
+    return asyncio.run(_e2e(runs, jobs, concurrency))
+
+
+async def _record() -> int:
+    """Run one real analysis per E2E token and store every upstream response"""
+    from cache import ResponseCache
+    from crypto_analyzer import CryptoAnalyzer
+    from http_client import HttpClient, UpstreamError
+    from series_store import SeriesStore
+    from token_index import TokenIndex
+
+    responses: Dict[str, Dict] = {}
+
+    class RecordingClient(HttpClient):
+        async def get_json(self, url, params=None, timeout=None, trace=None):
+            key = fixture_key(url, params)
+            try:
+                body = await super().get_json(url, params=params, timeout=timeout, trace=trace)
+            except UpstreamError as e:
+                responses[key] = {"status": e.status, "body": {"error": str(e)}}
+                raise
+            responses[key] = {"status": 200, "body": body}
+            return body
+
+    http = RecordingClient()
+    try:
+        for address, chain in E2E_TOKENS:
+            analyzer = CryptoAnalyzer(address, chain, http=http, cache=ResponseCache(path=None),
+                                      token_index=TokenIndex(path=""), series_store=SeriesStore(path=None))
+            await analyzer.run_analysis()
+    finally:
+        await http.close()
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(FIXTURES_PATH, "w") as f:
+        json.dump({"recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                   "responses": responses}, f, indent=1, sort_keys=True)
+    print(f"Recorded {len(responses)} responses into {FIXTURES_PATH}")
+    return 0
+
+
+# --- Startup -------------------------------------------------------------
+
+def startup_benchmarks(runs: int = STARTUP_RUNS, budget_ms: float = STARTUP_BUDGET_MS):
+    """
+    Import ``crypto_analyzer`` in ``runs`` fresh interpreters.
+
+    Returns the results and the list of budget violations: a median import
+    time over ``budget_ms`` or a forbidden module loaded by the import.
+    """
+    imports, processes = [], []
+    loaded = set()
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        processes.append(time.perf_counter() - t0)
+        probe = json.loads(out.stdout.strip().splitlines()[-1])
+        imports.append(probe["seconds"])
+        loaded.update(m.split(".")[0] for m in probe["modules"])
+
+    results = {
+        "startup/import_crypto_analyzer": _summarize(imports, 1, 0),
+        "startup/interpreter_and_import": _summarize(processes, 1, 0),
+    }
+    for key, stats in results.items():
+        _print_case(key, stats, "starts/s")
+
+    violations = [f"{name} is imported at startup" for name in STARTUP_FORBIDDEN if name in loaded]
+    p50 = results["startup/import_crypto_analyzer"]["p50_ms"]
+    if p50 > budget_ms:
+        violations.append(f"import crypto_analyzer takes {p50:.0f} ms (budget {budget_ms:.0f} ms)")
+    return results, violations
+
+
+# --- Universe ------------------------------------------------------------
+
+def universe_benchmarks(tokens: int = UNIVERSE_TOKENS, bars: int = UNIVERSE_BARS) -> Dict[str, Dict]:
+    """Throughput of the sharded universe scoring per number of processes"""
+    from universe import score_universe
+
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (tokens, bars)), axis=1))
+    lengths = rng.integers(bars // 2, bars + 1, tokens)
+    cpus = os.cpu_count() or 1
+    counts = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+
+    results = {}
+    for workers in counts:
+        key = f"universe/score_universe/{tokens}x{bars}/{workers}proc"
+        results[key] = time_call(lambda: score_universe(close, lengths=lengths, workers=workers), tokens)
+        _print_case(key, results[key], "tokens/s")
+    single = results[f"universe/score_universe/{tokens}x{bars}/1proc"]["p50_ms"]
+    for workers in counts:
+        speedup = single / results[f"universe/score_universe/{tokens}x{bars}/{workers}proc"]["p50_ms"]
+        print(f"  {workers:>3} processes: {speedup:5.2f}x ({speedup / workers:.0%} efficiency)")
+    return results
+
+
+# --- Long histories ------------------------------------------------------
+
+def long_benchmarks(sizes=LONG_SIZES) -> Dict[str, Dict]:
+    """Analysis of memory-mapped candle histories of every size in ``sizes``"""
+    import tempfile
+    from long_history import CHUNK_BARS, analyze_candles, candle_store
+
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        store = candle_store(path)
+        rng = np.random.default_rng(42)
+        last, written = 100.0, 0
+        for n in sizes:
+            # Grow the same history chunk by chunk, never holding it whole
+            while written < n:
+                count = min(CHUNK_BARS, n - written)
+                close = last * np.exp(np.cumsum(rng.normal(0, 0.001, count)))
+                spread = np.abs(rng.normal(0, 0.0005, count))
+                store.append("bench", "long", {
+                    "t": (written + np.arange(count, dtype=np.int64)) * store.bar_ms,
+                    "open": close, "high": close * (1 + spread), "low": close * (1 - spread),
+                    "close": close, "volume": np.ones(count)
+                })
+                last, written = float(close[-1]), written + count
+            candles = store.read("bench", "long")
+            key = f"long/analyze_candles/{n}"
+            results[key] = time_call(lambda: analyze_candles(candles), n)
+            _print_case(key, results[key], "bars/s")
+            del candles
+    return results
+
+
+# --- Reporting -----------------------------------------------------------
+
+def _print_case(key: str, stats: Dict, unit: str, file=None):
+    print(f"{key:<52} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  "
+          f"p99 {stats['p99_ms']:>10.3f} ms  {stats['throughput']:>14,.0f} {unit}  "
+          f"peak {stats['peak_kib']:>10,.0f} KiB", file=file or sys.stdout, flush=True)
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": str(os.cpu_count()),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Print the ratio to the baseline of every case; return the regressed ones"""
+    regressions = []
+    print(f"\n{'case':<52} {'p50 vs baseline':>16} {'peak vs baseline':>17}")
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        time_ratio = stats["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("nan")
+        mem_ratio = stats["peak_kib"] / base["peak_kib"] if base.get("peak_kib") else float("nan")
+        slower = time_ratio > threshold
+        bigger = mem_ratio > threshold
+        flag = "  REGRESSION" if slower or bigger else ""
+        print(f"{key:<52} {time_ratio:>15.2f}x {mem_ratio:>16.2f}x{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def _option(argv: List[str], name: str, default):
+    if name in argv:
+        return type(default)(argv[argv.index(name) + 1])
+    return default
+
+
+def main(argv):
+    mode = argv[0] if argv and not argv[0].startswith("--") else "all"
+    if mode == "record":
+        return asyncio.run(_record())
+    if mode not in ("micro", "e2e", "startup", "universe", "long", "all"):
+        print(__doc__)
+        return 2
+
+    quick = "--quick" in argv
+    results: Dict[str, Dict] = {}
+    if mode in ("micro", "all"):
+        sizes = MICRO_SIZES[:-1] if quick else MICRO_SIZES
+        results.update(micro_benchmarks(sizes))
+    if mode in ("e2e", "all"):
+        runs = _option(argv, "--runs", E2E_RUNS // 4 if quick else E2E_RUNS)
+        concurrency = _option(argv, "--concurrency", E2E_CONCURRENCY)
+        results.update(e2e_benchmarks(runs, _option(argv, "--jobs", E2E_CONCURRENT_JOBS), concurrency))
+    if mode == "universe":
+        tokens = _option(argv, "--tokens", UNIVERSE_TOKENS // 4 if quick else UNIVERSE_TOKENS)
+        results.update(universe_benchmarks(tokens, _option(argv, "--bars", UNIVERSE_BARS)))
+    if mode == "long":
+        results.update(long_benchmarks(LONG_SIZES[:-1] if quick else LONG_SIZES))
+    violations = []
+    if mode in ("startup", "all"):
+        startup, violations = startup_benchmarks(STARTUP_RUNS // 2 if quick else STARTUP_RUNS,
+                                                 _option(argv, "--budget-ms", STARTUP_BUDGET_MS))
+        results.update(startup)
+
+    output = _option(argv, "--json", "")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+
+    baseline_path = _option(argv, "--baseline", BASELINE_PATH)
+    regressions = []
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f)["results"], _option(argv, "--threshold", REGRESSION_THRESHOLD))
+
+    if "--save-baseline" in argv:
+        previous = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                previous = json.load(f)["results"]
+        previous.update(results)
+        with open(baseline_path, "w") as f:
+            json.dump({"environment": environment(), "results": previous}, f, indent=1, sort_keys=True)
+        print(f"\nBaseline saved to {baseline_path}")
+
+    if violations:
+        print("\nStartup budget exceeded:\n  " + "\n  ".join(violations))
+        return 1
+    if regressions and "--strict" in argv:
+        print(f"\n{len(regressions)} case(s) regressed beyond {_option(argv, '--threshold', REGRESSION_THRESHOLD)}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
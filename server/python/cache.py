@@ -0,0 +1,236 @@
+"""Tiered cache for upstream API responses"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from http_client import UpstreamError
+from rate_limiter import BACKGROUND, priority
+from singleflight import SingleFlight
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "upstream.sqlite3")
+CACHE_PATH = os.environ.get("ANALYZER_CACHE_PATH", DEFAULT_CACHE_PATH)
+CACHE_MAX_ENTRIES = int(os.environ.get("ANALYZER_CACHE_MAX_ENTRIES", "2000"))
+# Rows kept in the SQLite file; the ones closest to expiry go first
+CACHE_MAX_ROWS = int(os.environ.get("ANALYZER_CACHE_MAX_ROWS", "50000"))
+# Writes between two passes deleting expired rows and enforcing CACHE_MAX_ROWS
+CACHE_PRUNE_EVERY = 200
+
+
+class CachePolicy(NamedTuple):
+    ttl: float            # seconds during which an entry is served as fresh
+    stale: float          # extra seconds during which it is served while revalidating
+    negative_ttl: float   # seconds a 404 answer is remembered
+
+
+# Per-endpoint freshness
+CACHE_POLICIES: Dict[str, CachePolicy] = {
+    # contract -> id mappings practically never change
+    "coin_id": CachePolicy(ttl=30 * 86400, stale=335 * 86400, negative_ttl=86400),
+    # daily history only gains a point per day
+    "history": CachePolicy(ttl=6 * 3600, stale=18 * 3600, negative_ttl=3600),
+    # intraday points of the analysis window, hourly at best
+    "ticks": CachePolicy(ttl=300, stale=3600, negative_ttl=3600),
+    # current market data
+    "market": CachePolicy(ttl=30, stale=300, negative_ttl=300),
+    "price": CachePolicy(ttl=30, stale=300, negative_ttl=300),
+}
+
+_NOT_FOUND = {"__cache_error__": 404}
+
+
+class ResponseCache:
+    """
+    Bounded in-memory LRU in front of a SQLite store.
+
+    Entries carry two deadlines: ``fresh_until`` (served directly) and
+    ``stale_until`` (served immediately while a background refresh runs).
+    The SQLite file uses WAL mode, so all worker processes share it and it
+    survives restarts; expired rows are deleted every ``CACHE_PRUNE_EVERY``
+    writes, which also caps the file at ``max_rows``. Concurrent misses on the same key share one upstream
+    call (``flights``).
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_rows: int = CACHE_MAX_ROWS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._writes = 0
+        self._memory: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self.flights = SingleFlight()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidations": 0}
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                    " fresh_until REAL NOT NULL, stale_until REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_expiry ON responses (stale_until)")
+                self.prune()
+            except sqlite3.Error as e:
+                print(f"Response cache disabled on disk ({path}): {str(e)}")
+                self._db = None
+
+    def _get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, fresh_until, stale_until FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1], row[2])
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Tuple[Any, float, float]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def set(self, key: str, value: Any, policy: CachePolicy, ttl: Optional[float] = None):
+        now = time.time()
+        fresh_until = now + (policy.ttl if ttl is None else ttl)
+        stale_until = fresh_until + policy.stale
+        entry = (value, fresh_until, stale_until)
+        self._remember(key, entry)
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, fresh_until, stale_until) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), fresh_until, stale_until)
+                )
+            except sqlite3.Error as e:
+                print(f"Response cache write failed: {str(e)}")
+                return
+            self._writes += 1
+            if self._writes % CACHE_PRUNE_EVERY == 0:
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    print(f"Response cache prune failed: {str(e)}")
+
+    def prune(self):
+        """Delete expired rows, then the rows closest to expiry beyond ``max_rows``"""
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM responses WHERE stale_until < ?", (time.time(),))
+        excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_rows
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY stale_until LIMIT ?)", (excess,)
+            )
+
+    async def _fetch_and_store(self, key: str, policy: CachePolicy, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except UpstreamError as e:
+            if e.status == 404:
+                self.set(key, _NOT_FOUND, policy, ttl=policy.negative_ttl)
+            raise
+        self.set(key, value, policy)
+        return value
+
+    def _revalidate(self, key: str, policy: CachePolicy, fetch: Callable[[], Awaitable[Any]]):
+        if key in self._revalidating:
+            return
+
+        async def refresh():
+            try:
+                # Callers already have a value: let interactive calls go first
+                with priority(BACKGROUND):
+                    await self._fetch_and_store(key, policy, fetch)
+            except Exception as e:
+                print(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                self._revalidating.pop(key, None)
+
+        self.stats["revalidations"] += 1
+        self._revalidating[key] = asyncio.ensure_future(refresh())
+
+    async def get_or_fetch(self, key: str, kind: str, fetch: Callable[[], Awaitable[Any]],
+                           trace: Optional[Dict] = None) -> Any:
+        """
+        Return the cached value for ``key`` or fetch it.
+
+        Stale entries are returned immediately and refreshed in the
+        background, so hot keys never wait on upstream. ``trace["result"]``
+        is set to ``hit``, ``stale``, ``miss`` or ``joined`` (a miss that
+        waited for the same fetch already in flight).
+        """
+        policy = CACHE_POLICIES[kind]
+        entry = self._get(key)
+        now = time.time()
+        trace = {} if trace is None else trace
+
+        if entry is not None and now < entry[2]:
+            value, fresh_until, _ = entry
+            if now < fresh_until:
+                self.stats["hits"] += 1
+                trace["result"] = "hit"
+            else:
+                self.stats["stale_hits"] += 1
+                trace["result"] = "stale"
+                self._revalidate(key, policy, fetch)
+            if value == _NOT_FOUND:
+                raise UpstreamError(key, 404, "cached")
+            return value
+
+        self.stats["misses"] += 1
+        trace["result"] = "joined" if self.flights.in_flight(key) else "miss"
+        return await self.flights.do(key, lambda: self._fetch_and_store(key, policy, fetch))
+
+    async def drain(self, timeout: float = 5.0):
+        """Wait for pending background refreshes, e.g. before a one-shot process exits"""
+        pending = list(self._revalidating.values())
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+
+def cache_key(url: str, params: Optional[Dict[str, str]] = None) -> str:
+    if not params:
+        return url
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return f"{url}?{query}"
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def peek_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache if it was created, without creating it"""
+    return _cache
@@ -0,0 +1,124 @@
+"""
+Timestamped price series to OHLCV candles.
+
+Every function works on sorted ``int64`` millisecond timestamps and
+``float64`` values, without Python loops over the points, so long
+histories cost a few vectorized passes. An observation at time ``t`` belongs
+to the bar starting at ``t // bar_ms * bar_ms``.
+
+Bars without any observation are gaps: their candle repeats the previous
+close (open = high = low = close, as-of semantics) and ``gap`` marks them,
+instead of being dropped or padded at the end of the series.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from series_store import BAR_MS
+
+
+def sort_by_time(t: np.ndarray, *values: np.ndarray):
+    """Timestamps and values ordered by time (stable, so equal times keep their order)"""
+    t = np.asarray(t, dtype=np.int64)
+    if len(t) < 2 or (t[1:] >= t[:-1]).all():
+        return (t,) + tuple(np.asarray(v, dtype=np.float64) for v in values)
+    order = np.argsort(t, kind="stable")
+    return (t[order],) + tuple(np.asarray(v, dtype=np.float64)[order] for v in values)
+
+
+def asof(t: np.ndarray, source_t: np.ndarray, source_values: np.ndarray,
+         tolerance_ms: Optional[int] = None) -> np.ndarray:
+    """
+    As-of join: for every time of ``t``, the last ``source_values`` observed
+    at or before it (``source_t`` sorted), or NaN when there is none or it is
+    older than ``tolerance_ms``.
+    """
+    t = np.asarray(t, dtype=np.int64)
+    source_values = np.asarray(source_values, dtype=np.float64)
+    idx = np.searchsorted(source_t, t, side="right") - 1
+    found = idx >= 0
+    if tolerance_ms is not None:
+        found &= t - source_t[np.maximum(idx, 0)] <= tolerance_ms
+    return np.where(found, source_values[np.maximum(idx, 0)], np.nan) if len(source_t) else np.full(len(t), np.nan)
+
+
+def resample_ohlcv(
+    t: np.ndarray,
+    price: np.ndarray,
+    volume: Optional[np.ndarray] = None,
+    bar_ms: int = BAR_MS,
+    start: Optional[int] = None,
+    end: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Candles of every bar from ``start`` (default: the first observation)
+    to ``end`` (default: the last one).
+
+    ``volume`` holds cumulative rolling volumes such as CoinGecko's 24h
+    ``total_volumes``: a candle takes the last one of its bar.
+
+    Returns ``t`` (bar start), ``open``, ``high``, ``low``, ``close``,
+    ``volume``, ``ticks`` (observations per bar) and ``gap``. Bars before the
+    first observation have NaN prices.
+    """
+    t, price, volume = sort_by_time(t, price, np.full(len(t), np.nan) if volume is None else volume)
+    keep = ~np.isnan(price)
+    t, price, volume = t[keep], price[keep], volume[keep]
+    if (start is None or end is None) and not len(t):
+        first_bar, n = 0, 0
+    else:
+        first_bar = (t[0] if start is None else start) // bar_ms
+        last_bar = (t[-1] if end is None else end) // bar_ms
+        n = max(0, int(last_bar - first_bar) + 1)
+    bars = t // bar_ms - first_bar
+    inside = (bars >= 0) & (bars < n)
+    bars, price, volume = bars[inside], price[inside], volume[inside]
+
+    out = {
+        "t": (first_bar + np.arange(n, dtype=np.int64)) * bar_ms,
+        "open": np.full(n, np.nan),
+        "high": np.full(n, np.nan),
+        "low": np.full(n, np.nan),
+        "close": np.full(n, np.nan),
+        "volume": np.full(n, np.nan),
+        "ticks": np.zeros(n, dtype=np.int64),
+    }
+    if len(bars):
+        # Observations are sorted, so each bar's observations are contiguous
+        starts = np.flatnonzero(np.r_[True, bars[1:] != bars[:-1]])
+        ends = np.r_[starts[1:], len(bars)] - 1
+        observed = bars[starts]
+        out["open"][observed] = price[starts]
+        out["close"][observed] = price[ends]
+        out["high"][observed] = np.maximum.reduceat(price, starts)
+        out["low"][observed] = np.minimum.reduceat(price, starts)
+        out["volume"][observed] = volume[ends]
+        out["ticks"][observed] = np.diff(np.r_[starts, len(bars)])
+
+    out["gap"] = out["ticks"] == 0
+    return fill_gaps(out)
+
+
+def fill_gaps(candles: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Give the bars marked in ``gap`` the previous close as open, high, low and close"""
+    gap = candles["gap"]
+    if gap.any():
+        close = candles["close"]
+        close[gap] = np.nan
+        fill_forward(close)
+        for key in ("open", "high", "low"):
+            candles[key][gap] = close[gap]
+        candles["volume"][gap] = np.nan
+    return candles
+
+
+def fill_forward(values: np.ndarray) -> np.ndarray:
+    """Replace NaN values by the last value before them, in place"""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    filled = values[idx]
+    # Leading NaN stay NaN
+    filled[~np.maximum.accumulate(valid)] = np.nan
+    values[...] = filled
+    return values
@@ -0,0 +1,349 @@
+"""
+Cross-sectional indicators over a matrix of many tokens.
+
+``compute_indicator_matrix`` takes ``(n_tokens, n_bars)`` price matrices and
+returns, for every row at once, the values ``compute_indicators`` and
+``get_trading_signals`` would give on that row alone. Rows of different
+lengths are NaN-padded (or described by ``lengths``); outputs are flat
+arrays indexed like the input rows rather than per-token dicts.
+"""
+import warnings
+from typing import Dict, Optional
+
+import numpy as np
+
+from indicator_engine import (
+    ADX_PERIOD,
+    BB_PERIOD,
+    BB_STD_DEV,
+    EMA_SPANS,
+    MACD_FAST,
+    MACD_SIGNAL,
+    MACD_SLOW,
+    RSI_PERIOD,
+)
+from kernels import (
+    ewm_last,
+    ewm_last_weights,
+    ewm_mean,
+    nested_ewm_last_weights,
+    rolling_mean_std,
+    span_to_alpha,
+)
+
+# Index of each recommendation in the ``recommendation`` output array
+RECOMMENDATIONS = ("NEUTRAL", "BUY", "STRONG_BUY", "SELL", "STRONG_SELL")
+
+
+def _alignment(x: np.ndarray, lengths: Optional[np.ndarray]):
+    """
+    Flat source index of every output cell of align_right and the padding
+    mask, or None if no row moves
+    """
+    m, n = x.shape
+    if lengths is None:
+        valid = ~np.isnan(x)
+        last = n - 1 - np.argmax(valid[:, ::-1], axis=1)
+        last[~valid.any(axis=1)] = -1
+    else:
+        last = np.asarray(lengths, dtype=np.int64) - 1
+    shift = (n - 1) - last
+    if not shift.any():
+        return None
+    idx = np.arange(n)[None, :] - shift[:, None]
+    # Anything before the row start is padding, whatever it contained
+    return np.clip(idx, 0, n - 1) + (n * np.arange(m))[:, None], idx < 0
+
+
+def _shift(x: np.ndarray, alignment) -> np.ndarray:
+    if alignment is None:
+        return x
+    source, padding = alignment
+    out = np.take(x, source)
+    np.copyto(out, np.nan, where=padding)
+    return out
+
+
+def align_right(x: np.ndarray, lengths: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Shift every row so its last observation lands in the last column,
+    padding the front with NaN.
+
+    Rows are taken as ``x[i, :lengths[i]]`` when ``lengths`` is given,
+    otherwise as everything up to the row's last non-NaN value.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return _shift(x, _alignment(x, lengths))
+
+
+def _align_prices(close, high, low, lengths):
+    """Right-align close, and high/low by the same shifts, computed once"""
+    close = np.asarray(close, dtype=np.float64)
+    alignment = _alignment(close, lengths)
+    aligned = _shift(close, alignment)
+    if high is not None:
+        high = _shift(np.asarray(high, dtype=np.float64), alignment)
+    if low is not None:
+        low = _shift(np.asarray(low, dtype=np.float64), alignment)
+    return aligned, high, low
+
+
+def trading_signal_counts(
+    rsi: np.ndarray,
+    macd: np.ndarray,
+    macd_signal: np.ndarray,
+    bb_upper: np.ndarray,
+    bb_lower: np.ndarray,
+    ema_fast: np.ndarray,
+    ema_slow: np.ndarray,
+    price: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized ``get_trading_signals``: the same RSI/MACD/BB/EMA rules
+    applied element-wise to arrays of any (matching) shape.
+    """
+    buy = ((rsi < 30).astype(np.int8)
+           + (macd > macd_signal)
+           + (price < bb_lower)
+           + ((price > ema_fast) & (ema_fast > ema_slow)))
+    sell = ((rsi > 70).astype(np.int8)
+            + (macd < macd_signal)
+            + (price > bb_upper)
+            + ((price < ema_fast) & (ema_fast < ema_slow)))
+    buy = buy.astype(np.int8)
+    sell = sell.astype(np.int8)
+    neutral = (4 - buy - sell).astype(np.int8)
+
+    buy_strength = buy / 4.0
+    sell_strength = sell / 4.0
+    recommendation = np.select(
+        [buy_strength > 0.6, buy_strength > 0.4, sell_strength > 0.6, sell_strength > 0.4],
+        [2, 1, 4, 3],
+        default=0
+    ).astype(np.int8)
+    return {
+        "buy_signals": buy,
+        "sell_signals": sell,
+        "neutral_signals": neutral,
+        "recommendation": recommendation
+    }
+
+
+def _rsi(close: np.ndarray, counts: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    m, n = close.shape
+    if n < 2:
+        return np.full(m, 50.0)
+    delta = np.diff(close, axis=1)
+    # Gains and losses keep the NaN padding; calculate_rsi counts the last
+    # change twice
+    moves = np.empty((2, m, n))
+    np.maximum(delta, 0.0, out=moves[0, :, :-1])
+    np.minimum(delta, 0.0, out=moves[1, :, :-1])
+    np.negative(moves[1, :, :-1], out=moves[1, :, :-1])
+    moves[:, :, -1] = moves[:, :, -2]
+
+    avg = ewm_last(moves, 1.0 / period, adjust=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg[0] / np.maximum(avg[1], 0.0001)
+        rsi = 100 - (100 / (1 + rs))
+
+    any_gain = (delta > 0).any(axis=1)
+    any_loss = (delta < 0).any(axis=1)
+    rsi = np.where(~any_gain, 0.0, rsi)
+    rsi = np.where(~any_loss, 100.0, rsi)
+    rsi = np.where(~any_gain & ~any_loss, 50.0, rsi)
+    return np.where(counts < period + 1, 50.0, rsi)
+
+
+def _adx(high: np.ndarray, low: np.ndarray, counts: np.ndarray, period: int = ADX_PERIOD) -> np.ndarray:
+    m, n = high.shape
+    first = n - counts
+    # Column j holds the move into bar j; the first bar repeats the first
+    # move, as calculate_adx does with np.insert(x, 0, x[0])
+    moves = np.empty((2, m, n))
+    high_diff = high[:, 1:] - high[:, :-1]
+    low_diff = low[:, :-1] - low[:, 1:]
+    up = high_diff > low_diff
+    # +DM where the high moved more (and up), -DM where the low did, in place
+    pos_dm, neg_dm = moves[0, :, 1:], moves[1, :, 1:]
+    np.multiply(high_diff, up, out=pos_dm)
+    np.maximum(pos_dm, 0.0, out=pos_dm)
+    np.multiply(low_diff, ~up & (low_diff > high_diff), out=neg_dm)
+    np.maximum(neg_dm, 0.0, out=neg_dm)
+    rows = np.nonzero(counts >= 2)[0]
+    moves[:, rows, first[rows]] = moves[:, rows, first[rows] + 1]
+    np.copyto(moves, np.nan, where=np.arange(n)[None, :] < first[:, None])
+
+    # The ATR divides both +DI and -DI, so it cancels out of DX: only the
+    # directional movements need smoothing. Where the ATR is still zero
+    # both movements are too and DX stays NaN, as in calculate_adx.
+    pos, neg = ewm_mean(moves, span_to_alpha(period))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = 100 * np.abs(pos - neg) / (pos + neg)
+    adx = ewm_mean(dx, span_to_alpha(period))[:, -1]
+    return np.where(counts < period + 1, 0.0, adx)
+
+
+def _macd_emas(close: np.ndarray, counts: np.ndarray):
+    """
+    Last MACD line, MACD signal and EMAs of every row, as one product of the
+    price deviations with their closed-form weights.
+    """
+    m, n = close.shape
+    fast, slow, signal = (span_to_alpha(s) for s in (MACD_FAST, MACD_SLOW, MACD_SIGNAL))
+    weights = np.column_stack([
+        ewm_last_weights(fast, n) - ewm_last_weights(slow, n),
+        nested_ewm_last_weights(fast, signal, n) - nested_ewm_last_weights(slow, signal, n),
+    ] + [ewm_last_weights(span_to_alpha(s), n) for s in EMA_SPANS])
+
+    rows = np.nonzero(counts > 0)[0]
+    offset = np.full(m, np.nan)
+    offset[rows] = close[rows, n - counts[rows]]
+    deviations = close - offset[:, None]
+    deviations[np.isnan(deviations)] = 0.0
+    projected = deviations @ weights
+    projected[counts == 0] = np.nan
+    return projected[:, 0], projected[:, 1], offset[:, None] + projected[:, 2:]
+
+
+def _indicator_matrix(close: np.ndarray, high: Optional[np.ndarray], low: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+    """compute_indicator_matrix on rows that are already right-aligned"""
+    high = close if high is None else high
+    low = close if low is None else low
+    counts = (~np.isnan(close)).sum(axis=1)
+    price = close[:, -1]
+
+    macd, macd_signal, emas = _macd_emas(close, counts)
+
+    middle, std = rolling_mean_std(close, BB_PERIOD, last_only=True)
+    upper = middle + std * BB_STD_DEV
+    lower = middle - std * BB_STD_DEV
+
+    rsi = _rsi(close, counts)
+    adx = _adx(high, low, counts)
+
+    results = {
+        "current_price": price,
+        "RSI": rsi,
+        "MACD": macd,
+        "MACD_signal": macd_signal,
+        "MACD_hist": macd - macd_signal,
+        "BB_upper": upper,
+        "BB_middle": middle,
+        "BB_lower": lower,
+        "ADX": adx,
+        "bars": counts,
+    }
+    for span, values in zip(EMA_SPANS, emas.T):
+        results[f"EMA{span}"] = values
+
+    results.update(trading_signal_counts(
+        rsi, macd, macd_signal, upper, lower,
+        results[f"EMA{EMA_SPANS[0]}"], results[f"EMA{EMA_SPANS[1]}"], price
+    ))
+    return results
+
+
+def compute_indicator_matrix(
+    close: np.ndarray,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    lengths: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Compute RSI, MACD, Bollinger Bands, EMAs, ADX and trading signals for
+    every row of a ``(n_tokens, n_bars)`` price matrix.
+
+    Args:
+        close: Closing prices, one token per row
+        high: High prices (defaults to ``close``)
+        low: Low prices (defaults to ``close``)
+        lengths: Number of valid bars at the start of each row; when
+            omitted, rows are delimited by NaN padding on either side of
+            ``close``, and ``high``/``low`` are taken at the same bars
+    Returns:
+        Dict of ``(n_tokens,)`` arrays. ``recommendation`` holds indexes
+        into ``RECOMMENDATIONS``.
+    """
+    return _indicator_matrix(*_align_prices(close, high, low, lengths))
+
+
+def risk_scores(
+    liquidity: np.ndarray,
+    volume: np.ndarray,
+    market_cap: np.ndarray,
+    volatility: np.ndarray,
+    buy_sell_ratio: np.ndarray
+) -> np.ndarray:
+    """Vectorized ``calculate_risk_score``, element-wise over arrays of the same shape"""
+    scores = np.stack(np.broadcast_arrays(
+        np.minimum(liquidity / 100_000_000, 1),
+        np.minimum(volume / 10_000_000, 1),
+        np.minimum(market_cap / 1_000_000_000, 1),
+        1 - np.minimum(volatility / 0.1, 1),
+        1 - np.abs(1 - buy_sell_ratio)
+    ))
+    risk = 1 - np.average(scores, axis=0, weights=[0.3, 0.2, 0.25, 0.15, 0.1])
+    return np.clip(risk, 0, 1)
+
+
+def confidence_scores(
+    buy_signals: np.ndarray,
+    sell_signals: np.ndarray,
+    neutral_signals: np.ndarray,
+    risk_score: np.ndarray,
+    price_momentum: np.ndarray,
+    volatility: np.ndarray
+) -> np.ndarray:
+    """Vectorized ``calculate_confidence_score``"""
+    total = buy_signals.astype(np.float64) + sell_signals + neutral_signals
+    with np.errstate(invalid="ignore", divide="ignore"):
+        signal_score = np.where(total == 0, 0.5, buy_signals / total)
+    momentum_score = np.clip(0.5 + price_momentum / 100, 0, 1)
+    volatility_factor = 1 - np.minimum(volatility / 0.1, 1)
+    scores = np.stack(np.broadcast_arrays(signal_score, 1 - risk_score, momentum_score, volatility_factor))
+    confidence = np.average(scores, axis=0, weights=[0.35, 0.25, 0.25, 0.15])
+    return np.clip(confidence, 0, 1)
+
+
+def score_matrix(
+    close: np.ndarray,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    lengths: Optional[np.ndarray] = None,
+    market: Optional[Dict[str, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    ``compute_indicator_matrix`` plus the risk metrics of the analysis for
+    every row.
+
+    ``market`` holds one value per token for ``volume_24h``, ``liquidity``,
+    ``market_cap``, ``price_change_24h`` and ``buy_sell_ratio``, clamped as
+    the analysis does; without it only ``volatility`` is added. Volatility is
+    taken over each row's valid bars.
+    """
+    close, high, low = _align_prices(close, high, low, lengths)
+    results = _indicator_matrix(close, high, low)
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        # Rows without any bar: "mean of empty slice"
+        warnings.simplefilter("ignore", RuntimeWarning)
+        volatility = np.nanstd(close, axis=1) / np.nanmean(close, axis=1)
+    volatility = np.where(np.isfinite(volatility), volatility, 0.5)
+    results["volatility"] = volatility
+    if market is None:
+        return results
+
+    risk = risk_scores(
+        np.maximum(0, market["liquidity"]),
+        np.maximum(0, market["volume_24h"]),
+        np.maximum(0, market["market_cap"]),
+        np.minimum(1.0, volatility),
+        np.clip(market["buy_sell_ratio"], 0.1, 10)
+    )
+    results["risk_score"] = risk
+    results["confidence_score"] = confidence_scores(
+        results["buy_signals"], results["sell_signals"], results["neutral_signals"],
+        risk, market["price_change_24h"], volatility
+    )
+    return results
@@ -1,38 +1,115 @@
-import requests
-import pandas as pd
+import asyncio
+import os
+import time
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Optional
+import deadline
+import profiling
+from hedging import FALLBACK, PRIMARY, LatencyTracker, hedged
+from http_client import HttpClient, UpstreamError, get_client
+from cache import ResponseCache, cache_key, get_cache
+from candles import asof, resample_ohlcv, sort_by_time
+from series_store import BAR_MS, SeriesStore, get_store, market_chart_columns
+from token_index import TokenIndex, get_index, normalize_contract, platform_for_chain
+from indicator_engine import compute_indicators, latest_values
+from timings import StageTimings
 from indicators import (
-    calculate_rsi,
-    calculate_macd,
-    calculate_bollinger_bands,
-    calculate_ema_signals,
-    calculate_adx,
     calculate_risk_score,
     calculate_confidence_score,
     get_trading_signals
 )
 
+# Overridable to point the analyzer at a proxy or a local mock (see benchmark.py)
+COINGECKO_API = os.environ.get("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+DEFILLAMA_API = os.environ.get("DEFILLAMA_API_URL", "https://coins.llama.fi")
+
+# Daily bars analyzed, before the current one
+ANALYSIS_DAYS = 30
+
+# Latency of CoinGecko answers, from which DefiLlama hedges are timed
+_coingecko_latency = LatencyTracker()
+
+def normalize_token_address(token_address: str, chain: str = "ethereum") -> str:
+    """Normalise l'adresse du token en fonction de la chaîne"""
+    CHAIN_MAPPINGS = {
+        "ethereum": lambda addr: addr.lower(),
+        "sui": lambda addr: addr if "sui" in addr else f"0x2::sui::{addr}",
+        "solana": lambda addr: addr.upper(),
+        # Ajoutez d'autres chaînes selon vos besoins
+    }
+    
+    if chain in CHAIN_MAPPINGS:
+        return CHAIN_MAPPINGS[chain](token_address)
+    return token_address
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """Millisecond timestamp of an ISO 8601 date such as CoinGecko's ``last_updated``"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
 class CryptoAnalyzer:
-    def __init__(self, token_address: str, chain: str = "ethereum"):
+    def __init__(
+        self,
+        token_address: str,
+        chain: str = "ethereum",
+        http: Optional[HttpClient] = None,
+        cache: Optional[ResponseCache] = None,
+        token_index: Optional[TokenIndex] = None,
+        series_store: Optional[SeriesStore] = None
+    ):
         self.token_address = token_address
         self.chain = chain
         self.base_url = "https://api.dexscreener.com/latest/dex"
+        self.http = http or get_client()
+        self.cache = cache or get_cache()
+        self.token_index = token_index or get_index()
+        self.series_store = series_store or get_store()
+        self.timings = StageTimings()
+        # Price arrays of the last analysis (used to seed live updates)
+        self.price_data: Optional[Dict[str, np.ndarray]] = None
+        # Which source answered the market data, and whether it was hedged
+        self.source: Optional[Dict] = None
         print(f"Initializing CryptoAnalyzer with token: {token_address} on chain: {chain}")
 
+    async def _fetch_json(self, kind: str, url: str, params: Optional[Dict[str, str]] = None):
+        """Fetch an upstream JSON document through the response cache"""
+        lookup = {}
+
+        async def fetch():
+            start = time.perf_counter()
+            status = None
+            trace = {}
+            try:
+                data = await self.http.get_json(url, params=params, trace=trace)
+                status = 200
+                return data
+            except UpstreamError as e:
+                status = e.status
+                raise
+            finally:
+                self.timings.record_upstream(url, time.perf_counter() - start, status, trace)
+
+        try:
+            return await self.cache.get_or_fetch(cache_key(url, params), kind, fetch, trace=lookup)
+        finally:
+            # Joining another analysis' fetch still waits on upstream: a miss
+            self.timings.record_cache(kind, hit=lookup.get("result") in ("hit", "stale"))
+
+    async def _timed(self, stage: str, awaitable):
+        with self.timings.stage(stage):
+            return await awaitable
+
     def _normalize_token_address(self) -> str:
         """Normalise l'adresse du token en fonction de la chaîne"""
-        CHAIN_MAPPINGS = {
-            "ethereum": lambda addr: addr.lower(),
-            "sui": lambda addr: addr if "sui" in addr else f"0x2::sui::{addr}",
-            "solana": lambda addr: addr.upper(),
-            # Ajoutez d'autres chaînes selon vos besoins
-        }
-        
-        if self.chain in CHAIN_MAPPINGS:
-            return CHAIN_MAPPINGS[self.chain](self.token_address)
-        return self.token_address
+        return normalize_token_address(self.token_address, self.chain)
 
     def _get_chain_explorer_url(self) -> str:
         """Retourne l'URL de l'explorateur de la chaîne"""
@@ -47,14 +124,25 @@ class CryptoAnalyzer:
     async def get_historical_prices(self) -> Dict[str, np.ndarray]:
         """Get historical price data for calculations"""
         try:
-            # 1. D'abord, on récupère les données de DexScreener pour les données récentes
-            dex_data = await self._get_dexscreener_data()
-            
-            # 2. Ensuite, on récupère les données de CoinGecko pour l'historique
-            coingecko_data = await self._get_coingecko_data()
+            # Les deux sources sont indépendantes : on les interroge en parallèle
+            with self.timings.stage("fetch"):
+                history = asyncio.ensure_future(self._get_coingecko_data())
+                try:
+                    dex_data = await self._get_dexscreener_data()
+                    if self.source['market_data'] != 'coingecko' and not history.done():
+                        # CoinGecko is late or failing: waiting for its history would undo the hedge
+                        coingecko_data = None
+                    else:
+                        coingecko_data = await history
+                finally:
+                    # Not consumed (hedged, failed or cancelled caller): stop it and let it unwind
+                    if not history.done():
+                        history.cancel()
+                    await asyncio.gather(history, return_exceptions=True)
             
-            # 3. On fusionne les données
-            combined_data = self._merge_price_data(dex_data, coingecko_data)
+            # On fusionne les données
+            with self.timings.stage("merge"):
+                combined_data = self._merge_price_data(dex_data, coingecko_data)
             
             return combined_data
             
@@ -62,63 +150,121 @@ class CryptoAnalyzer:
             print(f"Error fetching historical data: {str(e)}")
             raise
 
+    async def _load_history(self, coin_id: str) -> Dict[str, np.ndarray]:
+        """
+        Daily price, volume and market cap history of the token (columns of
+        ``series_store.COLUMNS``). Only the bars since the last stored one
+        are downloaded; the result is a view of the store, not a copy.
+        """
+        address = self._normalize_token_address()
+        return await self.series_store.flights.do(
+            (self.chain, address), lambda: self._sync_history(coin_id, address)
+        )
+
+    async def _sync_history(self, coin_id: str, address: str) -> Dict[str, np.ndarray]:
+        stored = self.series_store.read(self.chain, address)
+        data = await self._fetch_json(
+            "history",
+            f"{COINGECKO_API}/coins/{coin_id}/market_chart",
+            params={
+                'vs_currency': 'usd',
+                'days': str(self.series_store.days_to_fetch(stored)),
+                'interval': 'daily'
+            }
+        )
+        fetched = market_chart_columns(data)
+        if self.series_store.path is None:
+            return fetched
+        self.series_store.append(self.chain, address, fetched)
+        return self.series_store.read(self.chain, address) or fetched
+
+    async def _load_ticks(self, coin_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Intraday prices and rolling 24h volumes of the analysis window, from
+        which the daily candles get their open, high and low. CoinGecko
+        returns hourly points for 2 to 90 days. None if they are unavailable:
+        the candles are then built from the daily history only.
+        """
+        try:
+            data = await self._fetch_json(
+                "ticks",
+                f"{COINGECKO_API}/coins/{coin_id}/market_chart",
+                params={'vs_currency': 'usd', 'days': str(ANALYSIS_DAYS)}
+            )
+            return market_chart_columns(data)
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error fetching CoinGecko ticks: {str(e)}")
+            return None
+
+    async def _resolve_coin_id(self) -> Optional[str]:
+        """Resolve the token address to a CoinGecko ID"""
+        # Known tokens are resolved from the local index, without any network call
+        coin_id = self.token_index.lookup(self.chain, self.token_address)
+        if coin_id:
+            return coin_id
+        
+        # If not found in the index, search CoinGecko by contract address
+        try:
+            platform = platform_for_chain(self.chain)
+            address = normalize_contract(self.token_address)
+            coin_data = await self._fetch_json(
+                "coin_id",
+                f"{COINGECKO_API}/coins/{platform}/contract/{address}"
+            )
+            coin_id = coin_data.get('id')
+            print(f"Found CoinGecko ID for token: {coin_id}")
+            return coin_id
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error searching for token by address: {str(e)}")
+        return None
+
     async def _get_dexscreener_data(self):
-        """Get token data from CoinGecko API"""
-        # Try to match the token address to a known CoinGecko ID
-        # Map of popular token addresses to their CoinGecko IDs
-        TOKENS_MAP = {
-            "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2": "ethereum",  # WETH
-            "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599": "bitcoin",   # WBTC
-            "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48": "usd-coin",  # USDC
-            "0xdac17f958d2ee523a2206206994597c13d831ec7": "tether",    # USDT
-            "0x1f9840a85d5af5bf1d1762f925bdaddc4201f984": "uniswap",   # UNI
-            "0x514910771af9ca656af840dff83e8264ecf986ca": "chainlink", # LINK
-            "0x6b175474e89094c44da98b954eedeac495271d0f": "dai",       # DAI
-            "0x7fc66500c84a76ad7e9c93437bfc5ac33e2ddae9": "aave",      # AAVE
-            "0x9f8f72aa9304c8b593d555f12ef6589cc3a579a2": "maker",     # MKR
-            "0xed1199093b1abd07a368dd1c0cdc77d8517ba2a0": "hyperliquid-eur-perp",  # Sample new token
+        """
+        Get token data from CoinGecko, DefiLlama as a fallback, then default
+        values. DefiLlama is also started, as a hedge, when CoinGecko has not
+        answered within its usual latency: the first good answer wins and
+        ``self.source`` tells which one.
+        """
+        delay = _coingecko_latency.delay()
+        data, winner, was_hedged = await hedged(self._get_coingecko_market, self._get_defillama_market, delay)
+        self.source = {
+            'market_data': {PRIMARY: 'coingecko', FALLBACK: 'defillama'}.get(winner, 'default'),
+            'hedged': was_hedged,
+            'hedge_delay_ms': round(delay * 1000, 1)
         }
+        if data is not None:
+            return data
         
-        # Lowercase the address for consistency
-        token_address_lower = self.token_address.lower()
-        
-        # Try to get from known mappings
-        coin_id = TOKENS_MAP.get(token_address_lower)
-        
-        # If not found in mapping, search CoinGecko by contract address
-        if not coin_id:
-            try:
-                search_url = f"https://api.coingecko.com/api/v3/coins/ethereum/contract/{token_address_lower}"
-                search_response = requests.get(search_url)
-                if search_response.status_code == 200:
-                    coin_data = search_response.json()
-                    coin_id = coin_data.get('id')
-                    print(f"Found CoinGecko ID for token: {coin_id}")
-            except Exception as e:
-                print(f"Error searching for token by address: {str(e)}")
+        # Return default values if all APIs fail
+        print(f"No data found for token {self.token_address}, using default values")
+        return {
+            'price_history': [1.0] * 30,  # Generating fake price history
+            'volume': 10000,
+            'liquidity': 5000,
+            'market_cap': 1000000,
+            'price_change_24h': 0,
+            'buys': 50,
+            'sells': 50
+        }
+
+    async def _get_coingecko_market(self):
+        """CoinGecko market data and price series, or None"""
+        start = time.perf_counter()
+        coin_id = await self._timed("coin_id", self._resolve_coin_id())
         
         # If we have a coin ID, get the data
         if coin_id:
             try:
-                # Get market data
-                market_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
-                market_response = requests.get(market_url)
-                market_response.raise_for_status()
-                market_data = market_response.json()
-                
-                # Get historical price data
-                history_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
-                params = {
-                    'vs_currency': 'usd',
-                    'days': '30',
-                    'interval': 'daily'
-                }
-                history_response = requests.get(history_url, params=params)
-                history_response.raise_for_status()
-                history_data = history_response.json()
-                
-                # Extract prices
-                price_history = [price[1] for price in history_data.get('prices', [])]
+                # Market data, daily history and intraday ticks are fetched concurrently
+                market_data, history, ticks = await asyncio.gather(
+                    self._timed("market", self._fetch_json("market", f"{COINGECKO_API}/coins/{coin_id}")),
+                    self._timed("market_chart", self._load_history(coin_id)),
+                    self._timed("ticks", self._load_ticks(coin_id))
+                )
                 
                 # Get total_volume and market_cap
                 current_price = market_data.get('market_data', {}).get('current_price', {}).get('usd', 0)
@@ -132,8 +278,13 @@ class CryptoAnalyzer:
                 # Get buy/sell ratio (using a fixed value since CoinGecko doesn't provide this)
                 buy_sell_ratio = 1.0
                 
+                _coingecko_latency.record(time.perf_counter() - start)
                 return {
-                    'price_history': price_history,
+                    # Daily history (views of the stored series) and hourly ticks
+                    'history': history,
+                    'ticks': ticks,
+                    'current_price': float(current_price or 0),
+                    'quote_time': parse_time(market_data.get('last_updated')) or int(time.time() * 1000),
                     'volume': float(volume_24h),
                     'liquidity': float(liquidity),
                     'market_cap': float(market_cap),
@@ -141,16 +292,21 @@ class CryptoAnalyzer:
                     'buys': 50,  # Placeholder values
                     'sells': 50   # Placeholder values
                 }
+            except deadline.DeadlineExceeded:
+                raise
             except Exception as e:
                 print(f"Error fetching CoinGecko data: {str(e)}")
         
-        # Fallback to DefiLlama if CoinGecko fails or token not found
+        return None
+
+    async def _get_defillama_market(self):
+        """DefiLlama price and chart, or None"""
         try:
             print(f"Trying DefiLlama for token data: {self.token_address}")
-            llama_url = f"https://coins.llama.fi/prices/current/ethereum:{self.token_address}"
-            llama_response = requests.get(llama_url)
-            llama_response.raise_for_status()
-            llama_data = llama_response.json()
+            llama_data = await self._timed("defillama", self._fetch_json(
+                "price",
+                f"{DEFILLAMA_API}/prices/current/ethereum:{self.token_address}"
+            ))
             
             # Extract token data
             token_key = f"ethereum:{self.token_address}"
@@ -158,11 +314,15 @@ class CryptoAnalyzer:
             
             if token_data:
                 current_price = token_data.get('price', 0)
-                # Generate synthetic price history (flat)
-                price_history = [current_price] * 30
+                ticks = await self._timed("defillama_chart", self._load_llama_ticks())
+                # Without a chart, a flat synthetic history (untimestamped)
+                price_history = [current_price] * 30 if ticks is None else []
                 
                 return {
                     'price_history': price_history,
+                    'ticks': ticks,
+                    'current_price': float(current_price or 0),
+                    'quote_time': int(token_data['timestamp'] * 1000) if token_data.get('timestamp') else int(time.time() * 1000),
                     'volume': float(token_data.get('volume', 100000)),
                     'liquidity': float(token_data.get('liquidity', 10000)),
                     'market_cap': float(token_data.get('mcap', 1000000)),
@@ -170,111 +330,168 @@ class CryptoAnalyzer:
                     'buys': 50,
                     'sells': 50
                 }
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error fetching DefiLlama data: {str(e)}")
         
-        # Return default values if all APIs fail
-        print(f"No data found for token {self.token_address}, using default values")
-        return {
-            'price_history': [1.0] * 30,  # Generating fake price history
-            'volume': 10000,
-            'liquidity': 5000,
-            'market_cap': 1000000,
-            'price_change_24h': 0,
-            'buys': 50,
-            'sells': 50
-        }
+        return None
+
+    async def _load_llama_ticks(self) -> Optional[Dict[str, np.ndarray]]:
+        """4-hour DefiLlama prices of the analysis window, or None"""
+        try:
+            data = await self._fetch_json(
+                "ticks",
+                f"{DEFILLAMA_API}/chart/ethereum:{self.token_address}",
+                params={'span': str(ANALYSIS_DAYS * 6), 'period': '4h'}
+            )
+            points = data.get('coins', {}).get(f"ethereum:{self.token_address}", {}).get('prices') or []
+            points = [p for p in points if p.get('price') is not None]
+            if not points:
+                return None
+            return {
+                't': np.array([int(p['timestamp']) * 1000 for p in points], dtype=np.int64),
+                'price': np.array([float(p['price']) for p in points], dtype=np.float64),
+                'volume': np.full(len(points), np.nan)
+            }
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error fetching DefiLlama chart: {str(e)}")
+            return None
+
+    async def get_live_quote(self) -> Optional[Dict[str, float]]:
+        """
+        Current price, volume, market cap and 24h change, without any
+        history: what live updates need between two full analyses
+        """
+        coin_id = await self._timed("coin_id", self._resolve_coin_id())
+        if coin_id:
+            try:
+                market = await self._timed("market", self._fetch_json("market", f"{COINGECKO_API}/coins/{coin_id}"))
+                market_data = market.get('market_data', {})
+                price = market_data.get('current_price', {}).get('usd')
+                if price:
+                    volume_24h = float(market_data.get('total_volume', {}).get('usd', 0) or 0)
+                    return {
+                        'current_price': float(price),
+                        'volume_24h': volume_24h,
+                        'liquidity': volume_24h * 0.1,
+                        'market_cap': float(market_data.get('market_cap', {}).get('usd', 0) or 0),
+                        'price_change_24h': float(market_data.get('price_change_percentage_24h', 0) or 0)
+                    }
+            except deadline.DeadlineExceeded:
+                raise
+            except Exception as e:
+                print(f"Error fetching CoinGecko quote: {str(e)}")
+
+        try:
+            llama_data = await self._timed("defillama", self._fetch_json(
+                "price",
+                f"{DEFILLAMA_API}/prices/current/ethereum:{self.token_address}"
+            ))
+            token_data = llama_data.get('coins', {}).get(f"ethereum:{self.token_address}", {})
+            if token_data.get('price'):
+                return {'current_price': float(token_data['price'])}
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error fetching DefiLlama quote: {str(e)}")
+        return None
 
     async def _get_coingecko_data(self):
-        # Mapping des adresses de token vers les IDs CoinGecko
-        COINGECKO_IDS = {
-            "0x2::sui::SUI": "sui",
-            # Ajoutez d'autres mappings ici
-        }
-        
-        token_id = COINGECKO_IDS.get(self.token_address)
+        # Historique long uniquement pour les tokens présents dans l'index local
+        token_id = self.token_index.lookup(self.chain, self.token_address)
         if not token_id:
             return None
             
-        url = f"https://api.coingecko.com/api/v3/coins/{token_id}/market_chart"
-        params = {
-            'vs_currency': 'usd',
-            'days': '200',
-            'interval': 'daily'
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'prices': data.get('prices', []),
-                'volumes': data.get('total_volumes', []),
-                'market_caps': data.get('market_caps', [])
-            }
-        return None
+        try:
+            history = await self._timed("history", self._load_history(token_id))
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error fetching CoinGecko history: {str(e)}")
+            return None
+        return history
 
     def _merge_price_data(self, dex_data, coingecko_data):
-        prices = []
-        volumes = []
-        highs = []
-        lows = []
-        
+        """
+        Daily OHLCV candles of the last ``ANALYSIS_DAYS`` bars and the
+        current one, from every timestamped observation: daily history,
+        intraday ticks and the current quote. Bars without any observation
+        are marked in ``gaps`` and carry the previous close.
+        """
         # Use the primary data from the renamed _get_dexscreener_data method
-        # which now actually fetches from CoinGecko or DefiLlama
-        
-        # Use historical price data from the primary source
-        if dex_data['price_history']:
-            # Convert to float and ensure we have data
-            prices = [float(p) for p in dex_data['price_history'] if p is not None]
-            
-            # If we have enough data points, generate high/low with some variation
-            if len(prices) > 0:
-                # Create synthetic high/low values if needed
-                volatility = 0.02  # 2% price movement for highs/lows
-                highs = [p * (1 + (volatility * (i % 3) / 3)) for i, p in enumerate(prices)]
-                lows = [p * (1 - (volatility * (i % 3) / 3)) for i, p in enumerate(prices)]
-        
-        # Add CoinGecko data if available and not already using it
-        if coingecko_data and not prices:
-            prices = [p[1] for p in coingecko_data['prices']]
-            volumes = [v[1] for v in coingecko_data['volumes']]
-            # Create high/low from the price data
-            highs = prices
-            lows = prices
+        # which now actually fetches from CoinGecko or DefiLlama; the long
+        # history only completes it when the primary source has none
+        history = dex_data.get('history')
+        if history is None or not len(history['t']):
+            history = coingecko_data
+        sources = [s for s in (history, dex_data.get('ticks')) if s is not None and len(s['t'])]
+
+        timestamps = None
+        bar_volume = np.empty(0)
+        gaps = np.empty(0, dtype=bool)
+        intraday_bars = 0
+        if sources:
+            if dex_data.get('current_price'):
+                sources.append({
+                    't': np.array([dex_data['quote_time']], dtype=np.int64),
+                    'price': np.array([dex_data['current_price']], dtype=np.float64),
+                    'volume': np.array([dex_data['volume']], dtype=np.float64)
+                })
+            end = max(int(s['t'].max()) for s in sources)
+            start = (end // BAR_MS - ANALYSIS_DAYS) * BAR_MS
+            # Only the analyzed window is copied, however long the stored history
+            windows = [s['t'] >= start for s in sources]
+            t = np.concatenate([s['t'][keep] for s, keep in zip(sources, windows)])
+            price = np.concatenate([s['price'][keep] for s, keep in zip(sources, windows)])
+            volume = np.concatenate([s['volume'][keep] for s, keep in zip(sources, windows)])
+            candles = resample_ohlcv(t, price, None, start=start, end=end)
+
+            # Rolling 24h volume at the end of every bar: the last one known
+            # within the bar (DefiLlama points have none)
+            known = ~np.isnan(volume)
+            vt, vv = sort_by_time(t[known], volume[known])
+            candles['volume'] = asof(candles['t'] + BAR_MS - 1, vt, vv, tolerance_ms=BAR_MS - 1)
+
+            # Bars before the first observation are dropped, not made up
+            first = int(np.argmax(~np.isnan(candles['close']))) if len(candles['close']) else 0
+            prices = candles['close'][first:]
+            opens = candles['open'][first:]
+            highs = candles['high'][first:]
+            lows = candles['low'][first:]
+            bar_volume = candles['volume'][first:]
+            timestamps = candles['t'][first:]
+            gaps = candles['gap'][first:]
+            intraday_bars = int((candles['ticks'][first:] > 1).sum())
+        else:
+            # Untimestamped synthetic history: no intraday range is known
+            prices = np.asarray(dex_data.get('price_history', []), dtype=np.float64)
+            opens = highs = lows = prices
         
         # Fallback to some default data if we have no prices
-        if not prices:
+        if not len(prices):
             print("Warning: No price history available, using synthetic data")
             base_price = 1.0
             num_days = 30
-            prices = [base_price * (1 + 0.01 * (i % 5 - 2)) for i in range(num_days)]
-            highs = [p * 1.02 for p in prices]
-            lows = [p * 0.98 for p in prices]
-        
-        # Ensure we have enough data points for technical analysis
-        min_data_points = 20
-        if len(prices) < min_data_points:
-            # Duplicate the last price to get enough data points
-            last_price = prices[-1] if prices else 1.0
-            prices.extend([last_price] * (min_data_points - len(prices)))
-            
-            if highs:
-                last_high = highs[-1]
-                highs.extend([last_high] * (min_data_points - len(highs)))
-            else:
-                highs = [p * 1.02 for p in prices]
-                
-            if lows:
-                last_low = lows[-1]
-                lows.extend([last_low] * (min_data_points - len(lows)))
-            else:
-                lows = [p * 0.98 for p in prices]
+            prices = base_price * (1 + 0.01 * (np.arange(num_days) % 5 - 2))
+            opens = highs = lows = prices
+            timestamps = None
+        if timestamps is None:
+            bar_volume = np.full(len(prices), np.nan)
+            gaps = np.zeros(len(prices), dtype=bool)
         
         # Return properly formatted data
         return {
-            'close': np.array(prices),
-            'high': np.array(highs),
-            'low': np.array(lows),
+            'open': opens,
+            'close': prices,
+            'high': highs,
+            'low': lows,
+            'bar_volume': bar_volume,
+            'timestamps': timestamps,
+            'gaps': gaps,
+            'intraday_bars': intraday_bars,
             'volume': dex_data['volume'],
             'liquidity': dex_data['liquidity'],
             'market_cap': dex_data['market_cap'],
@@ -282,33 +499,43 @@ class CryptoAnalyzer:
             'buy_sell_ratio': dex_data['buys'] / dex_data['sells'] if dex_data['sells'] > 0 else 1.0
         }
 
-    async def analyze_technical_indicators(self, price_data: Dict[str, np.ndarray]) -> Dict:
-        """Calculate technical indicators"""
+    async def analyze_technical_indicators(
+        self,
+        price_data: Dict[str, np.ndarray],
+        full_series: bool = False,
+        window: Optional[int] = None
+    ) -> Dict:
+        """
+        Calculate technical indicators
+
+        With ``full_series``, the result also holds a ``series`` section with
+        every indicator as an array aligned with the price bars (the last
+        ``window`` bars only, if given), for charting and backtests.
+        """
         if len(price_data['close']) == 0:
             return {}
             
         prices = price_data['close']
         current_price = prices[-1]
         
-        # Calculate indicators
-        rsi = calculate_rsi(prices)
-        macd_data = calculate_macd(prices)
-        bb_data = calculate_bollinger_bands(prices)
-        ema_data = calculate_ema_signals(prices)
-        adx = calculate_adx(price_data['high'], price_data['low'], prices)
+        # Calculate all indicators in one pass over the price arrays
+        series = None
+        if full_series:
+            series = compute_indicators(
+                prices, price_data['high'], price_data['low'], full_series=True, window=window
+            )
+            indicators = latest_values(series)
+        else:
+            indicators = compute_indicators(prices, price_data['high'], price_data['low'])
         
         # Get trading signals
-        signals = get_trading_signals(rsi, macd_data, bb_data, ema_data, current_price)
+        signals = get_trading_signals(
+            indicators['RSI'], indicators['MACD'], indicators['BB'], indicators['EMA'], current_price
+        )
         
         # Add market data to technical analysis
-        return {
-            'indicators': {
-                'RSI': rsi,
-                'MACD': macd_data,
-                'BB': bb_data,
-                'EMA': ema_data,
-                'ADX': adx
-            },
+        results = {
+            'indicators': indicators,
             'market_data': {
                 'current_price': current_price,
                 'volume_24h': price_data['volume'],
@@ -319,14 +546,69 @@ class CryptoAnalyzer:
             },
             'signals': signals
         }
+        if series is not None:
+            bars = slice(-window, None) if window else slice(None)
+            timestamps = price_data.get('timestamps')
+            results['series'] = {
+                'timestamps': timestamps[bars] if timestamps is not None else None,
+                'close': prices[bars],
+                'indicators': series
+            }
+        return results
 
-    async def run_analysis(self) -> Dict:
+    async def run_analysis(
+        self,
+        full_series: bool = False,
+        window: Optional[int] = None,
+        include_timings: bool = False,
+        profile: bool = False
+    ) -> Dict:
+        """
+        Run the full analysis. With ``include_timings``, the result holds the
+        duration of every stage and upstream call under ``timings``.
+
+        ``source`` tells which upstream answered the market data; under a
+        deadline (deadline.py), ``budget`` tells how much of it was used and
+        the status is ``timeout`` when it ran out before the market data
+        arrived.
+        With ``profile`` (or when sampled, see profiling.py), the analysis
+        runs under cProfile and tracemalloc and ``profile`` holds the summary.
+        """
+        with profiling.profiled(f"{self.chain}-{self.token_address}", profiling.trigger(profile)) as report:
+            with self.timings.stage("total"):
+                results = await self._run_analysis(full_series, window)
+        if self.source is not None:
+            results['source'] = self.source
+        budget = deadline.usage()
+        if budget is not None:
+            results['budget'] = budget
+        if include_timings:
+            results['timings'] = self.timings.to_dict()
+        if report:
+            results['profile'] = report
+        return results
+
+    def _timeout_result(self, error: Exception) -> Dict:
+        print(f"Analysis deadline exceeded for {self.token_address}: {str(error)}")
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'token_address': self.token_address,
+            'chain': self.chain,
+            'error': f"Analysis deadline exceeded: {str(error)}",
+            'status': 'timeout'
+        }
+
+    async def _run_analysis(self, full_series: bool, window: Optional[int]) -> Dict:
             try:
                 print(f"\n=== Starting analysis for {self.token_address} on {self.chain} ===")
                 
                 # Fetch market data
                 try:
                     price_data = await self.get_historical_prices()
+                    self.price_data = price_data
+                except deadline.DeadlineExceeded as e:
+                    # No default series stands in for data the budget did not leave time to fetch
+                    return self._timeout_result(e)
                 except Exception as e:
                     return {
                         'timestamp': datetime.now().isoformat(),
@@ -373,7 +655,8 @@ class CryptoAnalyzer:
                         
                 # Calculate technical indicators
                 try:
-                    analysis_results = await self.analyze_technical_indicators(price_data)
+                    with self.timings.stage("indicators"):
+                        analysis_results = await self.analyze_technical_indicators(price_data, full_series, window)
                     print("Technical analysis completed")
                 except Exception as e:
                     return {
@@ -408,24 +691,25 @@ class CryptoAnalyzer:
                     
                 # Calculate risk metrics with validation
                 try:
-                    volatility = np.std(price_data['close']) / np.mean(price_data['close'])
-                    if np.isnan(volatility) or np.isinf(volatility):
-                        volatility = 0.5  # Valeur par défaut si calcul invalide
-                        
-                    risk_score = calculate_risk_score(
-                        liquidity=max(0, price_data['liquidity']),
-                        volume=max(0, price_data['volume']),
-                        market_cap=max(0, price_data['market_cap']),
-                        volatility=min(1.0, volatility),
-                        buy_sell_ratio=max(0.1, min(10, price_data['buy_sell_ratio']))
-                    )
-                    
-                    confidence_score = calculate_confidence_score(
-                        technical_signals=analysis_results['signals'],
-                        risk_score=risk_score,
-                        price_momentum=price_data['price_change_24h'],
-                        volatility=volatility
-                    )
+                    with self.timings.stage("risk"):
+                        volatility = np.std(price_data['close']) / np.mean(price_data['close'])
+                        if np.isnan(volatility) or np.isinf(volatility):
+                            volatility = 0.5  # Valeur par défaut si calcul invalide
+
+                        risk_score = calculate_risk_score(
+                            liquidity=max(0, price_data['liquidity']),
+                            volume=max(0, price_data['volume']),
+                            market_cap=max(0, price_data['market_cap']),
+                            volatility=min(1.0, volatility),
+                            buy_sell_ratio=max(0.1, min(10, price_data['buy_sell_ratio']))
+                        )
+
+                        confidence_score = calculate_confidence_score(
+                            technical_signals=analysis_results['signals'],
+                            risk_score=risk_score,
+                            price_momentum=price_data['price_change_24h'],
+                            volatility=volatility
+                        )
                 except Exception as e:
                     return {
                         'timestamp': datetime.now().isoformat(),
@@ -449,7 +733,7 @@ class CryptoAnalyzer:
                     }
                     
                 # Final result
-                return {
+                results = {
                     'timestamp': datetime.now().isoformat(),
                     'token_address': self.token_address,
                     'chain': self.chain,
@@ -473,9 +757,19 @@ class CryptoAnalyzer:
                         'confidence_score': float(confidence_score),
                         'volatility': float(volatility)
                     },
+                    'price_history': {
+                        'bars': len(price_data['close']),
+                        'gaps': int(np.count_nonzero(price_data['gaps'])),
+                        'intraday_bars': price_data['intraday_bars']
+                    },
                     'status': 'success'
                 }
+                if 'series' in analysis_results:
+                    results['technical_analysis']['series'] = analysis_results['series']
+                return results
                         
+            except deadline.DeadlineExceeded as e:
+                return self._timeout_result(e)
             except Exception as e:
                 print(f"Analysis error: {str(e)}")
                 return {
@@ -0,0 +1,67 @@
+"""End-to-end time budget of an analysis, shared by all its upstream calls"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+
+class Deadline(NamedTuple):
+    started: float   # time.monotonic() when the request arrived
+    expires: float   # time.monotonic() by which the analysis must answer
+
+
+# Deadline of the current task; asyncio tasks inherit it from the task that
+# created them, so every upstream call of an analysis sees it
+current_deadline: contextvars.ContextVar = contextvars.ContextVar("analysis_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting or waiting for upstream work the budget leaves no time for"""
+
+
+def make_deadline(budget_seconds: float, elapsed_seconds: float = 0.0) -> Deadline:
+    """A deadline of ``budget_seconds``, of which ``elapsed_seconds`` are already spent (e.g. queued)"""
+    started = time.monotonic() - max(0.0, elapsed_seconds)
+    return Deadline(started, started + budget_seconds)
+
+
+@contextmanager
+def limit(budget_seconds: Optional[float], elapsed_seconds: float = 0.0):
+    """Run the block under a deadline (none if ``budget_seconds`` is None)"""
+    token = current_deadline.set(
+        make_deadline(budget_seconds, elapsed_seconds) if budget_seconds is not None else None
+    )
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, None without one"""
+    current = current_deadline.get()
+    return None if current is None else current.expires - time.monotonic()
+
+
+def timeout_for(timeout: Optional[float]) -> Optional[float]:
+    """``timeout`` capped by the remaining budget; raises DeadlineExceeded once it is spent"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Analysis deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def usage() -> Optional[dict]:
+    """Budget, time used and time left of the current deadline, in milliseconds"""
+    current = current_deadline.get()
+    if current is None:
+        return None
+    now = time.monotonic()
+    return {
+        "deadline_ms": round((current.expires - current.started) * 1000, 1),
+        "used_ms": round((now - current.started) * 1000, 1),
+        "remaining_ms": round((current.expires - now) * 1000, 1),
+        "exceeded": now > current.expires
+    }
@@ -2,7 +2,7 @@ import sys
 import subprocess
 import importlib.util
 
-required_packages = ['requests', 'pandas', 'numpy', 'tradingview-ta']
+required_packages = ['aiohttp', 'numpy']
 
 for package in required_packages:
     spec = importlib.util.find_spec(package)
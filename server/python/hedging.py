@@ -0,0 +1,98 @@
+"""Hedged requests: a fallback source raced against a slow primary"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import deadline
+
+# Latency quantile of the primary after which the fallback is started too
+HEDGE_QUANTILE = float(os.environ.get("ANALYZER_HEDGE_QUANTILE", "0.95"))
+# Hedge delay until enough latencies are known, and its lower bound
+HEDGE_DELAY_S = float(os.environ.get("ANALYZER_HEDGE_DELAY_MS", "2000")) / 1000
+HEDGE_MIN_DELAY_S = float(os.environ.get("ANALYZER_HEDGE_MIN_DELAY_MS", "250")) / 1000
+
+PRIMARY = "primary"
+FALLBACK = "fallback"
+
+
+class LatencyTracker:
+    """
+    Latencies of the last ``size`` successful calls of a source. ``delay``
+    is their ``quantile``: only the slowest calls get hedged.
+    """
+
+    def __init__(self, size: int = 200, quantile: float = HEDGE_QUANTILE, default: float = HEDGE_DELAY_S,
+                 floor: float = HEDGE_MIN_DELAY_S, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.quantile = quantile
+        self.default = default
+        self.floor = floor
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def delay(self) -> float:
+        if len(self.samples) < self.min_samples:
+            delay = self.default
+        else:
+            ordered = sorted(self.samples)
+            delay = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        delay = max(self.floor, delay)
+        # Leave the fallback half of what remains of the analysis budget
+        left = deadline.remaining()
+        return delay if left is None else max(0.0, min(delay, left / 2))
+
+
+def _consume(task: asyncio.Future):
+    # The loser's outcome is not needed, but must be retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[Any]],
+    fallback: Callable[[], Awaitable[Any]],
+    delay: float
+) -> Tuple[Any, Optional[str], bool]:
+    """
+    Run ``primary``, and ``fallback`` as well once ``delay`` seconds have
+    passed without an answer or as soon as ``primary`` fails. The first good
+    answer (not None, no exception) wins and the other call is cancelled.
+
+    Returns ``(result, PRIMARY | FALLBACK, hedged)``, ``hedged`` telling
+    whether both ran at the same time. ``(None, None, ...)`` when neither
+    answered; the last error is raised if one of them failed.
+    """
+    pending = {asyncio.ensure_future(primary()): PRIMARY}
+    hedge_at = time.monotonic() + delay
+    started_fallback = False
+    was_hedged = False
+    error = None
+    try:
+        while pending:
+            timeout = None if started_fallback else max(0.0, hedge_at - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if result is not None:
+                    return result, source, was_hedged
+            if not started_fallback:
+                # Either the primary is late (hedge) or it gave nothing (plain fallback)
+                was_hedged = bool(pending)
+                started_fallback = True
+                pending[asyncio.ensure_future(fallback())] = FALLBACK
+    finally:
+        for task in pending:
+            task.cancel()
+            task.add_done_callback(_consume)
+    if error is not None:
+        raise error
+    return None, None, was_hedged
@@ -0,0 +1,167 @@
+"""Shared asynchronous HTTP client for upstream market data APIs"""
+import asyncio
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import deadline
+from rate_limiter import PRIORITY_NAMES, RateLimiter, backoff_delay, current_priority, get_limiter, parse_retry_after
+
+DEFAULT_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT_S", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT_S", "3"))
+MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "100"))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS_PER_HOST", "8"))
+MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE_S", "0.5"))
+BACKOFF_CAP = float(os.environ.get("UPSTREAM_BACKOFF_CAP_S", "20"))
+# A longer Retry-After fails the call instead of holding the analysis
+MAX_RETRY_AFTER = float(os.environ.get("UPSTREAM_MAX_RETRY_AFTER_S", "30"))
+
+# Answers worth retrying: rate limited, or a gateway in trouble
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream API answers with a non-2xx status"""
+
+    def __init__(self, url: str, status: int, message: str = ""):
+        super().__init__(f"{status} error for {url}{': ' + message if message else ''}")
+        self.url = url
+        self.status = status
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP client.
+
+    One ``aiohttp.ClientSession`` is kept per event loop, so every analysis
+    run by a long-lived worker reuses the same connections. The connector
+    caps concurrent connections globally and per host, and every call first
+    waits for the rate limiter of its host. aiohttp is only imported with the
+    first session, so analyses served from the caches never load it.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        limit: int = MAX_CONNECTIONS,
+        limit_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.limiter = limiter or get_limiter()
+        self.max_retries = max_retries
+        self._session = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+                headers={"Accept": "application/json"}
+            )
+            self._loop = loop
+        return self._session
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        trace: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        GET ``url`` and decode the JSON body, raising UpstreamError on non-2xx.
+
+        429 and gateway errors are retried after ``Retry-After`` or a jittered
+        exponential backoff; a 429 also pauses every call to that host.
+        ``trace`` receives the time spent waiting for the rate limiter and
+        the number of attempts.
+
+        Under an analysis deadline (deadline.py), waits, attempts and retries
+        only get the time left, and DeadlineExceeded is raised once it is spent.
+        """
+        import aiohttp
+
+        session = self._get_session()
+        host = urlsplit(url).netloc
+        waited = 0.0
+        attempt = 0
+        try:
+            while True:
+                try:
+                    wait_timeout = deadline.timeout_for(None)
+                    waited += await asyncio.wait_for(self.limiter.acquire(host), wait_timeout)
+                    request_timeout = deadline.timeout_for(timeout or self.timeout)
+                    async with session.get(url, params=params,
+                                           timeout=aiohttp.ClientTimeout(total=request_timeout,
+                                                                         connect=self.connect_timeout)) as response:
+                        if response.status < 400:
+                            return await response.json(content_type=None)
+                        error = UpstreamError(url, response.status, response.reason or "")
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                except asyncio.TimeoutError as e:
+                    left = deadline.remaining()
+                    if left is not None and left <= 0:
+                        raise deadline.DeadlineExceeded(f"Analysis deadline exceeded waiting for {host}") from e
+                    raise
+
+                if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                    self.limiter.pause(host, retry_after)
+                    raise error
+                if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise error
+                delay = backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if response.status == 429:
+                    self.limiter.pause(host, delay)
+                left = deadline.remaining()
+                if left is not None and delay >= left:
+                    # No time left for another attempt: fail now rather than after the wait
+                    raise error
+                print(f"{response.status} from {host}, retry {attempt + 1} in {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            if trace is not None:
+                trace["wait"] = waited
+                trace["attempts"] = attempt + 1
+                trace["priority"] = PRIORITY_NAMES.get(current_priority.get(), "interactive")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_client: Optional[HttpClient] = None
+
+
+def get_client() -> HttpClient:
+    """Return the process-wide HTTP client"""
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+async def close_client():
+    if _client is not None:
+        await _client.close()
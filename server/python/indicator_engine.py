@@ -0,0 +1,305 @@
+"""
+Fused indicator engine.
+
+Computes any subset of the indicators of ``indicators.py`` from the OHLC
+arrays in one go, sharing the intermediates the separate ``calculate_*``
+functions each rebuild: the close diffs, every EMA span (one vectorized
+EWM pass over the close), and the true range / directional movement
+series of ADX (smoothed together). Results have the same shapes as the
+``calculate_*`` functions, so they can be fed to ``get_trading_signals``.
+
+The ``*_series`` functions return full indicator series aligned with the
+input bars: element ``t`` is the value the scalar function would return
+on the history up to and including bar ``t``. They work along the last
+axis, so a ``(n_tokens, n_bars)`` matrix of complete rows gives one
+series per token.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from kernels import ewm_last, ewm_mean, rolling_mean_std, shift_fill_first, span_to_alpha
+
+ALL_INDICATORS = ("RSI", "MACD", "BB", "EMA", "ADX")
+
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_PERIOD, BB_STD_DEV = 20, 2.0
+EMA_SPANS = (20, 50, 200)
+ADX_PERIOD = 14
+
+
+def _span_alphas(spans: Iterable[int], ndim: int = 1) -> np.ndarray:
+    """EWM alphas of ``spans``, shaped to stack one series per span in front of an ``ndim`` input"""
+    alphas = np.array([span_to_alpha(s) for s in spans])
+    return alphas.reshape((-1,) + (1,) * (ndim - 1))
+
+
+def _rsi(close: np.ndarray, delta: np.ndarray, period: int = RSI_PERIOD) -> float:
+    if len(close) < period + 1:
+        return 50.0
+    if np.all(close == close[0]):
+        return 50.0
+
+    # Same convention as calculate_rsi: the last change is counted twice
+    delta = np.append(delta, delta[-1])
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    if not losses.any():
+        return 100.0
+    if not gains.any():
+        return 0.0
+
+    avg_gain, avg_loss = ewm_last(np.vstack([gains, losses]), 1.0 / period, adjust=True)
+    rs = avg_gain / max(avg_loss, 0.0001)
+    return float(100 - (100 / (1 + rs)))
+
+
+def rsi_series(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """RSI at every bar, with the conventions of calculate_rsi"""
+    close = np.asarray(close, dtype=np.float64)
+    n = close.shape[-1]
+    out = np.full(close.shape, 50.0)
+    if n < period + 1:
+        return out
+
+    delta = np.diff(close)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    alpha = 1.0 / period
+    w = 1.0 - alpha
+    moves = np.stack([gains, losses])
+    avg = ewm_mean(moves, alpha, adjust=True)
+
+    # Count each bar's last change twice, as calculate_rsi does on a prefix:
+    # fold one more observation into the adjusted mean (weight sum D)
+    weight_sum = (1 - w ** np.arange(1, n)) / alpha
+    avg = (w * avg * weight_sum + moves) / (w * weight_sum + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + avg[0] / np.maximum(avg[1], 0.0001)))
+
+    any_gain = np.logical_or.accumulate(delta > 0, axis=-1)
+    any_loss = np.logical_or.accumulate(delta < 0, axis=-1)
+    rsi = np.where(~any_gain, 0.0, rsi)
+    rsi = np.where(~any_loss, 100.0, rsi)
+    rsi = np.where(~any_gain & ~any_loss, 50.0, rsi)
+    out[..., period:] = rsi[..., period - 1:]
+    return out
+
+
+def macd_series(
+    close: np.ndarray,
+    fast: int = MACD_FAST,
+    slow: int = MACD_SLOW,
+    signal: int = MACD_SIGNAL,
+    emas: Optional[Dict[int, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+    """MACD line, signal and histogram at every bar"""
+    if emas is None:
+        close = np.asarray(close, dtype=np.float64)
+        emas = dict(zip((fast, slow), ewm_mean(close, _span_alphas((fast, slow), close.ndim))))
+    line = emas[fast] - emas[slow]
+    signal_line = ewm_mean(line, span_to_alpha(signal))
+    return {"macd": line, "signal": signal_line, "hist": line - signal_line}
+
+
+def check_window(window: Optional[int]):
+    """Reject a ``window`` that is not a positive number of bars"""
+    if window is not None and window < 1:
+        raise ValueError("window must be a positive number of bars")
+
+
+def trailing(values, window: Optional[int]):
+    """Last ``window`` points of a series or of a (nested) dict of series, as views"""
+    if window is None:
+        return values
+    if isinstance(values, dict):
+        return {k: trailing(v, window) for k, v in values.items()}
+    return values[-window:]
+
+
+def bollinger_series(
+    close: np.ndarray,
+    period: int = BB_PERIOD,
+    std_dev: float = BB_STD_DEV,
+    window: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """Bollinger Bands at every bar (or only the last ``window`` bars)"""
+    check_window(window)
+    close = np.asarray(close, dtype=np.float64)
+    if window is not None:
+        # Only the inputs the last ``window`` bands depend on
+        close = close[..., max(0, close.shape[-1] - window - period + 1):]
+    middle, std = rolling_mean_std(close, period)
+    bands = {"upper": middle + std * std_dev, "middle": middle, "lower": middle - std * std_dev}
+    if window is not None:
+        bands = {k: v[..., -window:] for k, v in bands.items()}
+    return bands
+
+
+def ema_series(close: np.ndarray, spans: Iterable[int] = EMA_SPANS) -> Dict[str, np.ndarray]:
+    """EMAs of every span at every bar, smoothed in a single pass"""
+    spans = list(spans)
+    close = np.asarray(close, dtype=np.float64)
+    rows = ewm_mean(close, _span_alphas(spans, close.ndim))
+    return {f"EMA{s}": row for s, row in zip(spans, rows)}
+
+
+def _directional_index(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """DX series, with the first movement counted twice as calculate_adx does"""
+    prev_close = close[..., :-1]
+    tr = np.maximum.reduce([
+        np.abs(high[..., 1:] - low[..., 1:]),
+        np.abs(high[..., 1:] - prev_close),
+        np.abs(low[..., 1:] - prev_close)
+    ])
+    high_diff = high[..., 1:] - high[..., :-1]
+    low_diff = low[..., :-1] - low[..., 1:]
+    pos_dm = np.where((high_diff > low_diff) & (high_diff > 0), high_diff, 0.0)
+    neg_dm = np.where((low_diff > high_diff) & (low_diff > 0), low_diff, 0.0)
+
+    # ATR, +DM and -DM share the same smoothing: one EWM pass for all three
+    atr, pos_ema, neg_ema = ewm_mean(shift_fill_first(np.stack([tr, pos_dm, neg_dm])), span_to_alpha(period))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pos_di = 100 * pos_ema / atr
+        neg_di = 100 * neg_ema / atr
+        return 100 * np.abs(pos_di - neg_di) / (pos_di + neg_di)
+
+
+def _adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ADX_PERIOD) -> float:
+    if len(close) < period + 1:
+        return 0.0
+    dx = _directional_index(high, low, close, period)
+    return float(ewm_mean(dx, span_to_alpha(period))[-1])
+
+
+def adx_series(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ADX_PERIOD) -> np.ndarray:
+    """ADX at every bar; 0 while fewer than ``period + 1`` bars are available"""
+    close = np.asarray(close, dtype=np.float64)
+    if close.shape[-1] < period + 1:
+        return np.zeros(close.shape)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    adx = ewm_mean(_directional_index(high, low, close, period), span_to_alpha(period))
+    adx[..., :period] = 0.0
+    return adx
+
+
+def latest_values(series: Dict) -> Dict:
+    """Reduce a full-series result of compute_indicators to its scalar form"""
+    return {
+        k: latest_values(v) if isinstance(v, dict) else float(v[-1])
+        for k, v in series.items()
+    }
+
+
+def compute_indicators(
+    close: np.ndarray,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    indicators: Iterable[str] = ALL_INDICATORS,
+    full_series: bool = False,
+    window: Optional[int] = None
+) -> Dict:
+    """
+    Compute the requested indicators over one price history.
+
+    Args:
+        close: Array of closing prices
+        high: Array of high prices (defaults to ``close``)
+        low: Array of low prices (defaults to ``close``)
+        indicators: Subset of ``ALL_INDICATORS`` to compute
+        full_series: Return every indicator as an array aligned with the
+            input bars instead of its latest value
+        window: With ``full_series``, only return the last ``window`` bars
+            (views into the computed series, not copies)
+    Returns:
+        Dict keyed like the ``indicators`` section of an analysis
+        (``RSI``, ``MACD``, ``BB``, ``EMA``, ``ADX``)
+    """
+    wanted = set(indicators)
+    unknown = wanted - set(ALL_INDICATORS)
+    if unknown:
+        raise ValueError(f"Unknown indicators: {', '.join(sorted(unknown))}")
+
+    close = np.asarray(close, dtype=np.float64)
+    if full_series:
+        return _compute_series(close, high, low, wanted, window)
+    results: Dict = {}
+
+    # Every EMA span needed, in a single vectorized pass
+    spans = []
+    if "MACD" in wanted:
+        spans += [MACD_FAST, MACD_SLOW]
+    if "EMA" in wanted:
+        spans += [s for s in EMA_SPANS if s not in spans]
+    emas = {}
+    if spans:
+        alphas = np.array([span_to_alpha(s) for s in spans])
+        emas = dict(zip(spans, ewm_mean(close, alphas)))
+
+    if "RSI" in wanted:
+        results["RSI"] = _rsi(close, np.diff(close))
+
+    if "MACD" in wanted:
+        macd_line = emas[MACD_FAST] - emas[MACD_SLOW]
+        signal = float(ewm_last(macd_line, span_to_alpha(MACD_SIGNAL)))
+        results["MACD"] = {
+            "macd": float(macd_line[-1]),
+            "signal": signal,
+            "hist": float(macd_line[-1] - signal)
+        }
+
+    if "BB" in wanted:
+        middle, std = rolling_mean_std(close, BB_PERIOD, last_only=True)
+        results["BB"] = {
+            "upper": float(middle + std * BB_STD_DEV),
+            "middle": float(middle),
+            "lower": float(middle - std * BB_STD_DEV)
+        }
+
+    if "EMA" in wanted:
+        results["EMA"] = {f"EMA{s}": float(emas[s][-1]) for s in EMA_SPANS}
+
+    if "ADX" in wanted:
+        high = close if high is None else np.asarray(high, dtype=np.float64)
+        low = close if low is None else np.asarray(low, dtype=np.float64)
+        results["ADX"] = _adx(high, low, close)
+
+    return results
+
+
+def _compute_series(
+    close: np.ndarray,
+    high: Optional[np.ndarray],
+    low: Optional[np.ndarray],
+    wanted: set,
+    window: Optional[int]
+) -> Dict:
+    check_window(window)
+
+    series: Dict = {}
+    spans = []
+    if "MACD" in wanted:
+        spans += [MACD_FAST, MACD_SLOW]
+    if "EMA" in wanted:
+        spans += [s for s in EMA_SPANS if s not in spans]
+    emas = {}
+    if spans:
+        alphas = np.array([span_to_alpha(s) for s in spans])
+        emas = dict(zip(spans, ewm_mean(close, alphas)))
+
+    if "RSI" in wanted:
+        series["RSI"] = rsi_series(close)
+    if "MACD" in wanted:
+        series["MACD"] = macd_series(close, emas=emas)
+    if "BB" in wanted:
+        series["BB"] = bollinger_series(close, window=window)
+    if "EMA" in wanted:
+        series["EMA"] = {f"EMA{s}": emas[s] for s in EMA_SPANS}
+    if "ADX" in wanted:
+        high = close if high is None else high
+        low = close if low is None else low
+        series["ADX"] = adx_series(high, low, close)
+
+    return trailing(series, window)
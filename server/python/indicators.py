@@ -1,16 +1,37 @@
 """Technical indicators calculation with improved accuracy"""
 import numpy as np
-import pandas as pd
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 
-def calculate_rsi(prices: np.ndarray, period: int = 14) -> float:
+from indicator_engine import (
+    adx_series,
+    bollinger_series,
+    check_window,
+    ema_series,
+    macd_series,
+    rsi_series,
+    trailing,
+)
+# NumPy equivalents of pandas' ewm().mean() and rolling(): importing pandas
+# alone costs more than a whole analysis
+from kernels import ewm_mean, rolling_mean_std, span_to_alpha
+
+
+def calculate_rsi(prices: np.ndarray, period: int = 14, full_series: bool = False,
+                  window: Optional[int] = None) -> float:
     """
     Calculate RSI with proper exponential weighting
     
     Args:
         prices: Array of closing prices
         period: RSI period (default 14)
+        full_series: Return the RSI at every bar (an array aligned with
+            ``prices``) instead of the latest value
+        window: With ``full_series``, only the last ``window`` bars
     """
+    if full_series:
+        check_window(window)
+        return trailing(rsi_series(prices, period), window)
+
     # Handle not enough data
     if len(prices) < period + 1:
         return 50.0  # Return neutral value
@@ -34,16 +55,17 @@ def calculate_rsi(prices: np.ndarray, period: int = 14) -> float:
         return 0.0    # All price movements are down
     
     # Calculate average gains and losses
-    avg_gains = pd.Series(gains).ewm(alpha=1/period, min_periods=period).mean()
-    avg_losses = pd.Series(losses).ewm(alpha=1/period, min_periods=period).mean()
+    avg_gains = ewm_mean(gains, 1/period, adjust=True, min_periods=period)
+    avg_losses = ewm_mean(losses, 1/period, adjust=True, min_periods=period)
     
     # Calculate RS and RSI (handle division by zero)
-    rs = avg_gains.iloc[-1] / max(avg_losses.iloc[-1], 0.0001)  # Avoid division by zero
+    rs = avg_gains[-1] / max(avg_losses[-1], 0.0001)  # Avoid division by zero
     rsi = 100 - (100 / (1 + rs))
     
     return float(rsi)
 
-def calculate_macd(prices: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, float]:
+def calculate_macd(prices: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9,
+                   full_series: bool = False, window: Optional[int] = None) -> Dict[str, float]:
     """
     Calculate MACD with proper exponential moving averages
     
@@ -52,27 +74,34 @@ def calculate_macd(prices: np.ndarray, fast: int = 12, slow: int = 26, signal: i
         fast: Fast EMA period
         slow: Slow EMA period
         signal: Signal line period
+        full_series: Return arrays aligned with ``prices`` instead of the latest values
+        window: With ``full_series``, only the last ``window`` bars
     """
+    if full_series:
+        check_window(window)
+        return trailing(macd_series(prices, fast, slow, signal), window)
+
     # Calculate EMAs
-    fast_ema = pd.Series(prices).ewm(span=fast, adjust=False).mean()
-    slow_ema = pd.Series(prices).ewm(span=slow, adjust=False).mean()
+    fast_ema = ewm_mean(prices, span_to_alpha(fast))
+    slow_ema = ewm_mean(prices, span_to_alpha(slow))
     
     # Calculate MACD line
     macd_line = fast_ema - slow_ema
     
     # Calculate signal line
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
+    signal_line = ewm_mean(macd_line, span_to_alpha(signal))
     
     # Calculate histogram
     histogram = macd_line - signal_line
     
     return {
-        'macd': float(macd_line.iloc[-1]),
-        'signal': float(signal_line.iloc[-1]),
-        'hist': float(histogram.iloc[-1])
+        'macd': float(macd_line[-1]),
+        'signal': float(signal_line[-1]),
+        'hist': float(histogram[-1])
     }
 
-def calculate_bollinger_bands(prices: np.ndarray, period: int = 20, std_dev: float = 2.0) -> Dict[str, float]:
+def calculate_bollinger_bands(prices: np.ndarray, period: int = 20, std_dev: float = 2.0,
+                              full_series: bool = False, window: Optional[int] = None) -> Dict[str, float]:
     """
     Calculate Bollinger Bands with proper standard deviation
     
@@ -80,35 +109,46 @@ def calculate_bollinger_bands(prices: np.ndarray, period: int = 20, std_dev: flo
         prices: Array of closing prices
         period: Moving average period
         std_dev: Number of standard deviations
+        full_series: Return arrays aligned with ``prices`` instead of the latest values
+        window: With ``full_series``, only the last ``window`` bars
     """
-    # Calculate middle band (SMA)
-    middle_band = pd.Series(prices).rolling(window=period).mean()
-    
-    # Calculate standard deviation
-    rolling_std = pd.Series(prices).rolling(window=period).std()
+    if full_series:
+        check_window(window)
+        return bollinger_series(prices, period, std_dev, window=window)
+
+    # Calculate middle band (SMA) and standard deviation over the last window
+    middle_band, rolling_std = rolling_mean_std(prices, period, last_only=True)
     
     # Calculate upper and lower bands
     upper_band = middle_band + (rolling_std * std_dev)
     lower_band = middle_band - (rolling_std * std_dev)
     
     return {
-        'upper': float(upper_band.iloc[-1]),
-        'middle': float(middle_band.iloc[-1]),
-        'lower': float(lower_band.iloc[-1])
+        'upper': float(upper_band),
+        'middle': float(middle_band),
+        'lower': float(lower_band)
     }
 
-def calculate_ema_signals(prices: np.ndarray) -> Dict[str, float]:
+def calculate_ema_signals(prices: np.ndarray, full_series: bool = False,
+                          window: Optional[int] = None) -> Dict[str, float]:
     """
     Calculate EMAs and their crossover signals
+
+    With ``full_series``, every EMA is returned as an array aligned with
+    ``prices`` (the last ``window`` bars only, if given).
     """
-    ema20 = pd.Series(prices).ewm(span=20, adjust=False).mean()
-    ema50 = pd.Series(prices).ewm(span=50, adjust=False).mean()
-    ema200 = pd.Series(prices).ewm(span=200, adjust=False).mean()
+    if full_series:
+        check_window(window)
+        return trailing(ema_series(prices), window)
+
+    ema20 = ewm_mean(prices, span_to_alpha(20))
+    ema50 = ewm_mean(prices, span_to_alpha(50))
+    ema200 = ewm_mean(prices, span_to_alpha(200))
     
     return {
-        'EMA20': float(ema20.iloc[-1]),
-        'EMA50': float(ema50.iloc[-1]),
-        'EMA200': float(ema200.iloc[-1])
+        'EMA20': float(ema20[-1]),
+        'EMA50': float(ema50[-1]),
+        'EMA200': float(ema200[-1])
     }
 
 def calculate_risk_score(
@@ -145,7 +185,8 @@ def calculate_risk_score(
     return float(min(max(risk_score, 0), 1))
 
 
-def calculate_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+def calculate_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14,
+                  full_series: bool = False, window: Optional[int] = None) -> np.ndarray:
     """
     Calculate ADX (Average Directional Index)
     
@@ -154,9 +195,15 @@ def calculate_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period:
         low: Array of low prices
         close: Array of closing prices
         period: ADX period (default 14)
+        full_series: Return the ADX at every bar instead of the latest value
+        window: With ``full_series``, only the last ``window`` bars
     Returns:
         ADX values
     """
+    if full_series:
+        check_window(window)
+        return trailing(adx_series(high, low, close, period), window)
+
     if len(close) < period + 1:
         return np.zeros_like(close)
         
@@ -169,7 +216,7 @@ def calculate_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period:
     tr = np.insert(tr, 0, tr[0])
     
     # Calculate ATR (Average True Range)
-    atr = pd.Series(tr).ewm(span=period, adjust=False).mean()
+    atr = ewm_mean(tr, span_to_alpha(period))
     
     # Calculate +DM and -DM (Directional Movement)
     high_diff = high[1:] - high[:-1]
@@ -182,16 +229,17 @@ def calculate_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period:
     neg_dm = np.insert(neg_dm, 0, neg_dm[0])
     
     # Calculate +DI and -DI (Directional Indicators)
-    pos_di = 100 * pd.Series(pos_dm).ewm(span=period, adjust=False).mean() / atr
-    neg_di = 100 * pd.Series(neg_dm).ewm(span=period, adjust=False).mean() / atr
+    pos_di = 100 * ewm_mean(pos_dm, span_to_alpha(period)) / atr
+    neg_di = 100 * ewm_mean(neg_dm, span_to_alpha(period)) / atr
     
     # Calculate DX (Directional Index)
-    dx = 100 * abs(pos_di - neg_di) / (pos_di + neg_di)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = 100 * abs(pos_di - neg_di) / (pos_di + neg_di)
     
     # Calculate ADX
-    adx = pd.Series(dx).ewm(span=period, adjust=False).mean()
+    adx = ewm_mean(dx, span_to_alpha(period))
     
-    return float(adx.iloc[-1])
+    return float(adx[-1])
 
 def get_trading_signals(
     rsi: float,
@@ -0,0 +1,279 @@
+"""
+Pure NumPy moving-window kernels.
+
+These reproduce the pandas ``ewm(...).mean()`` and ``rolling(...)`` results
+used by the indicators, but work on 1-D series or on 2-D arrays of
+independent rows (time along the last axis) without any per-row Python
+overhead. Rows may start with NaN padding; the result is NaN until each
+row's first observation, as with pandas.
+"""
+import math
+from typing import Union
+
+import numpy as np
+
+ArrayLike = Union[np.ndarray, float]
+
+# Largest w**-k allowed inside one block of the closed-form EWM recursion
+_MAX_BLOCK_SCALE = 1e150
+_MAX_BLOCK_LEN = 4096
+_ROLLING_CHUNK = 65536
+
+
+def span_to_alpha(span: float) -> float:
+    return 2.0 / (span + 1.0)
+
+
+def _first_valid(x: np.ndarray) -> np.ndarray:
+    """Index of the first non-NaN value of each row (n if the row is all NaN)"""
+    valid = ~np.isnan(x)
+    first = np.argmax(valid, axis=-1)
+    first[~valid.any(axis=-1)] = x.shape[-1]
+    return first
+
+
+def _linear_recurrence(b: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """
+    Solve y[t] = w * y[t-1] + b[t] with y[-1] = 0 for every row of ``b``.
+
+    The series is split into blocks short enough for w**-k to stay finite;
+    inside a block the recursion has the closed form
+    y[t0+j] = w**j * (w * y[t0-1] + sum_k b[t0+k] * w**-k), a cumulative sum.
+    Rows sharing the same ``w`` share their power tables.
+    """
+    m, n = b.shape
+    y = np.empty_like(b)
+    if n == 0:
+        return y
+
+    for wu in np.unique(w):
+        rows = slice(None) if len(w) == 1 or (w == wu).all() else np.nonzero(w == wu)[0]
+        if wu == 0:
+            y[rows] = b[rows]
+            continue
+        log_w = math.log(wu)
+        block = int(min(_MAX_BLOCK_LEN, n, max(1, math.floor(math.log(_MAX_BLOCK_SCALE) / -log_w))))
+        k = np.arange(block)
+        inv_pow = np.exp(-log_w * k)   # w**-k
+        pow_ = np.exp(log_w * k)       # w**k
+
+        # Write blocks straight into the output to avoid full-size temporaries
+        whole = isinstance(rows, slice)
+        bw = b if whole else b[rows]
+        yw = y if whole else np.empty_like(bw)
+        prev = np.zeros(bw.shape[0])
+        for t0 in range(0, n, block):
+            t1 = min(t0 + block, n)
+            length = t1 - t0
+            acc = yw[:, t0:t1]
+            np.multiply(bw[:, t0:t1], inv_pow[:length], out=acc)
+            np.cumsum(acc, axis=1, out=acc)
+            acc += (wu * prev)[:, None]
+            acc *= pow_[:length]
+            prev = acc[:, -1].copy()
+        if not whole:
+            y[rows] = yw
+    return y
+
+
+def _ewm_loop(x: np.ndarray, alpha: np.ndarray, adjust: bool) -> np.ndarray:
+    """
+    Reference pandas EWM recursion, used for rows with interior NaN.
+
+    Iterates over time but is vectorized across the rows of ``x``.
+    """
+    out = np.empty_like(x)
+    old_wt_factor = 1.0 - alpha
+    new_wt = np.ones_like(alpha) if adjust else alpha
+    weighted = x[:, 0].copy()
+    old_wt = np.ones(len(x))
+    out[:, 0] = weighted
+    for i in range(1, x.shape[1]):
+        cur = x[:, i]
+        is_obs = ~np.isnan(cur)
+        started = ~np.isnan(weighted)
+
+        old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+        combine = started & is_obs
+        mixed = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+        weighted = np.where(combine & (weighted != cur), mixed, weighted)
+        if adjust:
+            old_wt = np.where(combine, old_wt + new_wt, old_wt)
+        else:
+            old_wt = np.where(combine, 1.0, old_wt)
+
+        weighted = np.where(~started & is_obs, cur, weighted)
+        out[:, i] = weighted
+    return out
+
+
+def _prepare(x, alpha):
+    x = np.asarray(x, dtype=np.float64)
+    alpha = np.asarray(alpha, dtype=np.float64)
+    shape = np.broadcast_shapes(x.shape[:-1], alpha.shape) + x.shape[-1:]
+    x2 = np.broadcast_to(x, shape).reshape(-1, shape[-1])
+    a = np.broadcast_to(alpha[..., None] if alpha.ndim else alpha, shape[:-1] + (1,)).reshape(-1)
+    return x2, a, shape
+
+
+def ewm_mean(
+    x: np.ndarray,
+    alpha: ArrayLike,
+    adjust: bool = False,
+    min_periods: int = 0
+) -> np.ndarray:
+    """
+    Exponentially weighted mean along the last axis.
+
+    Equivalent to ``pd.Series(x).ewm(alpha=alpha, adjust=adjust,
+    min_periods=min_periods).mean()`` for each row. ``alpha`` may be an
+    array broadcasting against the leading axes of ``x``, e.g. a 1-D
+    series with ``alpha`` of shape ``(k,)`` returns the ``k`` EMAs stacked
+    as a ``(k, n)`` array in one pass.
+    """
+    x2, a, shape = _prepare(x, alpha)
+    m, n = x2.shape
+    if n == 0:
+        return np.empty(shape)
+
+    nan_mask = np.isnan(x2)
+    has_nan = nan_mask.any()
+    if has_nan:
+        first = _first_valid(x2)
+        before = np.arange(n)[None, :] < first[:, None]
+        interior_nan = (nan_mask & ~before).any(axis=1)
+    else:
+        first = np.zeros(m, dtype=np.int64)
+
+    # Work on deviations from each row's first value: weights sum to one, so
+    # the offset is added back exactly and constant rows stay exactly constant.
+    # The first observation then contributes zero, whatever its weight.
+    rows = np.nonzero(first < n)[0]
+    offset = np.zeros(m)
+    offset[rows] = x2[rows, first[rows]]
+    xb = x2 - offset[:, None]
+    if has_nan:
+        xb[nan_mask] = 0.0
+    w = 1.0 - a
+    if adjust:
+        out = _linear_recurrence(xb, w)
+        # Sum of the weights since the first observation, in closed form
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if has_nan:
+                seen = np.maximum(np.arange(1, n + 1)[None, :] - first[:, None], 0)
+                out /= (1 - np.power(w[:, None], seen)) / a[:, None]
+            else:
+                # Every row starts at 0: one denominator per distinct alpha
+                for au in np.unique(a):
+                    sel = slice(None) if (a == au).all() else np.nonzero(a == au)[0]
+                    out[sel] /= (1 - np.power(1.0 - au, np.arange(1, n + 1))) / au
+    else:
+        xb *= a[:, None]
+        out = _linear_recurrence(xb, w)
+
+    out += offset[:, None]
+    if has_nan:
+        out[before] = np.nan
+        if interior_nan.any():
+            with np.errstate(invalid="ignore"):
+                out[interior_nan] = _ewm_loop(x2[interior_nan], a[interior_nan], adjust)
+
+    if min_periods > 1:
+        nobs = np.cumsum(~nan_mask, axis=1)
+        out[nobs < min_periods] = np.nan
+    return out.reshape(shape)
+
+
+def ewm_last(x: np.ndarray, alpha: ArrayLike, adjust: bool = False) -> np.ndarray:
+    """
+    Last value of :func:`ewm_mean` as a weighted sum, without materializing
+    the series. Rows must not contain NaN after their leading padding.
+    """
+    x2, a, shape = _prepare(x, alpha)
+    m, n = x2.shape
+    if n == 0:
+        return np.full(shape[:-1], np.nan)
+
+    first = _first_valid(x2)
+    rows = np.nonzero(first < n)[0]
+    offset = np.zeros(m)
+    offset[rows] = x2[rows, first[rows]]
+    # Deviations from the first value: padding and the first observation are
+    # both zero, so every row reduces to a dot product with the same weights
+    xb = np.where(np.isnan(x2), 0.0, x2 - offset[:, None])
+    observed = n - first
+
+    out = np.empty(m)
+    age = np.arange(n - 1, -1, -1)
+    for au in np.unique(a):
+        sel = slice(None) if (a == au).all() else np.nonzero(a == au)[0]
+        w = 1.0 - au
+        weighted = xb[sel] @ np.power(w, age)
+        if adjust:
+            total = (1 - w ** observed[sel]) / au if au > 0 else observed[sel]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[sel] = weighted / total
+        else:
+            out[sel] = au * weighted
+    out += offset
+    out[first >= n] = np.nan
+    return out.reshape(shape[:-1])
+
+
+def ewm_last_weights(alpha: float, n: int) -> np.ndarray:
+    """
+    Weights of ``x[t] - x[first]`` in the last value of ``ewm_mean(x, alpha)``
+    (``adjust=False``), oldest bar first. Stacked as columns, several EWMs
+    of the same rows reduce to one matrix product.
+    """
+    return alpha * np.power(1.0 - alpha, np.arange(n - 1, -1, -1))
+
+
+def nested_ewm_last_weights(inner: float, outer: float, n: int) -> np.ndarray:
+    """
+    Weights of ``x[t] - x[first]`` in the last value of
+    ``ewm_mean(ewm_mean(x, inner) - x[first], outer)``, both with
+    ``adjust=False``. ``inner`` and ``outer`` must differ.
+    """
+    w_in, w_out = 1.0 - inner, 1.0 - outer
+    # sum over u in [0, age] of w_out**(age - u) * w_in**u, in closed form
+    steps = np.arange(n, 0, -1)
+    geometric = (np.power(w_out, steps) - np.power(w_in, steps)) / (w_out - w_in)
+    return outer * inner * geometric
+
+
+def rolling_mean_std(x: np.ndarray, window: int, ddof: int = 1, last_only: bool = False):
+    """
+    Rolling mean and standard deviation along the last axis.
+
+    Matches ``rolling(window).mean()`` / ``.std(ddof)`` with the default
+    ``min_periods=window``: NaN until a full window of observations is
+    available. Windows are evaluated in chunks with a two-pass variance,
+    so memory stays bounded on long series.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    if last_only:
+        if n < window:
+            nan = np.full(x.shape[:-1], np.nan)
+            return nan, nan.copy()
+        tail = x[..., n - window:]
+        return tail.mean(axis=-1), tail.std(axis=-1, ddof=ddof)
+
+    mean = np.full(x.shape, np.nan)
+    std = np.full(x.shape, np.nan)
+    if n < window:
+        return mean, std
+
+    windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=-1)
+    for start in range(0, windows.shape[-2], _ROLLING_CHUNK):
+        stop = min(start + _ROLLING_CHUNK, windows.shape[-2])
+        chunk = windows[..., start:stop, :]
+        mean[..., window - 1 + start:window - 1 + stop] = chunk.mean(axis=-1)
+        std[..., window - 1 + start:window - 1 + stop] = chunk.std(axis=-1, ddof=ddof)
+    return mean, std
+
+
+def shift_fill_first(values: np.ndarray) -> np.ndarray:
+    """Prepend the first element to a diffed series, as ``np.insert(v, 0, v[0])`` does"""
+    return np.concatenate([values[..., :1], values], axis=-1)
@@ -0,0 +1,88 @@
+"""
+Live updates of an analysis, for streaming subscribers.
+
+The first tick of a token runs a full analysis, which also seeds the
+streaming indicator states (streaming.py) with every bar but the last one,
+the current bar. Later ticks only fetch the current quote and advance a
+copy of those states by that one bar: O(1) work and a single (cached)
+upstream call instead of the whole pipeline. States are re-seeded by a full
+analysis once a new daily bar has started, so live values stay the ones
+``/analyze`` would return.
+
+States are plain JSON: the caller keeps them between ticks, so any worker
+can serve the next one.
+"""
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from indicators import get_trading_signals
+from series_store import BAR_MS
+from streaming import IndicatorState
+
+# Delay after a UTC day boundary before re-seeding, so that the new daily bar is published
+RESEED_DELAY_MS = int(os.environ.get("ANALYZER_LIVE_RESEED_DELAY_MS", "300000"))
+
+
+def seed_state(results: Dict, price_data: Optional[Dict[str, np.ndarray]], now_ms: int) -> Optional[Dict]:
+    """Live state of a full analysis and its price arrays, or None if it did not succeed"""
+    if results.get('status') != 'success' or price_data is None or len(price_data['close']) < 2:
+        return None
+    close, high, low = (np.asarray(price_data[k], dtype=np.float64) for k in ('close', 'high', 'low'))
+    return {
+        'indicators': IndicatorState.from_history(high[:-1], low[:-1], close[:-1]).to_dict(),
+        # Range of the current bar so far, widened by the live prices
+        'bar_high': float(high[-1]),
+        'bar_low': float(low[-1]),
+        'market_data': results['market_data'],
+        'reseed_at': (now_ms // BAR_MS + 1) * BAR_MS + RESEED_DELAY_MS,
+    }
+
+
+def live_values(state: Dict, market_data: Dict) -> Dict:
+    """Indicators and signals with the current price as the last bar"""
+    price = float(market_data['current_price'])
+    indicators = IndicatorState.from_dict(state['indicators'])
+    values = indicators.update(max(state['bar_high'], price), min(state['bar_low'], price), price)
+    signals = get_trading_signals(values['RSI'], values['MACD'], values['BB'], values['EMA'], price)
+    return {'indicators': values, 'signals': signals}
+
+
+async def live_tick(token_address: str, chain: str = "ethereum", state: Optional[Dict] = None,
+                    now_ms: Optional[int] = None) -> Dict:
+    """
+    One live update of a token.
+
+    Without ``state``, or once it is due for re-seeding, returns the full
+    ``analysis`` and a new ``state``. Otherwise returns ``update``: the
+    current market data, indicators and signals, and the ``state`` to send
+    with the next tick (the current bar's range widened by this price).
+    """
+    from crypto_analyzer import CryptoAnalyzer
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    analyzer = CryptoAnalyzer(token_address, chain)
+
+    if state is None or now_ms >= state['reseed_at']:
+        results = await analyzer.run_analysis()
+        return {'analysis': results, 'state': seed_state(results, analyzer.price_data, now_ms)}
+
+    market_data = dict(state['market_data'])
+    quote = await analyzer.get_live_quote()
+    if quote:
+        market_data.update(quote)
+    price = float(market_data['current_price'])
+    state = dict(state, bar_high=max(state['bar_high'], price), bar_low=min(state['bar_low'], price))
+    return {
+        'state': state,
+        'update': {
+            'timestamp': datetime.now().isoformat(),
+            'token_address': token_address,
+            'chain': chain,
+            'market_data': market_data,
+            'technical_analysis': live_values(state, market_data),
+            'status': 'success'
+        }
+    }
@@ -0,0 +1,267 @@
+"""
+Bounded-memory analysis of long, high-resolution price histories.
+
+Candles are kept in a ``SeriesStore`` of float32 price columns
+(``CANDLE_COLUMNS``, half the size of float64) and read as memory maps,
+so a history of any length costs address space and page cache, not
+process memory. An analysis only loads, as float64, the trailing bars
+each indicator's latest value depends on: its period plus the warm-up
+after which an exponential smoothing started at the first loaded bar
+agrees with the one started at the beginning of the history (the weight
+left on the starting value falls below ``WARMUP_TOLERANCE``). Statistics
+that need every bar (volatility) are accumulated chunk by chunk.
+
+Peak memory is therefore set by the longest warm-up (EMA200, a few
+thousand bars) and ``CHUNK_BARS``, whatever the length of the history.
+Prices stored as float32 carry about 7 significant digits, which bounds
+the precision of the results.
+
+    python3 long_history.py [--candles-path DIR] [--window N] CHAIN ADDRESS
+    python3 long_history.py import [--candles-path DIR] [--bar-ms MS] CHAIN ADDRESS FILE
+
+analyzes a stored history and prints the result as JSON; ``import`` appends
+the candles of a CSV file (``t,open,high,low,close,volume`` rows, ``t`` in
+ms since epoch, sorted) to the store, ``CHUNK_BARS`` rows at a time.
+Workers serve the same analysis with the ``long_history`` op
+(``GET /analyze/:address/long``).
+"""
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from indicator_engine import (
+    ADX_PERIOD, ALL_INDICATORS, BB_PERIOD, EMA_SPANS, MACD_SIGNAL, MACD_SLOW, RSI_PERIOD,
+    check_window, compute_indicators, latest_values
+)
+from indicators import get_trading_signals
+from kernels import span_to_alpha
+from series_store import SeriesStore
+
+DEFAULT_CANDLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "candles")
+CANDLES_PATH = os.environ.get("ANALYZER_CANDLES_PATH", DEFAULT_CANDLES_PATH)
+
+# Minute candles by default
+CANDLE_BAR_MS = int(os.environ.get("ANALYZER_CANDLE_BAR_MS", "60000"))
+
+CANDLE_COLUMNS = {
+    "t": np.dtype("<i8"),          # bar start, ms since epoch
+    "open": np.dtype("<f4"),
+    "high": np.dtype("<f4"),
+    "low": np.dtype("<f4"),
+    "close": np.dtype("<f4"),
+    "volume": np.dtype("<f4"),
+}
+
+# Weight of the first loaded bar in a truncated exponential smoothing
+WARMUP_TOLERANCE = 1e-10
+# Bars converted to float64 at a time by the full passes
+CHUNK_BARS = 1 << 20
+
+
+def candle_store(path: Optional[str] = CANDLES_PATH, bar_ms: int = CANDLE_BAR_MS) -> SeriesStore:
+    """A store of float32 OHLCV candles of ``bar_ms`` milliseconds"""
+    return SeriesStore(path, columns=CANDLE_COLUMNS, bar_ms=bar_ms)
+
+
+_store: Optional[SeriesStore] = None
+
+
+def get_candle_store() -> SeriesStore:
+    """Return the process-wide candle store"""
+    global _store
+    if _store is None:
+        _store = candle_store()
+    return _store
+
+
+def _stored_address(address: str, chain: str) -> str:
+    # Stored under the normalized address, like the daily series
+    from crypto_analyzer import normalize_token_address
+    return normalize_token_address(address, chain)
+
+
+def warmup_bars(alpha: float, tolerance: float = WARMUP_TOLERANCE) -> int:
+    """Bars after which the weight ``(1 - alpha) ** n`` of an EWM's starting value is below ``tolerance``"""
+    return int(math.ceil(math.log(tolerance) / math.log1p(-alpha)))
+
+
+def bars_needed(indicator: str, tolerance: float = WARMUP_TOLERANCE) -> int:
+    """Trailing bars the latest value of ``indicator`` depends on, up to ``tolerance``"""
+    if indicator == "RSI":
+        return warmup_bars(1.0 / RSI_PERIOD, tolerance) + 1
+    if indicator == "MACD":
+        # The signal line smooths the MACD line, itself exact after the slow EMA's warm-up
+        return warmup_bars(span_to_alpha(MACD_SLOW), tolerance) + warmup_bars(span_to_alpha(MACD_SIGNAL), tolerance)
+    if indicator == "BB":
+        return BB_PERIOD
+    if indicator == "EMA":
+        return warmup_bars(span_to_alpha(max(EMA_SPANS)), tolerance)
+    if indicator == "ADX":
+        # ADX smooths DX, itself a ratio of smoothed movements
+        return 2 * warmup_bars(span_to_alpha(ADX_PERIOD), tolerance) + 1
+    raise ValueError(f"Unknown indicator: {indicator}")
+
+
+def _tail(values: np.ndarray, bars: int) -> np.ndarray:
+    # Only the last ``bars`` rows of the memory map are read and converted
+    return np.asarray(values[max(0, len(values) - bars):], dtype=np.float64)
+
+
+def trailing_indicators(
+    candles: Dict[str, np.ndarray],
+    indicators: Iterable[str] = ALL_INDICATORS,
+    window: Optional[int] = None,
+    tolerance: float = WARMUP_TOLERANCE
+) -> Dict:
+    """
+    ``compute_indicators`` over a long history, each indicator computed on
+    the trailing bars it needs only. With ``window``, the series of the last
+    ``window`` bars are returned instead of the latest values.
+    """
+    wanted = list(dict.fromkeys(indicators))
+    check_window(window)
+    extra = window - 1 if window else 0
+    needs = {name: bars_needed(name, tolerance) + extra for name in wanted}
+    longest = max(needs.values(), default=0)
+
+    close = _tail(candles["close"], longest)
+    high = _tail(candles["high"], longest)
+    low = _tail(candles["low"], longest)
+    results: Dict = {}
+    for name, bars in needs.items():
+        tail = slice(max(0, len(close) - bars), None)
+        results.update(compute_indicators(
+            close[tail], high[tail], low[tail], [name], full_series=window is not None, window=window
+        ))
+    return results
+
+
+def volatility(close: np.ndarray, chunk_bars: int = CHUNK_BARS) -> float:
+    """
+    ``np.std(close) / np.mean(close)`` of the whole series, in float64
+    chunks of ``chunk_bars`` merged with Chan's parallel variance formula.
+    NaN bars are skipped.
+    """
+    count, mean, m2 = 0, 0.0, 0.0
+    for start in range(0, len(close), chunk_bars):
+        chunk = np.asarray(close[start:start + chunk_bars], dtype=np.float64)
+        chunk = chunk[~np.isnan(chunk)]
+        if not len(chunk):
+            continue
+        chunk_mean = float(chunk.mean())
+        chunk_m2 = float(np.square(chunk - chunk_mean).sum())
+        total = count + len(chunk)
+        delta = chunk_mean - mean
+        mean += delta * len(chunk) / total
+        m2 += chunk_m2 + delta * delta * count * len(chunk) / total
+        count = total
+    if not count or not mean:
+        return float("nan")
+    return math.sqrt(m2 / count) / mean
+
+
+def analyze_candles(candles: Dict[str, np.ndarray], window: Optional[int] = None) -> Dict:
+    """Indicators, trading signals and volatility of a long candle history"""
+    close = candles["close"]
+    if not len(close):
+        return {"status": "no_data", "bars": 0}
+    computed = trailing_indicators(candles, window=window)
+    indicators = latest_values(computed) if window else computed
+    current_price = float(close[-1])
+    results = {
+        "bars": len(close),
+        "first_bar": int(candles["t"][0]),
+        "last_bar": int(candles["t"][-1]),
+        "current_price": current_price,
+        "indicators": indicators,
+        "signals": get_trading_signals(
+            indicators["RSI"], indicators["MACD"], indicators["BB"], indicators["EMA"], current_price
+        ),
+        "volatility": volatility(close),
+        "status": "success"
+    }
+    if window:
+        t = candles["t"]
+        results["series"] = {
+            "timestamps": np.asarray(t[max(0, len(t) - window):]),
+            "indicators": computed
+        }
+    return results
+
+
+async def analyze_token(address: str, chain: str = "ethereum", window: Optional[int] = None,
+                        store: Optional[SeriesStore] = None) -> Dict:
+    """
+    ``analyze_candles`` on the stored history of a token, run on a thread
+    so that the event loop keeps serving other jobs meanwhile.
+    """
+    candles = (store or get_candle_store()).read(chain, _stored_address(address, chain))
+    if candles is None:
+        return {"token_address": address, "chain": chain, "status": "no_data", "bars": 0}
+    result = await asyncio.get_running_loop().run_in_executor(None, analyze_candles, candles, window)
+    return {"token_address": address, "chain": chain, **result}
+
+
+def import_csv(store: SeriesStore, chain: str, address: str, path: str, chunk_bars: int = CHUNK_BARS) -> int:
+    """Append the candles of a CSV file to ``store``, ``chunk_bars`` rows at a time"""
+    names = list(CANDLE_COLUMNS)
+    written = 0
+    with open(path) as f:
+        lines = (line for line in f if line.strip() and line.lstrip()[0].isdigit())  # skips a header
+        while True:
+            block = list(itertools.islice(lines, chunk_bars))
+            if not block:
+                return written
+            rows = np.loadtxt(block, delimiter=",", ndmin=2, usecols=range(len(names)))
+            written += store.append(chain, address, {
+                name: rows[:, i].astype(dtype) for i, (name, dtype) in enumerate(CANDLE_COLUMNS.items())
+            })
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return [None if isinstance(v, float) and not math.isfinite(v) else v for v in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def main(argv):
+    def option(name, default):
+        return type(default)(argv[argv.index(name) + 1]) if name in argv else default
+
+    path = option("--candles-path", CANDLES_PATH)
+    bar_ms = option("--bar-ms", CANDLE_BAR_MS)
+    window = option("--window", 0)
+    positional = []
+    values = iter(argv)
+    for arg in values:
+        if arg in ("--candles-path", "--bar-ms", "--window"):
+            next(values, None)
+        else:
+            positional.append(arg)
+    store = candle_store(path, bar_ms)
+
+    if positional[:1] == ["import"] and len(positional) == 4:
+        _, chain, address, csv_path = positional
+        imported = import_csv(store, chain, _stored_address(address, chain), csv_path)
+        print(json.dumps({"chain": chain, "address": address, "imported": imported}))
+        return 0
+    if len(positional) != 2:
+        print(__doc__)
+        return 2
+
+    chain, address = positional
+    result = asyncio.run(analyze_token(address, chain, window or None, store))
+    print(json.dumps(result, default=_json_default))
+    return 0 if result["status"] == "success" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
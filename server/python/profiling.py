@@ -0,0 +1,174 @@
+"""
+On-demand CPU and allocation profiles of single analyses.
+
+An analysis is profiled when its request asks for it (``?profile=1`` on
+``/analyze``), when ``ANALYZER_PROFILE=1``, or at random for a fraction
+``ANALYZER_PROFILE_SAMPLE_RATE`` of all analyses. It then runs under
+cProfile and tracemalloc, and leaves in ``ANALYZER_PROFILE_DIR``:
+
+- ``<name>.pstats``: the CPU profile (``python3 -m pstats``, snakeviz, ...)
+- ``<name>.alloc.collapsed``: the memory still allocated when the analysis
+  ends, per allocation stack, as ``frame;frame;frame bytes`` lines
+  (flamegraph.pl, speedscope)
+- ``<name>.json``: wall time, traced peak, and the top functions by
+  cumulative time and top allocation sites
+
+Both profilers hook the whole thread, so analyses running at the same time
+on the event loop show up in the profile as well; only one analysis per
+process is profiled at a time, others run as usual. When nothing is
+profiled, the cost is one comparison (one random draw when sampling).
+"""
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "profiles")
+PROFILE_DIR = os.environ.get("ANALYZER_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+
+PROFILE_ALL = os.environ.get("ANALYZER_PROFILE", "").lower() in ("1", "true")
+SAMPLE_RATE = float(os.environ.get("ANALYZER_PROFILE_SAMPLE_RATE", "0"))
+# Functions and allocation sites listed in the summary
+TOP = int(os.environ.get("ANALYZER_PROFILE_TOP", "20"))
+# Stack depth recorded per allocation
+TRACE_FRAMES = int(os.environ.get("ANALYZER_PROFILE_FRAMES", "32"))
+# Profiles kept in PROFILE_DIR, the oldest are deleted
+KEEP = int(os.environ.get("ANALYZER_PROFILE_KEEP", "100"))
+
+REQUESTED = "requested"
+ALWAYS = "always"
+SAMPLED = "sampled"
+
+_active = False
+
+
+def trigger(requested: bool = False) -> Optional[str]:
+    """Why the next analysis should be profiled (REQUESTED, ALWAYS, SAMPLED), None if it should not"""
+    if requested:
+        return REQUESTED
+    if PROFILE_ALL:
+        return ALWAYS
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return SAMPLED
+    return None
+
+
+def _safe(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)[:80]
+
+
+def _top_functions(profiler) -> List[Dict]:
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP]
+    return [{
+        "function": f"{filename}:{line}({name})",
+        "calls": calls,
+        "self_ms": round(self_time * 1000, 3),
+        "cumulative_ms": round(cumulative * 1000, 3)
+    } for (filename, line, name), (_, calls, self_time, cumulative, _) in ranked]
+
+
+def _collapsed(snapshot) -> List[str]:
+    lines = []
+    for stat in snapshot.statistics("traceback"):
+        # Frames run from the oldest to the allocation itself
+        stack = ";".join(f"{os.path.basename(f.filename)}:{f.lineno}".replace(" ", "_") for f in stat.traceback)
+        lines.append(f"{stack} {stat.size}")
+    return lines
+
+
+def _prune(directory: str, keep: int = KEEP):
+    summaries = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".json")),
+        key=os.path.getmtime
+    )
+    for summary in summaries[:max(0, len(summaries) - keep)]:
+        stem = summary[:-len(".json")]
+        for path in (summary, stem + ".pstats", stem + ".alloc.collapsed"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def profiled(name: str, reason: Optional[str], directory: str = PROFILE_DIR):
+    """
+    Profile the block when ``reason`` (see ``trigger``) is set. Yields a
+    dict that holds the profile summary and file paths once the block is
+    done; it stays empty when nothing was profiled.
+    """
+    global _active
+    report: Dict = {}
+    if reason is None:
+        yield report
+        return
+    if _active:
+        if reason == REQUESTED:
+            report.update({"trigger": reason, "skipped": "another analysis is being profiled"})
+        yield report
+        return
+
+    import cProfile
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler (a debugger, an outer cProfile) holds the hook
+        report.update({"trigger": reason, "skipped": str(e)})
+        yield report
+        return
+
+    _active = True
+    own_tracing = not tracemalloc.is_tracing()
+    if own_tracing:
+        tracemalloc.start(TRACE_FRAMES)
+    traced_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        if own_tracing:
+            tracemalloc.stop()
+        _active = False
+
+        summary = {
+            "trigger": reason,
+            "name": name,
+            "wall_ms": round(wall * 1000, 3),
+            "traced_peak_kib": round(max(0, peak - traced_before) / 1024, 1),
+            "traced_end_kib": round(max(0, current - traced_before) / 1024, 1),
+            "top_functions": _top_functions(profiler),
+            "top_allocations": [{
+                "site": f"{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}",
+                "size_kib": round(stat.size / 1024, 1),
+                "count": stat.count
+            } for stat in snapshot.statistics("lineno")[:TOP]]
+        }
+        stem = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-"
+                                       f"{int(time.time() * 1000) % 1000:03d}-{_safe(name)}")
+        files = {"pstats": stem + ".pstats", "collapsed": stem + ".alloc.collapsed", "summary": stem + ".json"}
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(files["pstats"])
+            with open(files["collapsed"], "w") as f:
+                f.write("\n".join(_collapsed(snapshot)) + "\n")
+            with open(files["summary"], "w") as f:
+                json.dump(summary, f, indent=1)
+            _prune(directory)
+            summary["files"] = files
+        except OSError as e:
+            summary["error"] = f"Could not write the profile: {e}"
+        report.update(summary)
@@ -0,0 +1,79 @@
+"""
+Framed messages from the analysis workers to the Node server.
+
+Each message is one frame: a 5-byte header (payload length as a big-endian
+uint32, then a flags byte) followed by the payload.
+
+- Plain payloads are UTF-8 JSON. Non-finite numbers, which JSON cannot
+  represent, are written as ``{"$num": "NaN" | "Infinity" | "-Infinity"}``
+  and ``FLAG_TAGGED`` is set, so the reader only revives them when needed.
+- With ``FLAG_BINARY``, the payload is a uint32 JSON length, the JSON head,
+  zero padding to a multiple of 8 bytes, then the raw little-endian float64
+  data of the large arrays. The head refers to each array as
+  ``{"$f64": [byte_offset, count]}`` relative to the start of that data.
+
+See ``server/protocol.js`` for the reader.
+"""
+import json
+import math
+import struct
+from typing import Any, List
+
+import numpy as np
+
+HEADER = struct.Struct(">IB")
+FLAG_BINARY = 1
+FLAG_TAGGED = 2
+
+# Smaller arrays are cheaper to inline in the JSON head
+BINARY_MIN_VALUES = 64
+
+
+class _Converter:
+    def __init__(self, binary: bool):
+        self.binary = binary
+        self.tagged = False
+        self.arrays: List[np.ndarray] = []
+        self.size = 0
+
+    def __call__(self, obj: Any) -> Any:
+        if isinstance(obj, float):
+            if math.isfinite(obj):
+                return obj
+            self.tagged = True
+            return {"$num": "NaN" if obj != obj else ("Infinity" if obj > 0 else "-Infinity")}
+        if isinstance(obj, dict):
+            return {k: self(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [self(v) for v in obj]
+        if isinstance(obj, np.ndarray):
+            if (self.binary and obj.ndim == 1 and obj.size >= BINARY_MIN_VALUES
+                    and obj.dtype.kind in "fiu"):
+                data = np.ascontiguousarray(obj, dtype="<f8")
+                ref = {"$f64": [self.size, int(data.size)]}
+                self.arrays.append(data)
+                self.size += data.nbytes
+                return ref
+            return self(obj.tolist())
+        if isinstance(obj, np.generic):
+            return self(obj.item())
+        return obj
+
+
+def encode_frame(message: Any, binary: bool = False) -> bytes:
+    """
+    Encode one message as a frame. With ``binary``, 1-D numeric NumPy
+    arrays of at least ``BINARY_MIN_VALUES`` values (full indicator series)
+    travel as raw float64 instead of JSON text.
+    """
+    convert = _Converter(binary)
+    head = json.dumps(convert(message), allow_nan=False, separators=(",", ":")).encode("utf-8")
+    flags = FLAG_TAGGED if convert.tagged else 0
+    if not convert.arrays:
+        return HEADER.pack(len(head), flags) + head
+
+    flags |= FLAG_BINARY
+    padding = b"\0" * (-(4 + len(head)) % 8)
+    parts = [struct.pack(">I", len(head)), head, padding] + [a.tobytes() for a in convert.arrays]
+    length = sum(len(p) for p in parts)
+    return HEADER.pack(length, flags) + b"".join(parts)
@@ -0,0 +1,204 @@
+"""Per-host rate limiting of upstream calls, with priorities"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+# Priority classes: lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Priority of the upstream calls made from the current task; asyncio tasks
+# inherit it from the task that created them
+current_priority: contextvars.ContextVar = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+# Requests per minute and burst size per host; other hosts are not limited.
+# CoinGecko's free tier allows about 30 calls per minute.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "api.coingecko.com": (30, 5),
+    "coins.llama.fi": (600, 20),
+}
+
+# Workers of one pool share the quota; the pool sets this to 1 / pool size
+RATE_SHARE = float(os.environ.get("UPSTREAM_RATE_SHARE", "1"))
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse ``host=per_minute[:burst],...`` (``UPSTREAM_RATE_LIMITS``)"""
+    limits = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, rate = item.partition("=")
+        per_minute, _, burst = rate.partition(":")
+        per_minute = float(per_minute)
+        limits[host.strip()] = (per_minute, float(burst) if burst else max(1.0, per_minute / 60))
+    return limits
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delay in seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+@contextmanager
+def priority(level: int):
+    """Run the upstream calls made inside the block at the given priority"""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class HostLimiter:
+    """
+    Token bucket for one host, with a priority queue of waiting calls.
+
+    Calls take a token immediately while the bucket has some and nobody is
+    waiting; otherwise they queue and a dispatcher hands out tokens as they
+    refill, lowest priority value first, then in arrival order. ``pause``
+    empties the bucket and blocks the host until a deadline (``Retry-After``).
+    """
+
+    def __init__(self, per_minute: float, burst: float):
+        self.rate = max(per_minute, 1e-6) / 60.0
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counts = {"granted": 0, "queued": 0, "paused": 0}
+
+    def stats(self) -> Dict[str, int]:
+        """Calls granted, queued and pauses so far, plus the calls waiting now"""
+        waiting = sum(1 for _, _, future in self._waiters if not future.done())
+        return dict(self.counts, waiting=waiting)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _delay(self, now: float) -> float:
+        """Seconds until a token can be handed out"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.counts["paused"] += 1
+
+    async def acquire(self, level: int = INTERACTIVE) -> float:
+        """Wait for a token and return the time spent waiting"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. successive asyncio.run calls): drop waiters of the old one
+            self._loop = loop
+            self._waiters = []
+            self._dispatcher = None
+
+        start = time.monotonic()
+        if not self._waiters and self._delay(start) == 0:
+            self.tokens -= 1
+            self.counts["granted"] += 1
+            return 0.0
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), future))
+        self.counts["queued"] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+        return time.monotonic() - start
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Waiters cancelled while queued give their turn up
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+            delay = self._delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.tokens -= 1
+            self.counts["granted"] += 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+
+class RateLimiter:
+    """One ``HostLimiter`` per rate-limited upstream host"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None, share: float = RATE_SHARE):
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        self.limits.update(limits or {})
+        self.share = share
+        self.hosts: Dict[str, HostLimiter] = {}
+
+    def host(self, host: str) -> Optional[HostLimiter]:
+        limiter = self.hosts.get(host)
+        if limiter is None and host in self.limits:
+            per_minute, burst = self.limits[host]
+            limiter = HostLimiter(per_minute * self.share, max(1.0, burst * self.share))
+            self.hosts[host] = limiter
+        return limiter
+
+    async def acquire(self, host: str, level: Optional[int] = None) -> float:
+        """Wait for the host's limiter at the current priority; returns the time spent waiting"""
+        limiter = self.host(host)
+        if limiter is None:
+            return 0.0
+        return await limiter.acquire(current_priority.get() if level is None else level)
+
+    def pause(self, host: str, seconds: float):
+        limiter = self.host(host)
+        if limiter is not None:
+            limiter.pause(seconds)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {host: limiter.stats() for host, limiter in self.hosts.items()}
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(parse_rate_limits(os.environ.get("UPSTREAM_RATE_LIMITS", "")))
+    return _limiter
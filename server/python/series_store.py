@@ -0,0 +1,176 @@
+"""Append-only columnar store of per-token daily market series"""
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from singleflight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+DEFAULT_SERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "series")
+SERIES_PATH = os.environ.get("ANALYZER_SERIES_PATH", DEFAULT_SERIES_PATH)
+
+BAR_MS = 86_400_000
+# Depth of the first download of a token's history
+HISTORY_DAYS = 200
+
+# One raw little-endian file per column
+COLUMNS = {
+    "t": np.dtype("<i8"),          # bar timestamp, ms since epoch
+    "price": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+    "market_cap": np.dtype("<f8"),
+}
+
+
+def market_chart_columns(data: Dict) -> Dict[str, np.ndarray]:
+    """Columns of a CoinGecko ``market_chart`` answer, rows without a price dropped"""
+    prices = [p for p in data.get("prices") or [] if p and p[1] is not None]
+    volumes = {int(t): v for t, v in data.get("total_volumes") or [] if v is not None}
+    market_caps = {int(t): v for t, v in data.get("market_caps") or [] if v is not None}
+    t = np.array([int(p[0]) for p in prices], dtype=COLUMNS["t"])
+    return {
+        "t": t,
+        "price": np.array([float(p[1]) for p in prices], dtype=COLUMNS["price"]),
+        "volume": np.array([volumes.get(ts, math.nan) for ts in t.tolist()], dtype=COLUMNS["volume"]),
+        "market_cap": np.array([market_caps.get(ts, math.nan) for ts in t.tolist()], dtype=COLUMNS["market_cap"]),
+    }
+
+
+class SeriesStore:
+    """
+    Daily price, volume and market cap series, one directory per
+    ``(chain, address)`` holding one file per column.
+
+    Complete bars (timestamps on a day boundary) are only ever appended.
+    The last row may be provisional: the live point CoinGecko adds after the
+    last daily bar. It is overwritten in place by the next append, so files
+    never shrink and arrays mapped earlier stay valid. ``read`` returns
+    read-only ``np.memmap`` views, without copying.
+
+    Writers of all worker processes are serialized by a lock file per
+    series. With ``path=None`` nothing is stored. ``columns`` and
+    ``bar_ms`` describe other layouts, such as the float32 intraday
+    candles of ``long_history.py``.
+    """
+
+    def __init__(self, path: Optional[str] = SERIES_PATH, columns: Optional[Dict[str, np.dtype]] = None,
+                 bar_ms: int = BAR_MS):
+        self.path = path or None
+        self.columns = COLUMNS if columns is None else {name: np.dtype(d) for name, d in columns.items()}
+        self.bar_ms = bar_ms
+        # Concurrent syncs of the same series share one upstream call
+        self.flights = SingleFlight()
+
+    def _dir(self, chain: str, address: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in address)
+        return os.path.join(self.path, chain, safe)
+
+    def _rows(self, directory: str) -> int:
+        # Columns are written one after the other: a crash may leave some longer
+        sizes = []
+        for name, dtype in self.columns.items():
+            try:
+                sizes.append(os.path.getsize(os.path.join(directory, name)) // dtype.itemsize)
+            except OSError:
+                return 0
+        return min(sizes)
+
+    def read(self, chain: str, address: str) -> Optional[Dict[str, np.ndarray]]:
+        """Memory-mapped columns of a series, or None if nothing is stored"""
+        if self.path is None:
+            return None
+        directory = self._dir(chain, address)
+        rows = self._rows(directory)
+        if rows == 0:
+            return None
+        return {
+            name: np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=(rows,))
+            for name, dtype in self.columns.items()
+        }
+
+    def tokens(self) -> List[Tuple[str, str]]:
+        """``(chain, address)`` of every stored series, addresses as sanitized on disk"""
+        if self.path is None or not os.path.isdir(self.path):
+            return []
+        found = []
+        for chain in sorted(os.listdir(self.path)):
+            chain_dir = os.path.join(self.path, chain)
+            if os.path.isdir(chain_dir):
+                found.extend((chain, address) for address in sorted(os.listdir(chain_dir))
+                             if self._rows(os.path.join(chain_dir, address)))
+        return found
+
+    @contextmanager
+    def _locked(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, chain: str, address: str, columns: Dict[str, np.ndarray]) -> int:
+        """
+        Merge freshly fetched rows (sorted by time) into a series: rows after
+        the last complete stored bar replace the provisional row, if any,
+        and are appended. Returns the number of rows written.
+        """
+        if self.path is None or len(columns["t"]) == 0:
+            return 0
+        directory = self._dir(chain, address)
+        with self._locked(directory):
+            rows = self._rows(directory)
+            start = rows
+            if rows:
+                t = np.memmap(os.path.join(directory, "t"), dtype=self.columns["t"], mode="r", shape=(rows,))
+                if t[-1] % self.bar_ms:
+                    start = rows - 1
+                last_complete = int(t[start - 1]) if start else None
+                del t
+                if last_complete is not None:
+                    keep = columns["t"] > last_complete
+                    columns = {name: values[keep] for name, values in columns.items()}
+
+            count = len(columns["t"])
+            if count == 0:
+                return 0
+            for name, dtype in self.columns.items():
+                file_path = os.path.join(directory, name)
+                with open(file_path, "r+b" if os.path.exists(file_path) else "w+b") as f:
+                    f.seek(start * dtype.itemsize)
+                    f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+            return count
+
+    @staticmethod
+    def days_to_fetch(stored: Optional[Dict[str, np.ndarray]], now_ms: Optional[int] = None) -> int:
+        """Days of history to request so that a stored series ends up complete"""
+        if stored is None:
+            return HISTORY_DAYS
+        t = stored["t"]
+        last_complete = int(t[-2] if t[-1] % BAR_MS and len(t) > 1 else t[-1])
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        # CoinGecko returns daily bars from ``now - days``: one more covers the boundary
+        days = math.ceil((now_ms - last_complete) / BAR_MS) + 1
+        return max(2, min(HISTORY_DAYS, days))
+
+
+_store: Optional[SeriesStore] = None
+
+
+def get_store() -> SeriesStore:
+    """Return the process-wide series store"""
+    global _store
+    if _store is None:
+        _store = SeriesStore()
+    return _store
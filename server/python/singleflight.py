@@ -0,0 +1,41 @@
+"""Coalescing of concurrent identical calls (single-flight)"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    Callers arriving while a call for the same key is in flight wait for it
+    and get its result (or its exception) instead of starting their own.
+    The shared call is shielded: a cancelled waiter does not cancel it for
+    the others. ``stats`` counts every call and the coalesced ones.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+
+        def forget(done):
+            if self._calls.get(key) is done:
+                del self._calls[key]
+            # Retrieve the outcome even when every waiter was cancelled
+            if not done.cancelled():
+                done.exception()
+
+        future.add_done_callback(forget)
+        return await asyncio.shield(future)
@@ -0,0 +1,489 @@
+"""
+Incremental indicator states.
+
+Each state is seeded once from a price history, then advanced one candle at
+a time with ``update(high, low, close)`` in O(1) and exposes the same value
+as the matching ``calculate_*`` function would on the whole history. States
+round-trip through ``to_dict``/``from_dict`` (plain JSON types) so they can
+be persisted between runs.
+"""
+import math
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+from indicator_engine import (
+    ADX_PERIOD,
+    BB_PERIOD,
+    BB_STD_DEV,
+    EMA_SPANS,
+    MACD_FAST,
+    MACD_SIGNAL,
+    MACD_SLOW,
+    RSI_PERIOD,
+)
+from kernels import ewm_mean, span_to_alpha
+
+# Sliding Welford updates drift slowly; recompute the window moments this often
+_BB_RESYNC_EVERY = 1024
+
+
+def _float(value) -> float:
+    # Accept the "NaN"/"Infinity" strings produced by the JSON protocol
+    return float(value)
+
+
+class EWMState:
+    """
+    One exponentially weighted mean, following pandas' ``ewm().mean()``
+    recursion exactly (including its handling of NaN inputs).
+    """
+
+    def __init__(self, alpha: float, adjust: bool = False):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.weighted = math.nan
+        self.old_wt = 1.0
+        self.started = False
+
+    def _step(self, weighted: float, old_wt: float, started: bool, x: float):
+        is_obs = x == x
+        if not started:
+            return (x, 1.0, True) if is_obs else (weighted, old_wt, False)
+        if weighted == weighted:
+            new_wt = 1.0 if self.adjust else self.alpha
+            old_wt *= 1.0 - self.alpha
+            if is_obs:
+                if weighted != x:
+                    weighted = (old_wt * weighted + new_wt * x) / (old_wt + new_wt)
+                old_wt = old_wt + new_wt if self.adjust else 1.0
+        elif is_obs:
+            weighted = x
+        return weighted, old_wt, True
+
+    def update(self, x: float) -> float:
+        self.weighted, self.old_wt, self.started = self._step(self.weighted, self.old_wt, self.started, x)
+        return self.weighted
+
+    def peek(self, x: float) -> float:
+        """Value after a hypothetical update, without changing the state"""
+        return self._step(self.weighted, self.old_wt, self.started, x)[0]
+
+    def seed(self, values: np.ndarray, smoothed: Optional[np.ndarray] = None) -> "EWMState":
+        """
+        Replay a history. ``smoothed`` may carry the already computed
+        ``ewm_mean`` of ``values`` to avoid smoothing them twice.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(values)
+        if len(values) == 0 or nan.all():
+            return self
+        start = int(np.argmax(~nan))
+        if nan[start:].any():
+            # Interior NaN: replay the exact recursion
+            for x in values:
+                self.update(float(x))
+            return self
+
+        if smoothed is None:
+            smoothed = ewm_mean(values[start:], self.alpha, adjust=self.adjust)
+        observed = len(values) - start
+        w = 1.0 - self.alpha
+        self.weighted = float(smoothed[-1])
+        self.old_wt = (1 - w ** observed) / (1 - w) if self.adjust and w < 1 else 1.0
+        self.started = True
+        return self
+
+    def to_dict(self) -> Dict:
+        return {"alpha": self.alpha, "adjust": self.adjust, "weighted": self.weighted,
+                "old_wt": self.old_wt, "started": self.started}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "EWMState":
+        state = cls(_float(data["alpha"]), bool(data["adjust"]))
+        state.weighted = _float(data["weighted"])
+        state.old_wt = _float(data["old_wt"])
+        state.started = bool(data["started"])
+        return state
+
+
+class RSIState:
+    """RSI with Wilder smoothing (alpha = 1/period), as in calculate_rsi"""
+
+    def __init__(self, period: int = RSI_PERIOD):
+        self.period = period
+        self.gains = EWMState(1.0 / period, adjust=True)
+        self.losses = EWMState(1.0 / period, adjust=True)
+        self.count = 0
+        self.last_close = math.nan
+        self.last_delta = math.nan
+        self.any_gain = False
+        self.any_loss = False
+
+    @classmethod
+    def from_history(cls, close: np.ndarray, period: int = RSI_PERIOD) -> "RSIState":
+        state = cls(period)
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) == 0:
+            return state
+        delta = np.diff(close)
+        state.gains.seed(np.where(delta > 0, delta, 0.0))
+        state.losses.seed(np.where(delta < 0, -delta, 0.0))
+        state.count = len(close)
+        state.last_close = float(close[-1])
+        state.last_delta = float(delta[-1]) if len(delta) else math.nan
+        state.any_gain = bool((delta > 0).any())
+        state.any_loss = bool((delta < 0).any())
+        return state
+
+    def update(self, high: float, low: float, close: float) -> float:
+        close = float(close)
+        if self.count > 0:
+            delta = close - self.last_close
+            self.gains.update(delta if delta > 0 else 0.0)
+            self.losses.update(-delta if delta < 0 else 0.0)
+            self.last_delta = delta
+            self.any_gain = self.any_gain or delta > 0
+            self.any_loss = self.any_loss or delta < 0
+        self.last_close = close
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.count < self.period + 1 or not (self.any_gain or self.any_loss):
+            return 50.0
+        if not self.any_loss:
+            return 100.0
+        if not self.any_gain:
+            return 0.0
+        # calculate_rsi counts the last change twice
+        d = self.last_delta
+        avg_gain = self.gains.peek(d if d > 0 else 0.0)
+        avg_loss = self.losses.peek(-d if d < 0 else 0.0)
+        rs = avg_gain / max(avg_loss, 0.0001)
+        return float(100 - (100 / (1 + rs)))
+
+    def to_dict(self) -> Dict:
+        return {"type": "rsi", "period": self.period, "gains": self.gains.to_dict(),
+                "losses": self.losses.to_dict(), "count": self.count,
+                "last_close": self.last_close, "last_delta": self.last_delta,
+                "any_gain": self.any_gain, "any_loss": self.any_loss}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RSIState":
+        state = cls(int(data["period"]))
+        state.gains = EWMState.from_dict(data["gains"])
+        state.losses = EWMState.from_dict(data["losses"])
+        state.count = int(data["count"])
+        state.last_close = _float(data["last_close"])
+        state.last_delta = _float(data["last_delta"])
+        state.any_gain = bool(data["any_gain"])
+        state.any_loss = bool(data["any_loss"])
+        return state
+
+
+class EMAState:
+    """EMA20/EMA50/EMA200 (or any spans), as in calculate_ema_signals"""
+
+    def __init__(self, spans=EMA_SPANS):
+        self.spans = tuple(int(s) for s in spans)
+        self.emas = [EWMState(span_to_alpha(s)) for s in self.spans]
+
+    @classmethod
+    def from_history(cls, close: np.ndarray, spans=EMA_SPANS) -> "EMAState":
+        state = cls(spans)
+        for ema in state.emas:
+            ema.seed(close)
+        return state
+
+    def update(self, high: float, low: float, close: float) -> Dict[str, float]:
+        for ema in self.emas:
+            ema.update(close)
+        return self.value
+
+    @property
+    def value(self) -> Dict[str, float]:
+        return {f"EMA{s}": float(e.weighted) for s, e in zip(self.spans, self.emas)}
+
+    def to_dict(self) -> Dict:
+        return {"type": "ema", "spans": list(self.spans), "emas": [e.to_dict() for e in self.emas]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "EMAState":
+        state = cls(data["spans"])
+        state.emas = [EWMState.from_dict(e) for e in data["emas"]]
+        return state
+
+
+class MACDState:
+    """MACD line, signal and histogram, as in calculate_macd"""
+
+    def __init__(self, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL):
+        self.periods = (fast, slow, signal)
+        self.fast = EWMState(span_to_alpha(fast))
+        self.slow = EWMState(span_to_alpha(slow))
+        self.signal = EWMState(span_to_alpha(signal))
+
+    @classmethod
+    def from_history(cls, close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW,
+                     signal: int = MACD_SIGNAL) -> "MACDState":
+        state = cls(fast, slow, signal)
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) == 0:
+            return state
+        fast_ema, slow_ema = ewm_mean(close, np.array([span_to_alpha(fast), span_to_alpha(slow)]))
+        state.fast.seed(close, fast_ema)
+        state.slow.seed(close, slow_ema)
+        state.signal.seed(fast_ema - slow_ema)
+        return state
+
+    def update(self, high: float, low: float, close: float) -> Dict[str, float]:
+        line = self.fast.update(close) - self.slow.update(close)
+        self.signal.update(line)
+        return self.value
+
+    @property
+    def value(self) -> Dict[str, float]:
+        line = self.fast.weighted - self.slow.weighted
+        signal = self.signal.weighted
+        return {"macd": float(line), "signal": float(signal), "hist": float(line - signal)}
+
+    def to_dict(self) -> Dict:
+        return {"type": "macd", "periods": list(self.periods), "fast": self.fast.to_dict(),
+                "slow": self.slow.to_dict(), "signal": self.signal.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MACDState":
+        state = cls(*data["periods"])
+        state.fast = EWMState.from_dict(data["fast"])
+        state.slow = EWMState.from_dict(data["slow"])
+        state.signal = EWMState.from_dict(data["signal"])
+        return state
+
+
+class BollingerState:
+    """Bollinger Bands over a sliding window with Welford mean/variance updates"""
+
+    def __init__(self, period: int = BB_PERIOD, std_dev: float = BB_STD_DEV):
+        self.period = period
+        self.std_dev = std_dev
+        self.window: deque = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    @classmethod
+    def from_history(cls, close: np.ndarray, period: int = BB_PERIOD,
+                     std_dev: float = BB_STD_DEV) -> "BollingerState":
+        state = cls(period, std_dev)
+        state.window.extend(float(x) for x in np.asarray(close, dtype=np.float64)[-period:])
+        state._resync()
+        return state
+
+    def _resync(self):
+        values = np.fromiter(self.window, dtype=np.float64, count=len(self.window))
+        self.mean = float(values.mean()) if len(values) else 0.0
+        self.m2 = float(((values - self.mean) ** 2).sum()) if len(values) else 0.0
+        self.updates = 0
+
+    def update(self, high: float, low: float, close: float) -> Dict[str, float]:
+        close = float(close)
+        if len(self.window) < self.period:
+            self.window.append(close)
+            delta = close - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (close - self.mean)
+        else:
+            old = self.window.popleft()
+            self.window.append(close)
+            old_mean = self.mean
+            self.mean += (close - old) / self.period
+            self.m2 += (close - old) * (close - self.mean + old - old_mean)
+        self.updates += 1
+        if self.updates >= _BB_RESYNC_EVERY:
+            self._resync()
+        return self.value
+
+    @property
+    def value(self) -> Dict[str, float]:
+        if len(self.window) < self.period:
+            return {"upper": math.nan, "middle": math.nan, "lower": math.nan}
+        std = math.sqrt(max(self.m2, 0.0) / (self.period - 1))
+        return {
+            "upper": self.mean + std * self.std_dev,
+            "middle": self.mean,
+            "lower": self.mean - std * self.std_dev
+        }
+
+    def to_dict(self) -> Dict:
+        return {"type": "bb", "period": self.period, "std_dev": self.std_dev,
+                "window": list(self.window), "mean": self.mean, "m2": self.m2,
+                "updates": self.updates}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BollingerState":
+        state = cls(int(data["period"]), _float(data["std_dev"]))
+        state.window.extend(_float(x) for x in data["window"])
+        state.mean = _float(data["mean"])
+        state.m2 = _float(data["m2"])
+        state.updates = int(data["updates"])
+        return state
+
+
+class ADXState:
+    """ADX with its ATR/+DM/-DM/DX smoothing state, as in calculate_adx"""
+
+    def __init__(self, period: int = ADX_PERIOD):
+        self.period = period
+        alpha = span_to_alpha(period)
+        self.atr = EWMState(alpha)
+        self.pos_dm = EWMState(alpha)
+        self.neg_dm = EWMState(alpha)
+        self.adx = EWMState(alpha)
+        self.count = 0
+        self.prev = (math.nan, math.nan, math.nan)
+
+    @classmethod
+    def from_history(cls, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                     period: int = ADX_PERIOD) -> "ADXState":
+        state = cls(period)
+        high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+        n = len(close)
+        if n == 0:
+            return state
+        state.count = n
+        state.prev = (float(high[-1]), float(low[-1]), float(close[-1]))
+        if n < 2:
+            return state
+
+        prev_close = close[:-1]
+        tr = np.maximum.reduce([np.abs(high[1:] - low[1:]), np.abs(high[1:] - prev_close),
+                                np.abs(low[1:] - prev_close)])
+        high_diff = high[1:] - high[:-1]
+        low_diff = low[:-1] - low[1:]
+        pos_dm = np.where((high_diff > low_diff) & (high_diff > 0), high_diff, 0.0)
+        neg_dm = np.where((low_diff > high_diff) & (low_diff > 0), low_diff, 0.0)
+        # The first movement is counted twice, as calculate_adx does
+        tr, pos_dm, neg_dm = (np.insert(a, 0, a[0]) for a in (tr, pos_dm, neg_dm))
+
+        alpha = span_to_alpha(period)
+        atr_s, pos_s, neg_s = ewm_mean(np.vstack([tr, pos_dm, neg_dm]), alpha)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pos_di = 100 * pos_s / atr_s
+            neg_di = 100 * neg_s / atr_s
+            dx = 100 * np.abs(pos_di - neg_di) / (pos_di + neg_di)
+        state.atr.seed(tr, atr_s)
+        state.pos_dm.seed(pos_dm, pos_s)
+        state.neg_dm.seed(neg_dm, neg_s)
+        state.adx.seed(dx)
+        return state
+
+    def _advance(self, tr: float, pos_dm: float, neg_dm: float):
+        atr = self.atr.update(tr)
+        pos = self.pos_dm.update(pos_dm)
+        neg = self.neg_dm.update(neg_dm)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pos_di = np.float64(100 * pos) / atr
+            neg_di = np.float64(100 * neg) / atr
+            dx = 100 * abs(pos_di - neg_di) / (pos_di + neg_di)
+        self.adx.update(float(dx))
+
+    def update(self, high: float, low: float, close: float) -> float:
+        high, low, close = float(high), float(low), float(close)
+        if self.count > 0:
+            prev_high, prev_low, prev_close = self.prev
+            tr = max(abs(high - low), abs(high - prev_close), abs(low - prev_close))
+            high_diff = high - prev_high
+            low_diff = prev_low - low
+            pos_dm = high_diff if (high_diff > low_diff and high_diff > 0) else 0.0
+            neg_dm = low_diff if (low_diff > high_diff and low_diff > 0) else 0.0
+            if self.count == 1:
+                self._advance(tr, pos_dm, neg_dm)
+            self._advance(tr, pos_dm, neg_dm)
+        self.prev = (high, low, close)
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.count < self.period + 1:
+            return 0.0
+        return float(self.adx.weighted)
+
+    def to_dict(self) -> Dict:
+        return {"type": "adx", "period": self.period, "atr": self.atr.to_dict(),
+                "pos_dm": self.pos_dm.to_dict(), "neg_dm": self.neg_dm.to_dict(),
+                "adx": self.adx.to_dict(), "count": self.count, "prev": list(self.prev)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ADXState":
+        state = cls(int(data["period"]))
+        state.atr = EWMState.from_dict(data["atr"])
+        state.pos_dm = EWMState.from_dict(data["pos_dm"])
+        state.neg_dm = EWMState.from_dict(data["neg_dm"])
+        state.adx = EWMState.from_dict(data["adx"])
+        state.count = int(data["count"])
+        state.prev = tuple(_float(x) for x in data["prev"])
+        return state
+
+
+class IndicatorState:
+    """
+    All streaming indicators of one token. ``value`` has the same shape as
+    ``compute_indicators`` (the ``indicators`` section of an analysis).
+    """
+
+    def __init__(self, rsi: RSIState, macd: MACDState, bb: BollingerState, ema: EMAState,
+                 adx: ADXState, last_close: Optional[float] = None):
+        self.rsi = rsi
+        self.macd = macd
+        self.bb = bb
+        self.ema = ema
+        self.adx = adx
+        self.last_close = last_close
+
+    @classmethod
+    def from_history(cls, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> "IndicatorState":
+        close = np.asarray(close, dtype=np.float64)
+        return cls(
+            RSIState.from_history(close),
+            MACDState.from_history(close),
+            BollingerState.from_history(close),
+            EMAState.from_history(close),
+            ADXState.from_history(high, low, close),
+            float(close[-1]) if len(close) else None
+        )
+
+    def update(self, high: float, low: float, close: float) -> Dict:
+        high, low, close = float(high), float(low), float(close)
+        for state in (self.rsi, self.macd, self.bb, self.ema, self.adx):
+            state.update(high, low, close)
+        self.last_close = close
+        return self.value
+
+    @property
+    def value(self) -> Dict:
+        return {
+            "RSI": self.rsi.value,
+            "MACD": self.macd.value,
+            "BB": self.bb.value,
+            "EMA": self.ema.value,
+            "ADX": self.adx.value
+        }
+
+    def to_dict(self) -> Dict:
+        return {"rsi": self.rsi.to_dict(), "macd": self.macd.to_dict(), "bb": self.bb.to_dict(),
+                "ema": self.ema.to_dict(), "adx": self.adx.to_dict(), "last_close": self.last_close}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndicatorState":
+        return cls(
+            RSIState.from_dict(data["rsi"]),
+            MACDState.from_dict(data["macd"]),
+            BollingerState.from_dict(data["bb"]),
+            EMAState.from_dict(data["ema"]),
+            ADXState.from_dict(data["adx"]),
+            None if data.get("last_close") is None else _float(data["last_close"])
+        )
@@ -0,0 +1,5 @@
+"""The analyzer modules are flat: import them from server/python"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
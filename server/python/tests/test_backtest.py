@@ -0,0 +1,122 @@
+"""The vectorized backtest against a plain bar-by-bar reference"""
+import math
+
+import numpy as np
+import pytest
+
+from backtest import (
+    LONG_ENTRY, LONG_EXIT, SHORT_ENTRY, SHORT_EXIT, run_backtest, signal_recommendations, target_positions
+)
+from cross_section import RECOMMENDATIONS
+from indicator_engine import compute_indicators
+from indicators import get_trading_signals
+
+COST = 0.001 + 0.0005
+
+
+def _walk(rows=6, bars=300, seed=11):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.04, (rows, bars)), axis=1))
+
+
+def _reference_positions(recommendations, allow_short):
+    """Position at the close of each bar, one bar at a time"""
+    positions, position = [], 0
+    for name in (RECOMMENDATIONS[r] for r in recommendations):
+        if allow_short and name in SHORT_ENTRY:
+            position = -1
+        elif name in LONG_ENTRY:
+            position = 1
+        elif position == 1 and name in LONG_EXIT:
+            position = 0
+        elif position == -1 and name in SHORT_EXIT:
+            position = 0
+        positions.append(position)
+    return positions
+
+
+def _reference_backtest(close, allow_short):
+    """The statistics of run_backtest for one token, with explicit trades"""
+    target = _reference_positions(signal_recommendations(close), allow_short)
+    equity, peak, max_drawdown = 1.0, 1.0, 0.0
+    turnover = exposure = 0.0
+    trades, trade = [], None
+    held_before = 0
+    for t in range(len(close)):
+        held = target[t - 1] if t else 0
+        change = abs(held - held_before)
+        gross = held * (close[t] / close[t - 1] - 1) if t else 0.0
+        equity *= 1 + gross - COST * change
+        peak = max(peak, equity)
+        max_drawdown = min(max_drawdown, equity / peak - 1)
+        turnover += change
+        exposure += held != 0
+
+        entry = 0.0
+        if held != held_before:
+            if trade is not None:
+                trade["growth"] *= 1 - COST  # exit
+                trades.append(dict(trade, closed=True))
+                trade = None
+            if held:
+                # The entry cost is paid out of the first bar's return, as in the equity curve
+                trade, entry = {"growth": 1.0}, COST
+        if trade is not None:
+            trade["growth"] *= 1 + gross - entry
+        held_before = held
+    if trade is not None:
+        trades.append(dict(trade, closed=False))
+
+    closed = [tr for tr in trades if tr["closed"]]
+    return {
+        "total_return": equity - 1,
+        "max_drawdown": max_drawdown,
+        "trades": len(trades),
+        "closed_trades": len(closed),
+        "hit_rate": sum(tr["growth"] > 1 for tr in closed) / len(closed) if closed else math.nan,
+        "turnover": turnover,
+        "exposure": exposure / len(close),
+        "costs": COST * turnover,
+        "buy_and_hold_return": close[-1] / close[0] - 1,
+    }
+
+
+def test_signal_recommendations_match_get_trading_signals():
+    close = _walk(rows=2, bars=120)
+    recommendations = signal_recommendations(close)
+    for row, prices in enumerate(close):
+        for t in range(1, prices.shape[0]):
+            history = prices[:t + 1]
+            indicators = compute_indicators(history, indicators=("RSI", "MACD", "BB", "EMA"))
+            signals = get_trading_signals(indicators["RSI"], indicators["MACD"], indicators["BB"],
+                                          indicators["EMA"], history[-1])
+            assert RECOMMENDATIONS[recommendations[row, t]] == signals["recommendation"], f"row {row}, bar {t}"
+
+
+@pytest.mark.parametrize("allow_short", [False, True])
+def test_target_positions_match_the_state_machine(allow_short):
+    rng = np.random.default_rng(2)
+    recommendations = rng.integers(0, len(RECOMMENDATIONS), (20, 200)).astype(np.int8)
+    positions = target_positions(recommendations, allow_short)
+    for row, recs in enumerate(recommendations):
+        assert positions[row].tolist() == _reference_positions(recs, allow_short), f"row {row}"
+
+
+@pytest.mark.parametrize("allow_short", [False, True])
+def test_backtest_matches_the_reference(allow_short):
+    close = _walk()
+    results = run_backtest(close, allow_short=allow_short, chunk_rows=4)
+    assert results["trades"].sum() > 0
+    for row, prices in enumerate(close):
+        for key, value in _reference_backtest(prices, allow_short).items():
+            assert results[key][row] == pytest.approx(value, rel=1e-9, abs=1e-12, nan_ok=True), f"row {row}: {key}"
+
+
+def test_blocks_do_not_change_the_results():
+    close = _walk(rows=9)
+    whole = run_backtest(close, allow_short=True, chunk_rows=None)
+    blocked = run_backtest(close, allow_short=True, chunk_rows=2)
+    single = run_backtest(close[3], allow_short=True)
+    for key, values in whole.items():
+        np.testing.assert_allclose(blocked[key], values, rtol=1e-12, equal_nan=True)
+        np.testing.assert_allclose(single[key], values[3], rtol=1e-12, equal_nan=True)
@@ -0,0 +1,51 @@
+"""Batch token lists and analyze_batch against a stub analysis"""
+import asyncio
+
+import analyzer
+from analyzer import analyze_batch, parse_batch_tokens
+from rate_limiter import BACKGROUND, INTERACTIVE, current_priority
+
+
+def test_token_list_formats():
+    expected = [{"address": "0xabc", "chain": "ethereum"}, {"address": "0xdef", "chain": "bsc"}]
+    assert parse_batch_tokens('[{"address": "0xabc"}, {"address": "0xdef", "chain": "bsc"}]') == expected
+    assert parse_batch_tokens('{"address": "0xabc"}\n{"address": "0xdef", "chain": "bsc"}\n') == expected
+    assert parse_batch_tokens("# watchlist\n0xabc\n\n0xdef, bsc\n") == expected
+    assert parse_batch_tokens('[["0xabc"], ["0xdef", "bsc"]]') == expected
+    assert parse_batch_tokens("  \n") == []
+
+
+def test_batch_streams_every_result_within_the_concurrency(monkeypatch):
+    running = 0
+    peak = 0
+    priorities = set()
+
+    async def fake_analyze(address, chain, include_timings=False):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        priorities.add(current_priority.get())
+        await asyncio.sleep(0.01)
+        running -= 1
+        if address == "0xbad":
+            raise ValueError("unknown token")
+        return {"token_address": address}
+
+    monkeypatch.setattr(analyzer, "analyze_token", fake_analyze)
+    tokens = parse_batch_tokens("0xa\n0xbad\n0xc\n0xd\n0xe")
+    results = []
+
+    async def scenario():
+        succeeded = await analyze_batch(tokens, concurrency=2, on_result=results.append)
+        return succeeded, current_priority.get()
+
+    succeeded, caller_priority = asyncio.run(scenario())
+    assert succeeded == 4
+    assert peak == 2
+    assert priorities == {BACKGROUND}
+    # The batch priority does not leak to the caller
+    assert caller_priority == INTERACTIVE
+    assert sorted(r["index"] for r in results) == list(range(5))
+    failed = [r for r in results if not r["success"]]
+    assert [(r["address"], r["error"]) for r in failed] == [("0xbad", "unknown token")]
+    assert all(r["data"] == {"token_address": r["address"]} for r in results if r["success"])
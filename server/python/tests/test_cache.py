@@ -0,0 +1,85 @@
+"""ResponseCache against a stub upstream"""
+import asyncio
+import time
+
+import pytest
+
+import cache
+from cache import CACHE_POLICIES, ResponseCache
+from http_client import UpstreamError
+
+
+def _rows(c):
+    return c._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_the_sqlite_store_is_pruned_on_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_PRUNE_EVERY", 10)
+    c = ResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=5, max_rows=20)
+    policy = CACHE_POLICIES["market"]
+    c.set("expired", 1, policy, ttl=-policy.stale - 1)
+    for i in range(49):
+        c.set(f"key{i}", i, policy)
+    assert _rows(c) == 20
+    assert c._get("expired") is None
+    # The rows closest to expiry went first
+    assert c._get("key48")[0] == 48
+    assert c._get("key0") is None
+
+
+def test_expired_rows_are_deleted_when_the_store_opens(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    c = ResponseCache(path)
+    c.set("old", 1, CACHE_POLICIES["price"], ttl=-3600)
+    c.set("new", 2, CACHE_POLICIES["price"])
+    reopened = ResponseCache(path)
+    assert _rows(reopened) == 1
+    assert reopened._get("new")[0] == 2
+    assert time.time() < reopened._get("new")[1]
+
+
+def test_stale_entries_are_served_while_refreshed():
+    async def scenario():
+        c = ResponseCache(path=None)
+        c.set("k", {"price": 1.0}, CACHE_POLICIES["price"], ttl=-1)
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return {"price": 2.0}
+
+        trace = {}
+        # Answered from the stale entry without waiting on the fetch
+        value = await asyncio.wait_for(c.get_or_fetch("k", "price", fetch, trace=trace), 1)
+        again = {}
+        await c.get_or_fetch("k", "price", fetch, trace=again)
+        release.set()
+        await c.drain()
+        fresh = {}
+        refreshed = await c.get_or_fetch("k", "price", fetch, trace=fresh)
+        return value, trace, again, refreshed, fresh, c.stats
+
+    value, trace, again, refreshed, fresh, stats = asyncio.run(scenario())
+    assert value == {"price": 1.0} and trace["result"] == "stale"
+    assert again["result"] == "stale"
+    assert refreshed == {"price": 2.0} and fresh["result"] == "hit"
+    # Both stale reads shared one background refresh
+    assert stats["revalidations"] == 1
+
+
+def test_not_found_answers_are_cached_other_errors_are_not():
+    calls = []
+
+    async def fetch(status):
+        calls.append(status)
+        raise UpstreamError("https://upstream/x", status)
+
+    async def scenario():
+        c = ResponseCache(path=None)
+        for key, status in (("missing", 404), ("missing", 404), ("failing", 500), ("failing", 500)):
+            with pytest.raises(UpstreamError) as error:
+                await c.get_or_fetch(key, "coin_id", lambda: fetch(status))
+            assert error.value.status == status
+
+    asyncio.run(scenario())
+    assert calls == [404, 500, 500]
@@ -0,0 +1,49 @@
+"""Candles and gap marking of resample_ohlcv"""
+import numpy as np
+
+from candles import asof, resample_ohlcv
+
+BAR = 60_000
+
+
+def test_bars_without_observations_repeat_the_previous_close():
+    # Bars 0, 1 and 4 observed (unsorted input), 2 and 3 empty, 5 only has a NaN price
+    t = np.array([4 * BAR + 5, 0, 30_000, BAR + 1, BAR + 2, 5 * BAR])
+    price = np.array([7.0, 1.0, 3.0, 4.0, 2.0, np.nan])
+    volume = np.array([70.0, 10.0, 30.0, 40.0, 20.0, 90.0])
+    candles = resample_ohlcv(t, price, volume, bar_ms=BAR, end=5 * BAR)
+
+    np.testing.assert_array_equal(candles["t"], np.arange(6) * BAR)
+    np.testing.assert_array_equal(candles["gap"], [False, False, True, True, False, True])
+    np.testing.assert_array_equal(candles["ticks"], [2, 2, 0, 0, 1, 0])
+    np.testing.assert_array_equal(candles["open"], [1, 4, 2, 2, 7, 7])
+    np.testing.assert_array_equal(candles["high"], [3, 4, 2, 2, 7, 7])
+    np.testing.assert_array_equal(candles["low"], [1, 2, 2, 2, 7, 7])
+    np.testing.assert_array_equal(candles["close"], [3, 2, 2, 2, 7, 7])
+    # Gaps have no volume; observed bars take their last cumulative volume
+    np.testing.assert_array_equal(candles["volume"], [30, 20, np.nan, np.nan, 70, np.nan])
+
+
+def test_bars_before_the_first_observation_have_no_price():
+    candles = resample_ohlcv(np.array([3 * BAR]), np.array([5.0]), bar_ms=BAR, start=0)
+    np.testing.assert_array_equal(candles["gap"], [True, True, True, False])
+    assert np.isnan(candles["close"][:3]).all()
+    assert candles["close"][3] == 5.0
+
+
+def test_empty_and_clipped_ranges():
+    empty = resample_ohlcv(np.array([], dtype=np.int64), np.array([]), bar_ms=BAR)
+    assert len(empty["t"]) == 0 and len(empty["gap"]) == 0
+
+    # Observations outside [start, end] are ignored
+    t = np.array([0, BAR, 2 * BAR, 3 * BAR])
+    candles = resample_ohlcv(t, np.array([1.0, 2.0, 3.0, 4.0]), bar_ms=BAR, start=BAR, end=2 * BAR)
+    np.testing.assert_array_equal(candles["close"], [2, 3])
+    assert not candles["gap"].any()
+
+
+def test_asof_takes_the_last_value_within_the_tolerance():
+    source_t = np.array([10, 20, 30])
+    values = np.array([1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(asof(np.array([5, 10, 25, 100]), source_t, values), [np.nan, 1, 2, 3])
+    np.testing.assert_array_equal(asof(np.array([25, 100]), source_t, values, tolerance_ms=10), [2, np.nan])
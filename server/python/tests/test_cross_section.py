@@ -0,0 +1,101 @@
+"""The token matrix against per-token compute_indicators / get_trading_signals"""
+import numpy as np
+import pytest
+
+from cross_section import RECOMMENDATIONS, compute_indicator_matrix, score_matrix
+from indicator_engine import EMA_SPANS, compute_indicators
+from indicators import calculate_confidence_score, calculate_risk_score, get_trading_signals
+
+LENGTHS = (1, 2, 10, 15, 16, 20, 21, 40, 120, 250)
+BARS = max(LENGTHS)
+RTOL = 1e-9
+
+
+def _matrix(seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, (len(LENGTHS), BARS)), axis=1))
+    spread = np.abs(rng.normal(0, 0.01, close.shape))
+    high, low = close * (1 + spread), close * (1 - spread)
+    # A flat row and a steadily rising one hit the RSI special cases
+    close[0] = high[0] = low[0] = 5.0
+    close[4] = high[4] = low[4] = np.linspace(1, 2, BARS)
+    lengths = np.array(LENGTHS)
+    lengths[0] = 30
+    return close, high, low, lengths
+
+
+def _expected(close, high, low):
+    indicators = compute_indicators(close, high, low)
+    return indicators, get_trading_signals(indicators["RSI"], indicators["MACD"], indicators["BB"],
+                                           indicators["EMA"], close[-1])
+
+
+def _flat(indicators):
+    values = {
+        "RSI": indicators["RSI"],
+        "MACD": indicators["MACD"]["macd"],
+        "MACD_signal": indicators["MACD"]["signal"],
+        "MACD_hist": indicators["MACD"]["hist"],
+        "BB_upper": indicators["BB"]["upper"],
+        "BB_middle": indicators["BB"]["middle"],
+        "BB_lower": indicators["BB"]["lower"],
+        "ADX": indicators["ADX"],
+    }
+    values.update({f"EMA{s}": indicators["EMA"][f"EMA{s}"] for s in EMA_SPANS})
+    return values
+
+
+def _check_rows(results, rows):
+    for i, (close, high, low) in enumerate(rows):
+        indicators, signals = _expected(close, high, low)
+        assert results["bars"][i] == len(close)
+        assert results["current_price"][i] == close[-1]
+        for key, value in _flat(indicators).items():
+            assert results[key][i] == pytest.approx(float(value), rel=RTOL, abs=1e-9, nan_ok=True), f"row {i}: {key}"
+        for key in ("buy_signals", "sell_signals", "neutral_signals"):
+            assert results[key][i] == signals[key], f"row {i}: {key}"
+        assert RECOMMENDATIONS[results["recommendation"][i]] == signals["recommendation"], f"row {i}"
+
+
+def test_ragged_rows_by_lengths():
+    close, high, low, lengths = _matrix()
+    results = compute_indicator_matrix(close, high, low, lengths=lengths)
+    _check_rows(results, [(close[i, :n], high[i, :n], low[i, :n]) for i, n in enumerate(lengths)])
+
+
+def test_ragged_rows_by_nan_padding():
+    close, high, low, lengths = _matrix()
+    padded = [np.full(close.shape, np.nan) for _ in range(3)]
+    rows = []
+    for i, n in enumerate(lengths):
+        # Alternately left- and right-aligned rows
+        at = slice(BARS - n, None) if i % 2 else slice(0, n)
+        for out, source in zip(padded, (close, high, low)):
+            out[i, at] = source[i, :n]
+        rows.append((close[i, :n], high[i, :n], low[i, :n]))
+    _check_rows(compute_indicator_matrix(*padded), rows)
+
+
+def test_score_matrix_matches_the_scalar_risk_metrics():
+    close, high, low, lengths = _matrix()
+    rng = np.random.default_rng(5)
+    market = {
+        "volume_24h": rng.uniform(0, 2e7, len(lengths)),
+        "liquidity": rng.uniform(0, 2e8, len(lengths)),
+        "market_cap": rng.uniform(0, 2e9, len(lengths)),
+        "price_change_24h": rng.uniform(-30, 30, len(lengths)),
+        "buy_sell_ratio": rng.uniform(0, 12, len(lengths)),
+    }
+    results = score_matrix(close, high, low, lengths=lengths, market=market)
+    for i, n in enumerate(lengths):
+        row = close[i, :n]
+        volatility = np.std(row) / np.mean(row)
+        _, signals = _expected(row, high[i, :n], low[i, :n])
+        risk = calculate_risk_score(
+            liquidity=market["liquidity"][i], volume=market["volume_24h"][i], market_cap=market["market_cap"][i],
+            volatility=min(1.0, volatility), buy_sell_ratio=max(0.1, min(10, market["buy_sell_ratio"][i]))
+        )
+        confidence = calculate_confidence_score(signals, risk, market["price_change_24h"][i], volatility)
+        assert results["volatility"][i] == pytest.approx(volatility, rel=RTOL)
+        assert results["risk_score"][i] == pytest.approx(risk, rel=RTOL)
+        assert results["confidence_score"][i] == pytest.approx(confidence, rel=RTOL)
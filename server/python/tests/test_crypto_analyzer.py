@@ -0,0 +1,63 @@
+"""Lifetime of the history fetch started alongside the market data"""
+import asyncio
+
+import pytest
+
+from cache import ResponseCache
+from crypto_analyzer import CryptoAnalyzer
+
+
+def _analyzer(market):
+    analyzer = CryptoAnalyzer("0xabc", http=object(), cache=ResponseCache(path=None),
+                              token_index=object(), series_store=object())
+    history = {"started": asyncio.Event(), "cancelled": False}
+
+    async def slow_history():
+        history["started"].set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            history["cancelled"] = True
+            raise
+
+    analyzer._get_coingecko_data = slow_history
+    analyzer._get_dexscreener_data = market
+    return analyzer, history
+
+
+def _pending_tasks():
+    return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+
+def test_history_is_cancelled_when_the_market_data_fails():
+    async def failing_market():
+        await asyncio.sleep(0)
+        raise RuntimeError("market data failed")
+
+    async def scenario():
+        analyzer, history = _analyzer(failing_market)
+        with pytest.raises(RuntimeError):
+            await analyzer.get_historical_prices()
+        return history["cancelled"], _pending_tasks()
+
+    cancelled, pending = asyncio.run(scenario())
+    assert cancelled
+    assert pending == []
+
+
+def test_history_is_cancelled_with_its_caller():
+    async def slow_market():
+        await asyncio.sleep(60)
+
+    async def scenario():
+        analyzer, history = _analyzer(slow_market)
+        call = asyncio.ensure_future(analyzer.get_historical_prices())
+        await history["started"].wait()
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        return history["cancelled"], _pending_tasks()
+
+    cancelled, pending = asyncio.run(scenario())
+    assert cancelled
+    assert pending == []
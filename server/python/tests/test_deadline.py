@@ -0,0 +1,155 @@
+"""Analyses whose deadline budget runs out"""
+import asyncio
+import os
+import time
+
+import deadline
+from cache import ResponseCache
+from crypto_analyzer import CryptoAnalyzer
+from series_store import SeriesStore
+from token_index import TokenIndex
+
+# Not in the built-in index: resolving it needs CoinGecko
+ADDRESS = "0x" + "ab" * 20
+
+
+class SlowUpstream:
+    """An upstream that never answers within the budget"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get_json(self, url, params=None, timeout=None, trace=None):
+        self.calls += 1
+        while True:
+            # What HttpClient.get_json does between waits
+            deadline.timeout_for(None)
+            await asyncio.sleep(0.005)
+
+
+def _analyze(budget_s, tmp_path):
+    upstream = SlowUpstream()
+    analyzer = CryptoAnalyzer(ADDRESS, http=upstream, cache=ResponseCache(path=None),
+                              token_index=TokenIndex(str(tmp_path / "missing.sqlite3")),
+                              series_store=SeriesStore(path=None))
+
+    async def run():
+        with deadline.limit(budget_s):
+            return await analyzer.run_analysis()
+
+    return analyzer, upstream, asyncio.run(run())
+
+
+def test_spent_budget_never_yields_the_default_series(tmp_path):
+    analyzer, upstream, result = _analyze(0.05, tmp_path)
+    assert upstream.calls > 0
+    assert result["status"] == "timeout"
+    assert "deadline exceeded" in result["error"]
+    assert "technical_analysis" not in result and "market_data" not in result
+    assert analyzer.price_data is None
+    assert result["budget"]["exceeded"]
+
+
+def test_budget_spent_before_the_first_call(tmp_path):
+    _, _, result = _analyze(0.0, tmp_path)
+    assert result["status"] == "timeout"
+    assert "technical_analysis" not in result
+
+
+def test_only_analyses_with_the_same_budget_are_coalesced(monkeypatch):
+    import analyzer
+    import crypto_analyzer
+
+    runs = []
+
+    class FakeAnalyzer:
+        def __init__(self, token_address, chain):
+            pass
+
+        async def run_analysis(self, **options):
+            runs.append(deadline.usage()["deadline_ms"])
+            await asyncio.sleep(0.05)
+            return {"status": "success"}
+
+    monkeypatch.setattr(crypto_analyzer, "CryptoAnalyzer", FakeAnalyzer)
+
+    async def analyze(budget_s):
+        with deadline.limit(budget_s):
+            return await analyzer.analyze_token(ADDRESS)
+
+    async def scenario():
+        return await asyncio.gather(analyze(5.0), analyze(5.0), analyze(0.5))
+
+    assert asyncio.run(scenario()) == [{"status": "success"}] * 3
+    assert sorted(runs) == [500.0, 5000.0]
+
+
+def test_worker_jobs_run_under_their_deadline(monkeypatch):
+    import analyzer
+
+    read_end, write_end = os.pipe()
+    monkeypatch.setenv("ANALYZER_PROTOCOL_FD", str(write_end))
+    worker = analyzer.Worker()
+    sent = []
+    monkeypatch.setattr(worker, "send", lambda message, binary=False: sent.append(message))
+
+    async def fake_analyze(address, chain, **options):
+        async def upstream_call():
+            return deadline.usage()
+
+        # Tasks started by the analysis see the same deadline
+        return await asyncio.ensure_future(upstream_call())
+
+    monkeypatch.setattr(analyzer, "analyze_token", fake_analyze)
+    requested_at = time.time() * 1000 - 300
+    asyncio.run(worker.handle({"id": 1, "address": ADDRESS, "deadline_ms": 2000, "requested_at": requested_at}))
+    asyncio.run(worker.handle({"id": 2, "address": ADDRESS}))
+    worker.out.close()
+    os.close(read_end)
+
+    budget = sent[0]["data"]
+    assert budget["deadline_ms"] == 2000.0
+    # The time spent queued counts against the budget
+    assert 300 <= budget["used_ms"] < 1000
+    assert budget["remaining_ms"] <= 1700
+    assert sent[1]["data"] is None
+    assert deadline.current_deadline.get() is None
+
+
+def test_rate_limiter_waits_are_cut_at_the_deadline():
+    from http_client import HttpClient
+    from rate_limiter import RateLimiter
+
+    async def scenario():
+        limiter = RateLimiter({"api.example.com": (60, 1)})
+        limiter.pause("api.example.com", 30)
+        client = HttpClient(limiter=limiter)
+        # Import aiohttp and open the session outside of the budget
+        client._get_session()
+        started = asyncio.get_running_loop().time()
+        try:
+            with deadline.limit(0.2):
+                await client.get_json("https://api.example.com/x")
+        except deadline.DeadlineExceeded as e:
+            return str(e), asyncio.get_running_loop().time() - started
+        finally:
+            await client.close()
+
+    message, elapsed = asyncio.run(scenario())
+    assert "api.example.com" in message
+    assert elapsed < 1
+
+
+def test_timeouts_are_capped_by_the_remaining_budget():
+    assert deadline.timeout_for(7) == 7
+    with deadline.limit(1.0, elapsed_seconds=0.5):
+        assert 0.4 < deadline.timeout_for(None) <= 0.5
+        assert deadline.timeout_for(0.1) == 0.1
+    with deadline.limit(1.0, elapsed_seconds=2.0):
+        assert deadline.usage()["exceeded"]
+        try:
+            deadline.timeout_for(5)
+        except deadline.DeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("DeadlineExceeded not raised")
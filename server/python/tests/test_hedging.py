@@ -0,0 +1,87 @@
+"""hedged() races and the hedge delay"""
+import asyncio
+
+import pytest
+
+import deadline
+from hedging import FALLBACK, PRIMARY, LatencyTracker, hedged
+
+
+def _source(result, delay=0.0, calls=None, name=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append(f"{name} cancelled")
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call
+
+
+def test_a_prompt_primary_is_not_hedged():
+    calls = []
+
+    async def fallback():
+        calls.append("fallback")
+
+    assert asyncio.run(hedged(_source("p", 0.01), fallback, delay=1.0)) == ("p", PRIMARY, False)
+    assert calls == []
+
+
+def test_a_late_primary_is_hedged_and_the_loser_cancelled():
+    calls = []
+    primary = _source("p", 1.0, calls, "primary")
+
+    async def scenario():
+        outcome = await hedged(primary, _source("f", 0.01), delay=0.02)
+        await asyncio.sleep(0)
+        return outcome
+
+    assert asyncio.run(scenario()) == ("f", FALLBACK, True)
+    assert calls == ["primary cancelled"]
+
+
+def test_the_primary_wins_if_it_answers_first_after_the_hedge():
+    calls = []
+    fallback = _source("f", 1.0, calls, "fallback")
+
+    async def scenario():
+        outcome = await hedged(_source("p", 0.05), fallback, delay=0.01)
+        await asyncio.sleep(0)
+        return outcome
+
+    assert asyncio.run(scenario()) == ("p", PRIMARY, True)
+    assert calls == ["fallback cancelled"]
+
+
+def test_a_failed_or_empty_primary_falls_back_without_waiting():
+    for primary in (_source(ValueError("down")), _source(None)):
+        result = asyncio.run(asyncio.wait_for(hedged(primary, _source("f"), delay=10.0), 1))
+        assert result == ("f", FALLBACK, False)
+
+
+def test_the_last_error_is_raised_when_both_fail():
+    with pytest.raises(KeyError):
+        asyncio.run(hedged(_source(ValueError("primary")), _source(KeyError("fallback"), 0.01), delay=10.0))
+    assert asyncio.run(hedged(_source(None), _source(None), delay=10.0)) == (None, None, False)
+
+
+def test_the_hedge_delay_follows_the_latency_quantile_and_the_budget():
+    tracker = LatencyTracker(size=10, quantile=0.9, default=2.0, floor=0.05, min_samples=10)
+    assert tracker.delay() == 2.0
+    for i in range(1, 11):
+        tracker.record(i / 10)
+    assert tracker.delay() == 1.0
+    # Only the last 10 latencies count
+    for _ in range(10):
+        tracker.record(0.01)
+    assert tracker.delay() == 0.05
+    with deadline.limit(1.0, elapsed_seconds=0.9):
+        # Half of what is left of the budget
+        assert tracker.delay() <= 0.05
+        tracker.floor = 0.5
+        assert tracker.delay() <= 0.05
@@ -0,0 +1,43 @@
+"""Argument checks of the calculate_* functions"""
+import numpy as np
+import pytest
+
+from indicator_engine import bollinger_series, compute_indicators
+from indicators import (
+    calculate_adx,
+    calculate_bollinger_bands,
+    calculate_ema_signals,
+    calculate_macd,
+    calculate_rsi,
+)
+
+PRICES = 100 + np.cumsum(np.random.default_rng(3).normal(0, 1, 120))
+
+SERIES = {
+    "rsi": lambda window: calculate_rsi(PRICES, full_series=True, window=window),
+    "macd": lambda window: calculate_macd(PRICES, full_series=True, window=window),
+    "bollinger": lambda window: calculate_bollinger_bands(PRICES, full_series=True, window=window),
+    "ema": lambda window: calculate_ema_signals(PRICES, full_series=True, window=window),
+    "adx": lambda window: calculate_adx(PRICES * 1.01, PRICES * 0.99, PRICES, full_series=True, window=window),
+    "bollinger_series": lambda window: bollinger_series(PRICES, window=window),
+    "compute_indicators": lambda window: compute_indicators(PRICES, PRICES * 1.01, PRICES * 0.99,
+                                                            full_series=True, window=window),
+}
+
+
+@pytest.mark.parametrize("name", SERIES)
+@pytest.mark.parametrize("window", [0, -5])
+def test_full_series_rejects_empty_windows(name, window):
+    with pytest.raises(ValueError, match="window must be a positive number of bars"):
+        SERIES[name](window)
+
+
+@pytest.mark.parametrize("name", SERIES)
+def test_full_series_window_keeps_the_last_bars(name):
+    def lengths(value):
+        if isinstance(value, dict):
+            return {n for v in value.values() for n in lengths(v)}
+        return {len(value)} if np.ndim(value) else set()
+
+    assert lengths(SERIES[name](7)) == {7}
+    assert lengths(SERIES[name](None)) == {len(PRICES)}
@@ -0,0 +1,59 @@
+"""Frames written to the Node server (see server/tests/protocol.test.js for the reader)"""
+import json
+import math
+import struct
+
+import numpy as np
+
+from protocol import BINARY_MIN_VALUES, FLAG_BINARY, FLAG_TAGGED, HEADER, encode_frame
+
+
+def _split(frame):
+    length, flags = HEADER.unpack_from(frame)
+    payload = frame[HEADER.size:]
+    assert len(payload) == length
+    return payload, flags
+
+
+def test_plain_frames_are_json():
+    payload, flags = _split(encode_frame({"type": "ready", "n": np.int64(3), "x": [np.float64(1.5)]}))
+    assert flags == 0
+    assert json.loads(payload) == {"type": "ready", "n": 3, "x": [1.5]}
+
+
+def test_non_finite_numbers_are_tagged():
+    payload, flags = _split(encode_frame({"rsi": float("nan"), "bands": np.array([np.inf, -np.inf, 1.0])}))
+    assert flags == FLAG_TAGGED
+    assert json.loads(payload) == {
+        "rsi": {"$num": "NaN"},
+        "bands": [{"$num": "Infinity"}, {"$num": "-Infinity"}, 1.0],
+    }
+
+
+def test_large_arrays_travel_as_aligned_float64():
+    series = np.linspace(0, 1, BINARY_MIN_VALUES)
+    counts = np.arange(BINARY_MIN_VALUES + 1, dtype=np.int32)
+    message = {"id": 7, "series": series, "nested": [counts], "short": np.ones(3)}
+    payload, flags = _split(encode_frame(message, binary=True))
+    assert flags == FLAG_BINARY
+
+    (head_length,) = struct.unpack_from(">I", payload)
+    head = json.loads(payload[4:4 + head_length])
+    data_start = 4 + head_length + (-(4 + head_length) % 8)
+    assert data_start % 8 == 0
+    data = payload[data_start:]
+    assert head["short"] == [1.0, 1.0, 1.0]
+
+    def array(ref):
+        offset, count = ref["$f64"]
+        return np.frombuffer(data, dtype="<f8", count=count, offset=offset)
+
+    np.testing.assert_array_equal(array(head["series"]), series)
+    np.testing.assert_array_equal(array(head["nested"][0]), counts)
+    assert len(data) == (series.size + counts.size) * 8
+
+
+def test_binary_is_only_used_when_an_array_qualifies():
+    payload, flags = _split(encode_frame({"series": np.ones(BINARY_MIN_VALUES - 1), "nan": math.nan}, binary=True))
+    assert flags == FLAG_TAGGED
+    assert len(json.loads(payload)["series"]) == BINARY_MIN_VALUES - 1
@@ -0,0 +1,71 @@
+"""Token buckets of the upstream rate limiter"""
+import asyncio
+import time
+
+from rate_limiter import BACKGROUND, INTERACTIVE, HostLimiter, parse_rate_limits, parse_retry_after
+
+
+def test_waiting_calls_are_granted_by_priority_then_arrival():
+    async def scenario():
+        # 100 tokens per second, one at a time
+        limiter = HostLimiter(6000, 1)
+        assert await limiter.acquire() == 0.0
+        order = []
+
+        async def call(name, level):
+            await limiter.acquire(level)
+            order.append(name)
+
+        calls = [asyncio.ensure_future(call(name, level)) for name, level in (
+            ("batch-1", BACKGROUND), ("batch-2", BACKGROUND), ("user-1", INTERACTIVE), ("user-2", INTERACTIVE)
+        )]
+        await asyncio.sleep(0)
+        waiting = limiter.stats()["waiting"]
+        await asyncio.gather(*calls)
+        return order, waiting, limiter.stats()
+
+    order, waiting, stats = asyncio.run(scenario())
+    assert order == ["user-1", "user-2", "batch-1", "batch-2"]
+    assert waiting == 4
+    assert stats == {"granted": 5, "queued": 4, "paused": 0, "waiting": 0}
+
+
+def test_cancelled_waiters_give_their_turn_up():
+    async def scenario():
+        limiter = HostLimiter(6000, 1)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire(INTERACTIVE))
+        kept = asyncio.ensure_future(limiter.acquire(BACKGROUND))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        waiting = limiter.stats()["waiting"]
+        await asyncio.wait_for(kept, 1)
+        return waiting, limiter.stats()["granted"]
+
+    waiting, granted = asyncio.run(scenario())
+    assert waiting == 1
+    assert granted == 2
+
+
+def test_pause_blocks_the_host_until_the_deadline():
+    async def scenario():
+        limiter = HostLimiter(6000, 5)
+        limiter.pause(0.1)
+        started = time.monotonic()
+        waited = await limiter.acquire()
+        return waited, time.monotonic() - started
+
+    waited, elapsed = asyncio.run(scenario())
+    assert waited >= 0.09 and elapsed >= 0.09
+
+
+def test_limit_and_retry_after_parsing():
+    assert parse_rate_limits("api.example.com=120:4, other.host=30") == {
+        "api.example.com": (120.0, 4.0),
+        "other.host": (30.0, 1.0),
+    }
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
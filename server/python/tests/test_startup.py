@@ -0,0 +1,25 @@
+"""Import-time budget of the analysis path, measured in fresh interpreters"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmark import HERE, STARTUP_BUDGET_MS, STARTUP_FORBIDDEN, _STARTUP_PROBE
+
+RUNS = 3
+
+
+def _probe():
+    out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=HERE, capture_output=True, text=True,
+                         check=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_stays_lean_and_within_budget():
+    probes = [_probe() for _ in range(RUNS)]
+    loaded = {module.split(".")[0] for probe in probes for module in probe["modules"]}
+    assert not loaded & set(STARTUP_FORBIDDEN), f"imported at startup: {sorted(loaded & set(STARTUP_FORBIDDEN))}"
+
+    median_ms = statistics.median(probe["seconds"] for probe in probes) * 1000
+    assert median_ms <= STARTUP_BUDGET_MS, f"import crypto_analyzer takes {median_ms:.0f} ms"
@@ -0,0 +1,101 @@
+"""Incremental indicator states against the batch engine and the calculate_* functions"""
+import json
+
+import numpy as np
+import pytest
+
+from indicator_engine import compute_indicators
+from indicators import (
+    calculate_adx,
+    calculate_bollinger_bands,
+    calculate_ema_signals,
+    calculate_macd,
+    calculate_rsi,
+)
+from streaming import ADXState, BollingerState, EMAState, IndicatorState, MACDState, RSIState
+
+SEED_BARS = 60
+BARS = 400
+RESUME_AT = 230
+RTOL = 1e-9
+
+
+def _ohlc(n=BARS, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    spread = np.abs(rng.normal(0, 0.01, n))
+    return close * (1 + spread), close * (1 - spread), close
+
+
+def _round_trip(state):
+    # The state as a worker or the Node server would persist it
+    return type(state).from_dict(json.loads(json.dumps(state.to_dict())))
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}{key}.")
+    else:
+        yield prefix.rstrip("."), float(value)
+
+
+def _assert_close(actual, expected, where):
+    expected = dict(_flatten(expected))
+    actual = dict(_flatten(actual))
+    assert actual.keys() == expected.keys(), where
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value, rel=RTOL, abs=1e-9, nan_ok=True), f"{where}: {key}"
+
+
+HIGH, LOW, CLOSE = _ohlc()
+
+# Each state with the calculate_* function whose latest value it must follow bar by bar
+STATES = {
+    "RSI": (lambda h, l, c: RSIState.from_history(c), lambda t: calculate_rsi(CLOSE[:t + 1])),
+    "MACD": (lambda h, l, c: MACDState.from_history(c), lambda t: calculate_macd(CLOSE[:t + 1])),
+    "BB": (lambda h, l, c: BollingerState.from_history(c), lambda t: calculate_bollinger_bands(CLOSE[:t + 1])),
+    "EMA": (lambda h, l, c: EMAState.from_history(c), lambda t: calculate_ema_signals(CLOSE[:t + 1])),
+    "ADX": (lambda h, l, c: ADXState.from_history(h, l, c),
+            lambda t: calculate_adx(HIGH[:t + 1], LOW[:t + 1], CLOSE[:t + 1])),
+}
+
+
+@pytest.mark.parametrize("name", sorted(STATES))
+def test_state_follows_series(name):
+    make, expected = STATES[name]
+    state = make(HIGH[:SEED_BARS], LOW[:SEED_BARS], CLOSE[:SEED_BARS])
+    _assert_close(state.value, expected(SEED_BARS - 1), f"{name} seeded")
+    for t in range(SEED_BARS, BARS):
+        if t == RESUME_AT:
+            state = _round_trip(state)
+        value = state.update(HIGH[t], LOW[t], CLOSE[t])
+        _assert_close(value, expected(t), f"{name} at bar {t}")
+
+
+def test_indicator_state_matches_compute_indicators():
+    state = IndicatorState.from_history(HIGH[:SEED_BARS], LOW[:SEED_BARS], CLOSE[:SEED_BARS])
+    for t in range(SEED_BARS, BARS):
+        if t == RESUME_AT:
+            state = _round_trip(state)
+        value = state.update(HIGH[t], LOW[t], CLOSE[t])
+        if t % 17 == 0 or t == BARS - 1:
+            expected = compute_indicators(CLOSE[:t + 1], HIGH[:t + 1], LOW[:t + 1])
+            _assert_close(value, expected, f"bar {t}")
+
+
+def test_round_trip_keeps_the_state():
+    state = IndicatorState.from_history(HIGH[:RESUME_AT], LOW[:RESUME_AT], CLOSE[:RESUME_AT])
+    resumed = _round_trip(state)
+    assert resumed.to_dict() == json.loads(json.dumps(state.to_dict()))
+    for t in range(RESUME_AT, RESUME_AT + 20):
+        _assert_close(resumed.update(HIGH[t], LOW[t], CLOSE[t]), state.update(HIGH[t], LOW[t], CLOSE[t]),
+                      f"bar {t}")
+
+
+def test_short_history_seeds_like_the_batch_functions():
+    # Fewer bars than the RSI and ADX periods: their neutral defaults
+    state = IndicatorState.from_history(HIGH[:5], LOW[:5], CLOSE[:5])
+    for t in range(5, 40):
+        value = state.update(HIGH[t], LOW[t], CLOSE[t])
+        _assert_close(value, compute_indicators(CLOSE[:t + 1], HIGH[:t + 1], LOW[:t + 1]), f"bar {t}")
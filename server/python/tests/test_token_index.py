@@ -0,0 +1,42 @@
+"""Building and updating the local token id index"""
+import os
+import time
+
+from token_index import TokenIndex, build_index, update_index
+
+COINS = [
+    {"id": "pepe", "platforms": {"ethereum": "0x6982508145454Ce325dDbE47a25d4ec3d2311933"}},
+    {"id": "bonk", "platforms": {"solana": "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263", "": ""}},
+    {"id": "no-contract", "platforms": {}},
+]
+
+
+def test_built_index_resolves_every_listed_contract(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    build_index(COINS, path)
+    index = TokenIndex(path)
+    # EVM addresses match whatever their case
+    assert index.lookup("ethereum", "0x6982508145454ce325ddbe47a25d4ec3d2311933") == "pepe"
+    assert index.lookup("solana", "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263") == "bonk"
+    assert index.lookup("ethereum", "0x" + "00" * 20) is None
+    # Built-in tokens are part of every index
+    assert index.lookup("ethereum", "0xdac17f958d2ee523a2206206994597c13d831ec7") == "tether"
+
+
+def test_update_only_rebuilds_a_missing_or_stale_index(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    downloads = []
+
+    def download():
+        downloads.append(1)
+        return COINS
+
+    assert update_index(path, max_age=3600, download=download) > len(COINS)
+    assert update_index(path, max_age=3600, download=download) is None
+    assert len(downloads) == 1
+
+    stale = time.time() - 7200
+    os.utime(path, (stale, stale))
+    assert update_index(path, max_age=3600, download=download) is not None
+    assert update_index(path, download=download) is not None
+    assert len(downloads) == 3
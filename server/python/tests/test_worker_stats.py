@@ -0,0 +1,61 @@
+"""Cache lookup outcomes and the counters reported in worker pongs"""
+import asyncio
+import os
+import threading
+import time
+
+from analyzer import Worker
+from cache import ResponseCache
+
+
+def test_joined_miss_is_not_a_hit():
+    async def scenario():
+        cache = ResponseCache(path=None)
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return {"price": 1.0}
+
+        traces = [{}, {}]
+        lookups = [asyncio.ensure_future(cache.get_or_fetch("k", "price", fetch, trace=t)) for t in traces]
+        await asyncio.sleep(0)
+        release.set()
+        values = await asyncio.gather(*lookups)
+
+        again = {}
+        await cache.get_or_fetch("k", "price", fetch, trace=again)
+        return calls, values, [t["result"] for t in traces], again["result"]
+
+    calls, values, results, again = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert values == [{"price": 1.0}] * 2
+    assert results == ["miss", "joined"]
+    assert again == "hit"
+
+
+def test_ping_stats_are_taken_on_the_loop(monkeypatch):
+    # Frames go to a pipe of their own, not to a descriptor pytest uses
+    read_end, write_end = os.pipe()
+    monkeypatch.setenv("ANALYZER_PROTOCOL_FD", str(write_end))
+    worker = Worker()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        stats = worker.ping_stats(loop)
+        assert set(stats) == {"coalescing", "rate_limits"}
+
+        # A blocked loop still lets the pong through, without the counters
+        loop.call_soon_threadsafe(time.sleep, 1.0)
+        started = time.perf_counter()
+        assert worker.ping_stats(loop) == {}
+        assert time.perf_counter() - started < 0.9
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        worker.out.close()
+        os.close(read_end)
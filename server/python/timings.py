@@ -0,0 +1,51 @@
+"""Per-stage timings of one analysis"""
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+class StageTimings:
+    """
+    Wall-clock durations of the stages of one analysis, plus one record per
+    upstream call (host, duration, status) and per cache lookup.
+
+    Stages may overlap (market data and history are fetched concurrently);
+    a stage entered several times accumulates its durations.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.upstream: List[Dict] = []
+        self.cache: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record_upstream(self, url: str, seconds: float, status: Optional[int], trace: Optional[Dict] = None):
+        """
+        ``status`` is None when no HTTP response was received (timeout,
+        connection error). ``trace`` is filled by ``HttpClient.get_json``:
+        time spent waiting for the rate limiter, attempts and priority.
+        """
+        trace = trace or {}
+        self.upstream.append({
+            "host": urlsplit(url).netloc,
+            "seconds": seconds,
+            "status": str(status) if status is not None else "error",
+            "wait": trace.get("wait", 0.0),
+            "attempts": trace.get("attempts", 1),
+            "priority": trace.get("priority", "interactive")
+        })
+
+    def record_cache(self, kind: str, hit: bool):
+        counts = self.cache.setdefault(kind, {"hit": 0, "miss": 0})
+        counts["hit" if hit else "miss"] += 1
+
+    def to_dict(self) -> Dict:
+        return {"stages": dict(self.stages), "upstream": list(self.upstream), "cache": dict(self.cache)}
@@ -0,0 +1,242 @@
+"""
+Full-universe scoring on every core.
+
+``score_universe`` computes ``cross_section.score_matrix`` over a
+``(n_tokens, n_bars)`` price matrix split into row shards, one process per
+core. Input matrices are placed once in shared memory, which the pool
+processes map when they start: tasks only carry a ``(start, stop)`` row
+range, and only the per-token results (a few values per row) travel back.
+Shards are gathered in row order, so results are indexed like the input
+whatever the number of processes.
+
+    python3 universe.py [--workers N] [--bars N] [--output FILE]
+
+scores every series of the price history store (``series_store.py``) and
+writes one JSON line per token, then a summary line, like ``--batch``.
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cross_section import RECOMMENDATIONS, score_matrix
+
+# Shards per process: a little slack evens out processes that finish late
+SHARDS_PER_WORKER = 2
+
+# Per-token market inputs of the risk metrics (see score_matrix)
+MARKET_FIELDS = ("volume_24h", "liquidity", "market_cap", "price_change_24h", "buy_sell_ratio")
+
+
+class SharedArrays:
+    """
+    NumPy arrays in named shared memory blocks. ``specs`` describes them so
+    that other processes can map the same memory with ``attach``.
+    """
+
+    def __init__(self):
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.specs: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+
+    def create(self, name: str, shape: Tuple[int, ...], dtype=np.float64) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.blocks.append(block)
+        self.specs[name] = (block.name, tuple(shape), dtype.str)
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+    def put(self, name: str, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values)
+        shared = self.create(name, values.shape, values.dtype)
+        shared[...] = values
+        return shared
+
+    @staticmethod
+    def attach(specs: Dict[str, Tuple[str, Tuple[int, ...], str]]):
+        """Map arrays created by another process; returns the arrays and their blocks"""
+        blocks, arrays = [], {}
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return arrays, blocks
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks:
+            try:
+                block.close()
+            except BufferError:
+                # Views are still alive: the mapping goes away with them
+                pass
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Arrays mapped by a pool process (and their blocks, which must stay open)
+_arrays: Dict[str, np.ndarray] = {}
+_blocks: List[shared_memory.SharedMemory] = []
+
+
+def _attach(specs):
+    global _arrays, _blocks
+    _arrays, _blocks = SharedArrays.attach(specs)
+
+
+def _score_rows(arrays: Dict[str, np.ndarray], start: int, stop: int) -> Dict[str, np.ndarray]:
+    rows = slice(start, stop)
+    market = None
+    if "volume_24h" in arrays:
+        market = {field: arrays[field][rows] for field in MARKET_FIELDS}
+    lengths = arrays["lengths"][rows] if "lengths" in arrays else None
+    high = arrays["high"][rows] if "high" in arrays else None
+    low = arrays["low"][rows] if "low" in arrays else None
+    return score_matrix(arrays["close"][rows], high, low, lengths, market)
+
+
+def _score_shard(start: int, stop: int) -> Dict[str, np.ndarray]:
+    return _score_rows(_arrays, start, stop)
+
+
+def shard_bounds(rows: int, shards: int) -> List[Tuple[int, int]]:
+    """``shards`` contiguous row ranges of nearly equal size covering ``rows``"""
+    edges = np.linspace(0, rows, max(1, min(shards, rows)) + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _gather(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def score_shared(shared: SharedArrays, rows: int, workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Score ``rows`` tokens whose arrays are already in ``shared`` (``close``,
+    optionally ``high``, ``low``, ``lengths`` and the ``MARKET_FIELDS``).
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, rows or 1))
+    bounds = shard_bounds(rows, workers * SHARDS_PER_WORKER)
+    if workers == 1:
+        # No process to start: score in place
+        return _gather([_score_rows(shared.arrays, start, stop) for start, stop in bounds])
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.specs,)) as pool:
+        starts, stops = zip(*bounds)
+        # map yields the shards in submission order: results stay in row order
+        parts = list(pool.map(_score_shard, starts, stops))
+    return _gather(parts)
+
+
+def score_universe(
+    close: np.ndarray,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    lengths: Optional[np.ndarray] = None,
+    market: Optional[Dict[str, np.ndarray]] = None,
+    workers: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    ``score_matrix`` of every row, sharded across ``workers`` processes
+    (default: one per core). Same arguments and results as ``score_matrix``,
+    up to the last bit: the kernels may round differently on shard edges.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) == 0:
+        return score_matrix(close, high, low, lengths, market)
+    with SharedArrays() as shared:
+        shared.put("close", close)
+        for name, values in (("high", high), ("low", low), ("lengths", lengths)):
+            if values is not None:
+                shared.put(name, np.asarray(values, dtype=np.int64 if name == "lengths" else np.float64))
+        for field in MARKET_FIELDS if market is not None else ():
+            shared.put(field, np.asarray(market[field], dtype=np.float64))
+        return score_shared(shared, len(close), workers)
+
+
+def load_store_matrix(shared: SharedArrays, store, bars: Optional[int] = None):
+    """
+    Copy the stored series into shared memory: right-aligned ``close``
+    (NaN-padded) over the last ``bars`` bars (all by default) and the
+    market inputs taken from the last bars. Returns the ``(chain, address)``
+    of every row.
+    """
+    from series_store import BAR_MS
+
+    tokens = store.tokens()
+    series = [store.read(chain, address) for chain, address in tokens]
+    width = max((len(s["t"]) for s in series), default=0)
+    if bars:
+        width = min(width, bars)
+
+    close = shared.create("close", (len(tokens), width))
+    close[...] = np.nan
+    market = {field: shared.create(field, (len(tokens),)) for field in MARKET_FIELDS}
+    for i, columns in enumerate(series):
+        price = columns["price"][-width:] if width else columns["price"][:0]
+        close[i, width - len(price):] = price
+        t = columns["t"]
+        # The change since the bar one day before the last one (24h change)
+        before = int(np.searchsorted(t, t[-1] - BAR_MS, side="right")) - 1
+        previous = columns["price"][max(before, 0)] if len(t) > 1 else columns["price"][-1]
+        volume = float(columns["volume"][-1])
+        market["volume_24h"][i] = volume
+        market["liquidity"][i] = volume * 0.1
+        market["market_cap"][i] = float(columns["market_cap"][-1])
+        market["price_change_24h"][i] = (columns["price"][-1] / previous - 1) * 100 if previous else 0.0
+        market["buy_sell_ratio"][i] = 1.0
+    del series
+    return tokens
+
+
+def main(argv):
+    from series_store import SeriesStore, SERIES_PATH
+
+    def option(name, default):
+        return type(default)(argv[argv.index(name) + 1]) if name in argv else default
+
+    workers = option("--workers", os.cpu_count() or 1)
+    bars = option("--bars", 0)
+    path = option("--series-path", SERIES_PATH)
+    output = option("--output", "")
+
+    out = open(output, "w") if output else sys.stdout
+    started = time.perf_counter()
+    try:
+        with SharedArrays() as shared:
+            tokens = load_store_matrix(shared, SeriesStore(path), bars or None)
+            loaded = time.perf_counter()
+            results = score_shared(shared, len(tokens), workers) if tokens else {}
+
+        for i, (chain, address) in enumerate(tokens):
+            item = {"chain": chain, "address": address}
+            for key, values in results.items():
+                value = values[i].item()
+                if key == "recommendation":
+                    value = RECOMMENDATIONS[value]
+                elif isinstance(value, float) and not np.isfinite(value):
+                    value = None
+                item[key] = value
+            out.write(json.dumps(item) + "\n")
+        out.write(json.dumps({"done": True, "total": len(tokens), "workers": workers,
+                              "load_seconds": round(loaded - started, 3),
+                              "score_seconds": round(time.perf_counter() - loaded, 3)}) + "\n")
+    finally:
+        if output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
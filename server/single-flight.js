@@ -0,0 +1,30 @@
+/**
+ * Coalesces concurrent identical calls: while a call for a key is in
+ * flight, later callers with the same key get the same promise instead of
+ * starting their own. `stats` counts every call and the coalesced ones.
+ */
+export class SingleFlight {
+  constructor() {
+    this.calls = new Map();
+    this.stats = { calls: 0, coalesced: 0 };
+  }
+
+  run(key, fn) {
+    this.stats.calls++;
+    const existing = this.calls.get(key);
+    if (existing) {
+      this.stats.coalesced++;
+      return existing;
+    }
+
+    const promise = Promise.resolve()
+      .then(fn)
+      .finally(() => {
+        if (this.calls.get(key) === promise) {
+          this.calls.delete(key);
+        }
+      });
+    this.calls.set(key, promise);
+    return promise;
+  }
+}
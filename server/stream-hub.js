@@ -0,0 +1,222 @@
+/**
+ * Live analysis updates over Server-Sent Events.
+ *
+ * Subscribers of the same token share one channel: every `intervalMs` the
+ * channel runs a single `tick` job on the worker pool and fans its result
+ * out to all of them. The first tick is a full analysis, which also seeds
+ * the streaming indicator state (python/live.py); the following ones only
+ * fetch the current quote and advance that state by one bar. The state is
+ * kept here and sent along with each tick, so any worker can serve it.
+ * Tokens whose analysis cannot seed a state (too little history) are
+ * re-analyzed at exponentially growing intervals, up to `maxBackoff` times
+ * `intervalMs`, instead of on every tick.
+ *
+ * Events:
+ * - `analysis`: a full analysis, on subscription and once a day
+ * - `update`: market data, indicators and signals, only when they changed
+ * - `recommendation`: `{from, to}` when the recommendation changes
+ * - `failure`: `{error}` when a tick fails (the stream goes on)
+ */
+
+export class StreamHub {
+  constructor({
+    pool,
+    keyOf,
+    intervalMs = 15000,
+    heartbeatMs = 15000,
+    maxChannels = 100,
+    maxBackoff = 64,
+    replacer = undefined,
+    onAnalysis = null
+  }) {
+    this.pool = pool;
+    // Maps (address, chain) to the key identifying a token, e.g. with a normalized address
+    this.keyOf = keyOf;
+    this.intervalMs = intervalMs;
+    this.maxChannels = maxChannels;
+    this.maxBackoff = maxBackoff;
+    this.replacer = replacer;
+    this.onAnalysis = onAnalysis;
+    this.channels = new Map();
+    this.stats = { ticks: 0, analyses: 0, updates: 0, unchanged: 0, failures: 0, events: 0 };
+
+    // Comments keep idle connections open through proxies
+    this.heartbeat = setInterval(() => {
+      for (const channel of this.channels.values()) {
+        for (const res of channel.clients) {
+          res.write(': ping\n\n');
+        }
+      }
+    }, heartbeatMs);
+    this.heartbeat.unref();
+  }
+
+  /**
+   * Attach an HTTP response as a subscriber of a token. Returns false, without
+   * touching the response, when no new channel can be opened.
+   */
+  subscribe(req, res, address, chain) {
+    const key = this.keyOf(address, chain);
+    let channel = this.channels.get(key);
+    if (!channel) {
+      if (this.channels.size >= this.maxChannels) {
+        return false;
+      }
+      channel = {
+        key,
+        address,
+        chain,
+        clients: new Set(),
+        state: null,
+        analysis: null,
+        update: null,
+        updateJson: null,
+        recommendation: null,
+        timer: null,
+        backoff: 1,
+        subscribedAt: Date.now()
+      };
+      this.channels.set(key, channel);
+      this._tick(channel);
+    }
+
+    res.writeHead(200, {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no'
+    });
+    res.write('retry: 5000\n\n');
+    channel.clients.add(res);
+
+    // Late subscribers start from the channel's latest data
+    if (channel.analysis) {
+      res.write(this._event('analysis', channel.analysis));
+    }
+    if (channel.update) {
+      res.write(this._event('update', channel.update));
+    }
+
+    req.on('close', () => this._unsubscribe(channel, res));
+    return true;
+  }
+
+  status() {
+    const now = Date.now();
+    return {
+      channels: [...this.channels.values()].map(channel => ({
+        key: channel.key,
+        subscribers: channel.clients.size,
+        recommendation: channel.recommendation,
+        ageSeconds: (now - channel.subscribedAt) / 1000
+      })),
+      subscribers: this.subscriberCount(),
+      intervalMs: this.intervalMs,
+      ...this.stats
+    };
+  }
+
+  subscriberCount() {
+    let count = 0;
+    for (const channel of this.channels.values()) {
+      count += channel.clients.size;
+    }
+    return count;
+  }
+
+  stop() {
+    clearInterval(this.heartbeat);
+    for (const channel of this.channels.values()) {
+      clearTimeout(channel.timer);
+      for (const res of channel.clients) {
+        res.end();
+      }
+    }
+    this.channels.clear();
+  }
+
+  _unsubscribe(channel, res) {
+    channel.clients.delete(res);
+    if (channel.clients.size === 0 && this.channels.get(channel.key) === channel) {
+      clearTimeout(channel.timer);
+      this.channels.delete(channel.key);
+    }
+  }
+
+  _event(event, data) {
+    return `event: ${event}\ndata: ${JSON.stringify(data, this.replacer)}\n\n`;
+  }
+
+  // Serialized once, whatever the number of subscribers
+  _broadcast(channel, event, data) {
+    const message = this._event(event, data);
+    for (const res of channel.clients) {
+      res.write(message);
+    }
+    this.stats.events += channel.clients.size;
+  }
+
+  _setRecommendation(channel, recommendation) {
+    if (!recommendation || recommendation === channel.recommendation) {
+      return;
+    }
+    if (channel.recommendation) {
+      this._broadcast(channel, 'recommendation', { from: channel.recommendation, to: recommendation });
+    }
+    channel.recommendation = recommendation;
+  }
+
+  async _tick(channel) {
+    this.stats.ticks++;
+    try {
+      const result = await this.pool.run({
+        op: 'tick',
+        address: channel.address,
+        chain: channel.chain,
+        state: channel.state
+      });
+      if (!result.success) {
+        throw new Error(result.error);
+      }
+
+      const { analysis, state, update } = result.data;
+      if (state !== undefined) {
+        // Updates widen the current bar's range: the next tick starts from it
+        channel.state = state;
+      }
+      if (analysis) {
+        channel.analysis = this.onAnalysis ? this.onAnalysis(analysis) : analysis;
+        // Without a state, every tick would be a full analysis: wait longer each time
+        channel.backoff = state ? 1 : Math.min(channel.backoff * 2, this.maxBackoff);
+        channel.update = null;
+        channel.updateJson = null;
+        this.stats.analyses++;
+        this._broadcast(channel, 'analysis', channel.analysis);
+        this._setRecommendation(channel, analysis.technical_analysis?.signals?.recommendation);
+      }
+      if (update) {
+        // Unchanged quotes (e.g. still cached upstream) are not sent again
+        const { timestamp, ...values } = update;
+        const json = JSON.stringify(values, this.replacer);
+        if (json !== channel.updateJson) {
+          channel.update = update;
+          channel.updateJson = json;
+          this.stats.updates++;
+          this._broadcast(channel, 'update', update);
+          this._setRecommendation(channel, update.technical_analysis?.signals?.recommendation);
+        } else {
+          this.stats.unchanged++;
+        }
+      }
+    } catch (err) {
+      this.stats.failures++;
+      console.error(`Live update of ${channel.key} failed:`, err.message);
+      this._broadcast(channel, 'failure', { error: err.message });
+    }
+
+    if (this.channels.get(channel.key) === channel) {
+      channel.timer = setTimeout(() => this._tick(channel), this.intervalMs * channel.backoff);
+      channel.timer.unref();
+    }
+  }
+}
@@ -0,0 +1,94 @@
+import assert from 'node:assert/strict';
+import { test } from 'node:test';
+import zlib from 'node:zlib';
+import { CachedBody, cacheControl, cachedBody, sendCached } from '../http-cache.js';
+
+const ANALYSIS = {
+  token_address: '0xabc',
+  technical_analysis: { RSI: 55.5, series: Array.from({ length: 400 }, (_, i) => i / 3) },
+  timestamp: '2026-01-01T00:00:00',
+  budget: { deadline_ms: 5000, used_ms: 12 },
+  source: { hedge_delay_ms: 250 }
+};
+
+// The parts of express' req/res that sendCached uses; `fresh` compares
+// If-None-Match with the ETag set on the response, as express does
+function exchange(headers = {}, accepted = []) {
+  const res = {
+    headers: {},
+    statusCode: 200,
+    body: undefined,
+    set(name, value) {
+      Object.assign(this.headers, typeof name === 'string' ? { [name]: value } : name);
+      return this;
+    },
+    status(code) {
+      this.statusCode = code;
+      return this;
+    },
+    end(body) {
+      this.body = body;
+      return this;
+    }
+  };
+  const req = {
+    get fresh() {
+      const tags = (headers['if-none-match'] || '').split(/\s*,\s*/);
+      return tags.includes(res.headers.ETag) || tags.includes('*');
+    },
+    acceptsEncodings(encodings) {
+      return encodings.find(e => accepted.includes(e)) || false;
+    }
+  };
+  return { req, res };
+}
+
+test('the ETag ignores the volatile fields of an analysis', () => {
+  const entry = new CachedBody(ANALYSIS);
+  const rerun = new CachedBody({ ...ANALYSIS, timestamp: 'later', budget: { used_ms: 99 }, snapshot: { age: 3 } });
+  const changed = new CachedBody({ ...ANALYSIS, technical_analysis: { RSI: 60 } });
+  assert.match(entry.etag, /^W\/"[\w-]+"$/);
+  assert.equal(rerun.etag, entry.etag);
+  assert.notEqual(changed.etag, entry.etag);
+  assert.equal(JSON.parse(rerun.body).timestamp, 'later');
+});
+
+test('a matching If-None-Match gets a 304 without a body', async () => {
+  const entry = new CachedBody(ANALYSIS);
+  const { req, res } = exchange({ 'if-none-match': `W/"other", ${entry.etag}` });
+  await sendCached(req, res, entry, { maxAgeS: 30, staleS: 300 });
+  assert.equal(res.statusCode, 304);
+  assert.equal(res.body, undefined);
+  assert.equal(res.headers.ETag, entry.etag);
+  assert.equal(res.headers['Cache-Control'], 'public, max-age=30, stale-while-revalidate=300');
+});
+
+test('other requests get the smallest encoding they accept, compressed once', async () => {
+  const entry = cachedBody(ANALYSIS);
+  assert.equal(cachedBody(ANALYSIS), entry);
+
+  const brotli = exchange({ 'if-none-match': 'W/"stale"' }, ['gzip', 'br']);
+  await sendCached(brotli.req, brotli.res, entry, { maxAgeS: 30, staleS: 300 });
+  assert.equal(brotli.res.statusCode, 200);
+  assert.equal(brotli.res.headers['Content-Encoding'], 'br');
+  assert.deepEqual(zlib.brotliDecompressSync(brotli.res.body), entry.body);
+
+  const gzip = exchange({}, ['gzip']);
+  await sendCached(gzip.req, gzip.res, entry, { maxAgeS: 30, staleS: 300 });
+  assert.equal(gzip.res.headers['Content-Encoding'], 'gzip');
+  assert.deepEqual(zlib.gunzipSync(gzip.res.body), entry.body);
+  assert.equal(await entry.encode('gzip'), gzip.res.body);
+
+  const plain = exchange({}, []);
+  await sendCached(plain.req, plain.res, entry, { maxAgeS: 30, staleS: 300 });
+  assert.equal(plain.res.headers['Content-Encoding'], undefined);
+  assert.equal(plain.res.body, entry.body);
+});
+
+test('small bodies are never compressed', async () => {
+  const entry = new CachedBody({ token_address: '0xabc' });
+  const { req, res } = exchange({}, ['br', 'gzip']);
+  await sendCached(req, res, entry, { maxAgeS: -5, staleS: 1.9 });
+  assert.equal(res.headers['Content-Encoding'], undefined);
+  assert.equal(res.headers['Cache-Control'], cacheControl(0, 1));
+});
@@ -0,0 +1,75 @@
+import assert from 'node:assert/strict';
+import { spawn } from 'node:child_process';
+import path from 'node:path';
+import { test } from 'node:test';
+import { fileURLToPath } from 'node:url';
+import { FrameDecoder, jsonReplacer } from '../protocol.js';
+
+const PYTHON_DIR = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '../python');
+
+// Writes the same frames a worker would, on fd 3
+const WRITER = `
+import os, sys
+import numpy as np
+sys.path.insert(0, ${JSON.stringify(PYTHON_DIR)})
+from protocol import encode_frame
+out = os.fdopen(3, "wb")
+out.write(encode_frame({"type": "ready"}))
+out.write(encode_frame({"rsi": float("nan"), "bands": [float("inf"), -1.5]}))
+out.write(encode_frame({"id": 1, "head": "x" * 5, "series": np.arange(100) / 4, "flag": float("-inf")}, binary=True))
+out.write(encode_frame({"id": 2, "series": np.linspace(0, 1, 64)}, binary=True))
+out.close()
+`;
+
+function pythonFrames() {
+  return new Promise((resolve, reject) => {
+    const child = spawn('python3', ['-c', WRITER], { stdio: ['ignore', 'ignore', 'inherit', 'pipe'] });
+    const chunks = [];
+    child.stdio[3].on('data', chunk => chunks.push(chunk));
+    child.on('error', reject);
+    child.on('exit', code => (code === 0 ? resolve(Buffer.concat(chunks)) : reject(new Error(`exit ${code}`))));
+  });
+}
+
+function check(messages) {
+  assert.equal(messages.length, 4);
+  assert.deepEqual(messages[0], { type: 'ready' });
+  assert.ok(Number.isNaN(messages[1].rsi));
+  assert.deepEqual(messages[1].bands, [Infinity, -1.5]);
+
+  const [, , binary, aligned] = messages;
+  assert.equal(binary.head, 'xxxxx');
+  assert.equal(binary.flag, -Infinity);
+  assert.ok(binary.series instanceof Float64Array);
+  assert.deepEqual(Array.from(binary.series), Array.from({ length: 100 }, (_, i) => i / 4));
+  assert.equal(aligned.series.length, 64);
+  assert.equal(aligned.series[63], 1);
+}
+
+test('frames written on fd 3 decode whatever the chunking', { timeout: 10000 }, async () => {
+  const stream = await pythonFrames();
+
+  const whole = [];
+  new FrameDecoder(m => whole.push(m)).push(stream);
+  check(whole);
+
+  // One byte at a time, then in uneven chunks
+  const bytes = [];
+  const byByte = new FrameDecoder(m => bytes.push(m));
+  for (let i = 0; i < stream.length; i++) {
+    byByte.push(stream.subarray(i, i + 1));
+  }
+  check(bytes);
+
+  const uneven = [];
+  const decoder = new FrameDecoder(m => uneven.push(m));
+  for (let i = 0, size = 3; i < stream.length; i += size, size = (size * 7) % 61 + 1) {
+    decoder.push(stream.subarray(i, i + size));
+  }
+  check(uneven);
+});
+
+test('jsonReplacer writes typed arrays and non-finite numbers as the HTTP API does', () => {
+  const body = JSON.stringify({ a: new Float64Array([1, NaN]), b: -Infinity, c: 2 }, jsonReplacer);
+  assert.deepEqual(JSON.parse(body), { a: [1, 'NaN'], b: '-Infinity', c: 2 });
+});
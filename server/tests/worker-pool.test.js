@@ -0,0 +1,50 @@
+import assert from 'node:assert/strict';
+import { mkdtempSync, rmSync, writeFileSync } from 'node:fs';
+import { tmpdir } from 'node:os';
+import path from 'node:path';
+import { test } from 'node:test';
+import { fileURLToPath } from 'node:url';
+import { AnalyzerPool } from '../worker-pool.js';
+
+const PYTHON_DIR = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '../python');
+
+// A worker that announces itself and then holds every job without answering
+const HOLDING_WORKER = `
+import os, sys
+sys.path.insert(0, ${JSON.stringify(PYTHON_DIR)})
+from protocol import encode_frame
+out = os.fdopen(3, "wb")
+out.write(encode_frame({"type": "ready"}))
+out.flush()
+for line in sys.stdin:
+    pass
+`;
+
+async function until(condition, timeoutMs = 5000) {
+  const start = Date.now();
+  while (!condition()) {
+    if (Date.now() - start > timeoutMs) {
+      throw new Error('condition not met in time');
+    }
+    await new Promise(resolve => setTimeout(resolve, 10));
+  }
+}
+
+test('stop() rejects the jobs in flight instead of requeueing them', { timeout: 10000 }, async () => {
+  const dir = mkdtempSync(path.join(tmpdir(), 'holding-worker-'));
+  writeFileSync(path.join(dir, 'analyzer.py'), HOLDING_WORKER);
+  const pool = new AnalyzerPool({ scriptPath: dir, size: 1, restartDelayMs: 10 }).start();
+  try {
+    await until(() => pool.status().workers[0].ready);
+    const job = pool.run({ address: '0xabc' });
+    const other = pool.run({ address: '0xdef' });
+    await until(() => pool.status().workers[0].inFlight === 2);
+
+    await pool.stop();
+    await assert.rejects(job, /Analyzer pool is stopped/);
+    await assert.rejects(other, /Analyzer pool is stopped/);
+    assert.equal(pool.status().queued, 0);
+  } finally {
+    rmSync(dir, { recursive: true, force: true });
+  }
+});
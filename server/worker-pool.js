@@ -0,0 +1,317 @@
+import { spawn } from 'child_process';
+import readline from 'readline';
+import { FrameDecoder, jsonReplacer } from './protocol.js';
+
+/**
+ * Bounded pool of long-lived `analyzer.py --worker` processes.
+ *
+ * Jobs are newline-delimited JSON written to a worker's stdin; each worker
+ * answers with one framed message per job on file descriptor 3 (see
+ * protocol.js), matched back by `id`. The workers' stdout and stderr only
+ * carry logs. With `binary`, full indicator series travel as raw float64
+ * and come back as Float64Array.
+ * Workers are health-checked with `ping` jobs and restarted when they crash
+ * or stop answering. Jobs wait in a FIFO queue while all workers are busy.
+ *
+ * `metrics` may hold `queueWait`, `jobDuration` and `workerStartup`
+ * histograms (see metrics.js), observed in seconds.
+ */
+export class AnalyzerPool {
+  constructor({
+    pythonPath = 'python3',
+    scriptPath,
+    size = 2,
+    concurrency = 4,
+    maxQueue = 100,
+    jobTimeoutMs = 60000,
+    healthIntervalMs = 15000,
+    healthTimeoutMs = 5000,
+    restartDelayMs = 1000,
+    binary = true,
+    metrics = null
+  } = {}) {
+    this.pythonPath = pythonPath;
+    this.scriptPath = scriptPath;
+    this.size = size;
+    this.concurrency = concurrency;
+    this.maxQueue = maxQueue;
+    this.jobTimeoutMs = jobTimeoutMs;
+    this.healthIntervalMs = healthIntervalMs;
+    this.healthTimeoutMs = healthTimeoutMs;
+    this.restartDelayMs = restartDelayMs;
+    this.binary = binary;
+    this.metrics = metrics || {};
+
+    this.workers = [];
+    this.queue = [];
+    this.nextJobId = 1;
+    this.stopped = false;
+    this.stats = { completed: 0, failed: 0, restarts: 0, rejected: 0 };
+  }
+
+  start() {
+    for (let i = 0; i < this.size; i++) {
+      this.workers.push(this._spawn(i));
+    }
+    this.healthTimer = setInterval(() => this._healthCheck(), this.healthIntervalMs);
+    this.healthTimer.unref();
+    return this;
+  }
+
+  /**
+   * Run a job on the next free worker. Resolves with the worker's result
+   * message (`{ success, data | error, ... }`).
+   *
+   * `onItem` receives the intermediate `item` messages streamed by batch
+   * jobs; such jobs are not retried on another worker since part of their
+   * output may already have been consumed. `timeoutMs` is an idle timeout,
+   * restarted by every streamed item.
+   */
+  run(job, { onItem = null, timeoutMs = this.jobTimeoutMs } = {}) {
+    if (this.stopped) {
+      return Promise.reject(new Error('Analyzer pool is stopped'));
+    }
+    if (this.queue.length >= this.maxQueue) {
+      this.stats.rejected++;
+      const error = new Error('Analyzer queue is full');
+      error.code = 'QUEUE_FULL';
+      return Promise.reject(error);
+    }
+
+    return new Promise((resolve, reject) => {
+      this.queue.push({
+        job: { op: 'analyze', ...job },
+        resolve,
+        reject,
+        onItem,
+        timeoutMs,
+        attempts: 0,
+        enqueuedAt: Date.now()
+      });
+      this._dispatch();
+    });
+  }
+
+  status() {
+    return {
+      size: this.size,
+      queued: this.queue.length,
+      workers: this.workers.map(w => ({
+        slot: w.slot,
+        pid: w.proc.pid,
+        ready: w.ready,
+        inFlight: this._inFlight(w),
+        jobsDone: w.jobsDone,
+        coalescing: w.coalescing || null,
+        rateLimits: w.rateLimits || null
+      })),
+      ...this.stats
+    };
+  }
+
+  async stop() {
+    this.stopped = true;
+    clearInterval(this.healthTimer);
+    for (const entry of this.queue.splice(0)) {
+      entry.reject(new Error('Analyzer pool is stopped'));
+    }
+    for (const worker of this.workers) {
+      worker.proc.kill();
+    }
+  }
+
+  _spawn(slot) {
+    const proc = spawn(this.pythonPath, ['-u', 'analyzer.py', '--worker'], {
+      cwd: this.scriptPath,
+      // Each worker gets its share of the upstream rate limits
+      env: { ...process.env, UPSTREAM_RATE_SHARE: String(1 / this.size), ANALYZER_PROTOCOL_FD: '3' },
+      // fd 3 carries the framed protocol messages
+      stdio: ['pipe', 'pipe', 'pipe', 'pipe']
+    });
+
+    const worker = {
+      slot,
+      proc,
+      ready: false,
+      alive: true,
+      pending: new Map(),
+      jobsDone: 0,
+      lastPong: Date.now(),
+      spawnedAt: Date.now()
+    };
+
+    const decoder = new FrameDecoder(message => {
+      // A failing result handler is not a protocol error: the worker and its other jobs stay up
+      try {
+        this._onMessage(worker, message);
+      } catch (e) {
+        console.error(`Worker ${slot}: failed to handle message for job ${message.id}:`, e);
+      }
+    });
+    proc.stdio[3].on('data', chunk => {
+      try {
+        decoder.push(chunk);
+      } catch (e) {
+        // A corrupt frame leaves the stream out of sync: start over
+        console.error(`Worker ${slot} sent an invalid frame:`, e.message);
+        proc.kill('SIGKILL');
+      }
+    });
+    for (const stream of [proc.stdout, proc.stderr]) {
+      readline.createInterface({ input: stream }).on('line', line => {
+        console.log(`[worker ${slot}] ${line}`);
+      });
+    }
+
+    proc.stdin.on('error', err => {
+      console.error(`Worker ${slot} stdin error:`, err.message);
+    });
+    proc.on('error', err => {
+      console.error(`Worker ${slot} failed to start:`, err);
+    });
+    proc.on('exit', (code, signal) => {
+      this._onExit(worker, code, signal);
+    });
+
+    return worker;
+  }
+
+  _onMessage(worker, message) {
+    if (message.type === 'ready') {
+      worker.ready = true;
+      worker.lastPong = Date.now();
+      console.log(`Worker ${worker.slot} ready (pid ${worker.proc.pid})`);
+      this.metrics.workerStartup?.observe({}, (Date.now() - worker.spawnedAt) / 1000);
+      this._dispatch();
+      return;
+    }
+
+    const entry = worker.pending.get(message.id);
+    if (!entry) {
+      return;
+    }
+
+    if (message.type === 'item') {
+      entry.restartTimer();
+      if (entry.onItem) {
+        entry.onItem(message);
+      }
+      return;
+    }
+
+    worker.pending.delete(message.id);
+    clearTimeout(entry.timer);
+
+    if (message.type === 'pong') {
+      worker.lastPong = Date.now();
+      worker.coalescing = message.coalescing || worker.coalescing;
+      worker.rateLimits = message.rate_limits || worker.rateLimits;
+      entry.resolve(message);
+      return;
+    }
+
+    worker.jobsDone++;
+    if (message.success) {
+      this.stats.completed++;
+    } else {
+      this.stats.failed++;
+    }
+    this.metrics.jobDuration?.observe(
+      { op: entry.job.op, result: message.success ? 'success' : 'error' },
+      (Date.now() - entry.sentAt) / 1000
+    );
+    entry.resolve(message);
+    this._dispatch();
+  }
+
+  _onExit(worker, code, signal) {
+    worker.alive = false;
+    worker.ready = false;
+    console.error(`Worker ${worker.slot} exited (code ${code}, signal ${signal})`);
+
+    // Give in-flight analyses one more chance on another worker, unless the pool is stopping
+    for (const [id, entry] of worker.pending) {
+      clearTimeout(entry.timer);
+      if (this.stopped) {
+        entry.reject(new Error('Analyzer pool is stopped'));
+      } else if (entry.job.op !== 'ping' && !entry.onItem && entry.attempts < 2) {
+        this.queue.unshift(entry);
+      } else {
+        entry.reject(new Error(`Analyzer worker exited while processing job ${id}`));
+      }
+    }
+    worker.pending.clear();
+
+    if (this.stopped) {
+      return;
+    }
+    // Retried jobs go to the workers still running
+    this._dispatch();
+    this.stats.restarts++;
+    setTimeout(() => {
+      if (!this.stopped) {
+        this.workers[worker.slot] = this._spawn(worker.slot);
+      }
+    }, this.restartDelayMs);
+  }
+
+  _send(worker, entry, timeoutMs, onTimeout) {
+    const id = this.nextJobId++;
+    entry.attempts++;
+    entry.restartTimer = () => {
+      clearTimeout(entry.timer);
+      entry.timer = setTimeout(() => {
+        worker.pending.delete(id);
+        onTimeout(id);
+      }, timeoutMs);
+    };
+    entry.restartTimer();
+
+    worker.pending.set(id, entry);
+    // NaN values (e.g. in live indicator states) are sent as "NaN" strings
+    worker.proc.stdin.write(JSON.stringify({ id, binary: this.binary, ...entry.job }, jsonReplacer) + '\n');
+  }
+
+  _inFlight(worker) {
+    let count = 0;
+    for (const entry of worker.pending.values()) {
+      if (entry.job.op !== 'ping') {
+        count++;
+      }
+    }
+    return count;
+  }
+
+  _dispatch() {
+    while (this.queue.length > 0) {
+      const worker = this.workers
+        .filter(w => w.alive && w.ready && this._inFlight(w) < this.concurrency)
+        .sort((a, b) => this._inFlight(a) - this._inFlight(b))[0];
+      if (!worker) {
+        return;
+      }
+      const entry = this.queue.shift();
+      entry.sentAt = Date.now();
+      this.metrics.queueWait?.observe({ op: entry.job.op }, (entry.sentAt - entry.enqueuedAt) / 1000);
+      this._send(worker, entry, entry.timeoutMs, id => {
+        // A worker that cannot finish a job in time is considered stuck
+        console.error(`Job ${id} timed out on worker ${worker.slot}, restarting it`);
+        entry.reject(new Error('Analysis timed out'));
+        worker.proc.kill('SIGKILL');
+      });
+    }
+  }
+
+  _healthCheck() {
+    for (const worker of this.workers) {
+      if (!worker.alive || !worker.ready) {
+        continue;
+      }
+      const entry = { job: { op: 'ping' }, attempts: 0, resolve: () => {}, reject: () => {} };
+      this._send(worker, entry, this.healthTimeoutMs, () => {
+        console.error(`Worker ${worker.slot} failed health check, restarting it`);
+        worker.proc.kill('SIGKILL');
+      });
+    }
+  }
+}
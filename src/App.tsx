@@ -1,16 +1,31 @@
 // src/App.tsx
 
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { LineChart, AlertTriangle, Loader2 } from 'lucide-react';
 import { TokenAnalysis } from './components/TokenAnalysis';
 import { SearchForm } from './components/SearchForm';
-import { tokenService, type TokenAnalysisResult } from './services/token.service';
+import { applyLiveUpdate, tokenService, type TokenAnalysisResult } from './services/token.service';
 
 function App() {
   const [analysis, setAnalysis] = useState<TokenAnalysisResult | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
 
+  const liveAddress = analysis?.token_address;
+  const liveChain = analysis?.chain;
+
+  // Une fois le token analysé, le serveur pousse les mises à jour au lieu d'un nouveau polling
+  useEffect(() => {
+    if (!liveAddress) return;
+    return tokenService.subscribeToToken(liveAddress, liveChain, {
+      onAnalysis: result => {
+        if (result.status === 'success') setAnalysis(result);
+      },
+      onUpdate: update => setAnalysis(current => current && applyLiveUpdate(current, update)),
+      onError: message => console.warn('Live update failed:', message)
+    });
+  }, [liveAddress, liveChain]);
+
   const handleAnalyze = async (address: string) => {
     setLoading(true);
     setError('');
@@ -2,6 +2,78 @@
 import axios from 'axios';
 
 export interface TokenAnalysisResult {
+  timestamp: string;
+  token_address: string;
+  chain: string;
+  market_data: {
+    current_price: number;
+    volume_24h: number;
+    liquidity: number;
+    price_change_24h: number;
+    market_cap: number;
+    buy_sell_ratio: number;
+  };
+  technical_analysis?: {
+    indicators: {
+      RSI: number;
+      MACD: {
+        macd: number;
+        signal: number;
+        hist: number;
+      };
+      BB: {
+        upper: number;
+        middle: number;
+        lower: number;
+      };
+      EMA: {
+        EMA20: number;
+        EMA50: number;
+        EMA200: number;
+      };
+      ADX: number;
+    };
+    signals: {
+      recommendation: string;
+      buy_signals: number;
+      sell_signals: number;
+      neutral_signals: number;
+      total_signals: number;
+    };
+  };
+  risk_metrics?: {
+    risk_score: number;
+    confidence_score: number;
+    volatility: number;
+  };
+  note?: string;
+  status?: string;
+}
+
+// Live values pushed by /stream/:address between two full analyses
+export interface LiveUpdate {
+  timestamp: string;
+  token_address: string;
+  chain: string;
+  market_data: Partial<TokenAnalysisResult['market_data']> & { current_price: number };
+  technical_analysis: NonNullable<TokenAnalysisResult['technical_analysis']>;
+}
+
+export interface LiveHandlers {
+  onAnalysis?: (analysis: TokenAnalysisResult) => void;
+  onUpdate?: (update: LiveUpdate) => void;
+  onRecommendation?: (change: { from: string; to: string }) => void;
+  onError?: (message: string) => void;
+}
+
+/** Apply a live update to the analysis it follows */
+export function applyLiveUpdate(analysis: TokenAnalysisResult, update: LiveUpdate): TokenAnalysisResult {
+  return {
+    ...analysis,
+    timestamp: update.timestamp,
+    market_data: { ...analysis.market_data, ...update.market_data },
+    technical_analysis: update.technical_analysis
+  };
 }
 
 class TokenService {
@@ -23,6 +95,28 @@ class TokenService {
     }
   }
 
+  /**
+   * Subscribe to live updates of a token (Server-Sent Events): the server
+   * pushes a full analysis first, then updated prices, indicators and
+   * recommendation changes. Returns a function closing the subscription.
+   */
+  subscribeToToken(address: string, chain: string = 'ethereum', handlers: LiveHandlers = {}): () => void {
+    const source = new EventSource(
+      `${this.API_URL}/stream/${encodeURIComponent(address)}?chain=${encodeURIComponent(chain)}`
+    );
+    const on = <T>(event: string, handler?: (data: T) => void) => {
+      if (handler) {
+        source.addEventListener(event, e => handler(JSON.parse((e as MessageEvent).data)));
+      }
+    };
+    on<TokenAnalysisResult>('analysis', handlers.onAnalysis);
+    on<LiveUpdate>('update', handlers.onUpdate);
+    on<{ from: string; to: string }>('recommendation', handlers.onRecommendation);
+    on<{ error: string }>('failure', data => handlers.onError?.(data.error));
+    // EventSource reconnects by itself after network errors
+    return () => source.close();
+  }
+
   private handleError(error: any): Error {
     if (error.response) {
       // error code server 